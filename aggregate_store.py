@@ -0,0 +1,266 @@
+"""
+Incrementally maintained aggregate store for SkyTrack reports.
+
+The summary table skytrack_aggregates keeps count/sum/min/max per key for
+the flight and booking breakdowns used by main.py and the pie/line charts:
+
+    flights_by_airline    flights per airline_id
+    flights_by_status     flights per status
+    flights_by_route      flights per airline_id, departure_airport_id and status
+    bookings_by_platform  bookings and price stats per booking_platform
+    bookings_by_status    bookings and price stats per status
+
+The pie and line charts read flights_by_route, so they can join the ids to
+airline and airport when reading, exactly as the SQL reports filter flights.
+
+Writers apply deltas in the same transaction as their inserts, and a
+periodic reconciliation recomputes everything from the fact tables, which
+also repairs min/max after deletes and any write that bypassed the deltas.
+Reconciliation writes a marker row; until the first one, writers skip their
+deltas and readers refuse the store, since it holds no complete counts.
+
+    python aggregate_store.py --reconcile              # one-off reconciliation
+    python aggregate_store.py --reconcile --every 900  # every 15 minutes
+"""
+import argparse
+import time
+from decimal import Decimal
+
+import db
+
+AGGREGATE_TABLE = 'skytrack_aggregates'
+
+CREATE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {AGGREGATE_TABLE} (
+        metric TEXT NOT NULL,
+        key TEXT NOT NULL,
+        row_count BIGINT NOT NULL DEFAULT 0,
+        value_count BIGINT NOT NULL DEFAULT 0,
+        value_sum NUMERIC NOT NULL DEFAULT 0,
+        value_min NUMERIC,
+        value_max NUMERIC,
+        PRIMARY KEY (metric, key)
+    );
+"""
+
+# metric -> (fact table, key column or tuple of key columns, value column or None)
+METRICS = {
+    'flights_by_airline': ('flights', 'airline_id', None),
+    'flights_by_status': ('flights', 'status', None),
+    'flights_by_route': ('flights', ('airline_id', 'departure_airport_id', 'status'), None),
+    'bookings_by_platform': ('booking', 'booking_platform', 'price'),
+    'bookings_by_status': ('booking', 'status', 'price'),
+}
+
+# NULL keys are stored as an empty string (key is part of the primary key)
+NULL_KEY = ''
+
+# Marker row written by reconcile(); value_max holds its epoch time
+RECONCILED_METRIC = 'reconciled'
+
+# Separates the parts of a composite key; status, which may contain it, comes last
+KEY_SEPARATOR = '|'
+
+UPSERT_SQL = f"""
+    INSERT INTO {AGGREGATE_TABLE} (metric, key, row_count, value_count, value_sum, value_min, value_max)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (metric, key) DO UPDATE SET
+        row_count = {AGGREGATE_TABLE}.row_count + EXCLUDED.row_count,
+        value_count = {AGGREGATE_TABLE}.value_count + EXCLUDED.value_count,
+        value_sum = {AGGREGATE_TABLE}.value_sum + EXCLUDED.value_sum,
+        value_min = LEAST({AGGREGATE_TABLE}.value_min, EXCLUDED.value_min),
+        value_max = GREATEST({AGGREGATE_TABLE}.value_max, EXCLUDED.value_max);
+"""
+
+# Report queries that read O(keys) rows from the store instead of scanning facts.
+# Route keys are joined to airline and airport like PIE_CHART_QUERY and
+# LINE_CHART_QUERY join flights, and ordered the same way (NULL status last).
+PIE_CHART_AGGREGATE_QUERY = f"""
+    SELECT
+        a.airline_name as airline,
+        SUM(s.row_count) as flight_count,
+        COUNT(DISTINCT ap.airport_id) as airports_served
+    FROM {AGGREGATE_TABLE} s
+    JOIN airline a ON a.airline_id::text = split_part(s.key, '{KEY_SEPARATOR}', 1)
+    JOIN airport ap ON ap.airport_id::text = split_part(s.key, '{KEY_SEPARATOR}', 2)
+    WHERE s.metric = 'flights_by_route' AND s.row_count > 0
+    GROUP BY a.airline_name
+    ORDER BY SUM(s.row_count) DESC
+    LIMIT 8;
+"""
+
+LINE_CHART_AGGREGATE_QUERY = f"""
+    SELECT
+        NULLIF(substring(s.key from '^[^{KEY_SEPARATOR}]*[{KEY_SEPARATOR}][^{KEY_SEPARATOR}]*[{KEY_SEPARATOR}](.*)$'), '')
+            as flight_status,
+        SUM(s.row_count) as flight_count,
+        COUNT(DISTINCT a.airline_id) as airlines_count,
+        COUNT(DISTINCT ap.airport_id) as airports_count
+    FROM {AGGREGATE_TABLE} s
+    JOIN airline a ON a.airline_id::text = split_part(s.key, '{KEY_SEPARATOR}', 1)
+    JOIN airport ap ON ap.airport_id::text = split_part(s.key, '{KEY_SEPARATOR}', 2)
+    WHERE s.metric = 'flights_by_route' AND s.row_count > 0
+    GROUP BY 1
+    ORDER BY 1;
+"""
+
+
+def ensure_schema(cursor):
+    """Create the summary table if it does not exist yet"""
+    cursor.execute(CREATE_TABLE_SQL)
+
+
+def _table_exists(cursor):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (AGGREGATE_TABLE,))
+    return cursor.fetchone()[0]
+
+
+def is_reconciled(cursor):
+    """True once a reconciliation has filled the store with complete counts"""
+    if not _table_exists(cursor):
+        return False
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {AGGREGATE_TABLE} WHERE metric = %s);", (RECONCILED_METRIC,))
+    return cursor.fetchone()[0]
+
+
+def _key(value):
+    if isinstance(value, tuple):
+        return KEY_SEPARATOR.join(_key(part) for part in value)
+    return NULL_KEY if value is None else str(value)
+
+
+def _row_key(row, key_column):
+    """Stored key of a fact row (dict of column values)"""
+    if isinstance(key_column, tuple):
+        return _key(tuple(row.get(column) for column in key_column))
+    return _key(row.get(key_column))
+
+
+def _key_sql(key_column):
+    """SQL expression of the stored key, as _key() builds it"""
+    columns = key_column if isinstance(key_column, tuple) else (key_column,)
+    return f" || '{KEY_SEPARATOR}' || ".join(f"COALESCE({column}::text, '{NULL_KEY}')" for column in columns)
+
+
+def _apply_deltas(cursor, table, rows):
+    """
+    Fold new fact rows (dicts of column values) into per-key deltas and upsert
+    them. Skipped before the first reconciliation, which counts these rows anyway.
+    """
+    if not _table_exists(cursor):
+        return 0
+    # Conflicts with reconcile()'s EXCLUSIVE lock: waits for a running one, then sees its marker
+    cursor.execute(f"LOCK TABLE {AGGREGATE_TABLE} IN ROW EXCLUSIVE MODE;")
+    if not is_reconciled(cursor):
+        return 0
+
+    deltas = {}
+    for metric, (fact_table, key_column, value_column) in METRICS.items():
+        if fact_table != table:
+            continue
+        for row in rows:
+            delta = deltas.setdefault((metric, _row_key(row, key_column)), [0, 0, 0, None, None])
+            delta[0] += 1
+            value = row.get(value_column) if value_column else None
+            if value is not None:
+                # Feeds may carry numbers as strings; Decimal keeps NUMERIC sums exact
+                value = Decimal(str(value))
+                delta[1] += 1
+                delta[2] += value
+                delta[3] = value if delta[3] is None else min(delta[3], value)
+                delta[4] = value if delta[4] is None else max(delta[4], value)
+
+    if deltas:
+        cursor.executemany(UPSERT_SQL, [(metric, key, *delta) for (metric, key), delta in deltas.items()])
+    return len(deltas)
+
+
+def apply_flight_rows(cursor, rows):
+    """Apply inserted flights (dicts with airline_id, departure_airport_id and status) as deltas"""
+    return _apply_deltas(cursor, 'flights', rows)
+
+
+def apply_booking_rows(cursor, rows):
+    """Apply inserted bookings (dicts with booking_platform, status and price) as deltas"""
+    return _apply_deltas(cursor, 'booking', rows)
+
+
+def reconcile(connection):
+    """
+    Recompute every metric from the fact tables in one transaction.
+    The summary table is locked first, so writers applying deltas wait and
+    their rows are counted exactly once.
+    """
+    cursor = connection.cursor()
+    try:
+        ensure_schema(cursor)
+        cursor.execute(f"LOCK TABLE {AGGREGATE_TABLE} IN EXCLUSIVE MODE;")
+        cursor.execute(f"DELETE FROM {AGGREGATE_TABLE};")
+
+        for metric, (table, key_column, value_column) in METRICS.items():
+            value = value_column or 'NULL::numeric'
+            cursor.execute(f"""
+                INSERT INTO {AGGREGATE_TABLE} (metric, key, row_count, value_count, value_sum, value_min, value_max)
+                SELECT
+                    %s,
+                    {_key_sql(key_column)},
+                    COUNT(*),
+                    COUNT({value}),
+                    COALESCE(SUM({value}), 0),
+                    MIN({value}),
+                    MAX({value})
+                FROM {table}
+                GROUP BY 2;
+            """, (metric,))
+
+        cursor.execute(f"""
+            INSERT INTO {AGGREGATE_TABLE} (metric, key, value_max)
+            VALUES (%s, %s, extract(epoch from now()));
+        """, (RECONCILED_METRIC, NULL_KEY))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def read_metrics(cursor, metrics=None):
+    """
+    Current aggregates as {metric: [(key, row_count, value_count, value_sum, value_min, value_max), ...]}.
+    Empty-string keys are returned as None. Raises RuntimeError before the first reconciliation.
+    """
+    if not is_reconciled(cursor):
+        raise RuntimeError(f"{AGGREGATE_TABLE} has not been reconciled yet (python aggregate_store.py --reconcile)")
+    metrics = list(metrics or METRICS)
+    cursor.execute(f"""
+        SELECT metric, key, row_count, value_count, value_sum, value_min, value_max
+        FROM {AGGREGATE_TABLE}
+        WHERE metric = ANY(%s);
+    """, (metrics,))
+
+    result = {metric: [] for metric in metrics}
+    for metric, key, *values in cursor.fetchall():
+        result[metric].append((None if key == NULL_KEY else key, *values))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SkyTrack aggregate store maintenance")
+    parser.add_argument('--reconcile', action='store_true',
+                        help="recompute all aggregates from the fact tables")
+    parser.add_argument('--every', type=int, default=None,
+                        help="repeat the reconciliation every N seconds")
+    args = parser.parse_args()
+
+    if not args.reconcile:
+        parser.print_help()
+    else:
+        with db.connection() as connection:
+            while True:
+                started = time.time()
+                reconcile(connection)
+                print(f"Aggregates reconciled in {time.time() - started:.2f}s")
+                if args.every is None:
+                    break
+                time.sleep(args.every)
@@ -0,0 +1,105 @@
+"""
+Airport-to-flight edge index for the airport traffic reports.
+
+Joining airport to flights ON departure OR arrival cannot be hash-joined or
+index-scanned, so Postgres falls back to a nested loop over airports x flights.
+Instead every flight is unpivoted into two edges, (departure airport, flight)
+and (arrival airport, flight), and the reports join airports to the edges on a
+plain equality. The edges come either from an inline UNION ALL subquery or from
+the maintained materialized view airport_flight_edges.
+
+    python airport_edges.py --create    # build the materialized view
+    python airport_edges.py --refresh   # refresh it without blocking readers
+"""
+import argparse
+
+import db
+
+EDGE_VIEW = 'airport_flight_edges'
+
+# Two rows per flight: one for each airport it touches
+EDGE_SELECT = """
+    SELECT departure_airport_id AS airport_id, flight_id, airline_id, 'D' AS direction
+    FROM flights
+    WHERE departure_airport_id IS NOT NULL
+    UNION ALL
+    SELECT arrival_airport_id AS airport_id, flight_id, airline_id, 'A' AS direction
+    FROM flights
+    WHERE arrival_airport_id IS NOT NULL
+"""
+
+CREATE_VIEW_SQL = f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {EDGE_VIEW} AS
+    {EDGE_SELECT};
+    CREATE UNIQUE INDEX IF NOT EXISTS {EDGE_VIEW}_pkey
+        ON {EDGE_VIEW} (airport_id, flight_id, direction);
+"""
+
+HORIZONTAL_BAR_CHART_EDGE_QUERY = """
+    SELECT
+        ap.airport_name as airport,
+        ap.city as city,
+        COUNT(DISTINCT e.flight_id) as flight_count,
+        COUNT(DISTINCT e.airline_id) as airlines_count
+    FROM airport ap
+    JOIN {edges} e ON e.airport_id = ap.airport_id
+    GROUP BY ap.airport_name, ap.city
+    ORDER BY COUNT(DISTINCT e.flight_id) DESC
+    LIMIT 15;
+"""
+
+AIRPORT_TRAFFIC_EDGE_QUERY = """
+    SELECT
+        ap.airport_name as "Airport Name",
+        ap.city as "City",
+        COUNT(DISTINCT e.flight_id) as "Flight Count",
+        COUNT(DISTINCT e.airline_id) as "Airlines Operating"
+    FROM airport ap
+    LEFT JOIN {edges} e ON e.airport_id = ap.airport_id
+    GROUP BY ap.airport_name, ap.city
+    ORDER BY COUNT(DISTINCT e.flight_id) DESC;
+"""
+
+
+def edge_source(use_view=False):
+    """FROM-clause source of airport-flight edges"""
+    if use_view:
+        return EDGE_VIEW
+    return f"({EDGE_SELECT})"
+
+
+def create_edge_view(connection):
+    """Create the materialized view and the unique index needed for concurrent refresh"""
+    cursor = connection.cursor()
+    cursor.execute(CREATE_VIEW_SQL)
+    connection.commit()
+    cursor.close()
+
+
+def refresh_edge_view(connection, concurrently=True):
+    """
+    Rebuild the edges from flights. A concurrent refresh keeps the view
+    readable by running reports while it is rebuilt.
+    """
+    mode = 'CONCURRENTLY ' if concurrently else ''
+    cursor = connection.cursor()
+    cursor.execute(f"REFRESH MATERIALIZED VIEW {mode}{EDGE_VIEW};")
+    connection.commit()
+    cursor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Airport-flight edge view maintenance")
+    parser.add_argument('--create', action='store_true', help="create the materialized view")
+    parser.add_argument('--refresh', action='store_true', help="refresh the materialized view")
+    args = parser.parse_args()
+
+    with db.connection() as connection:
+        if args.create:
+            create_edge_view(connection)
+            print(f"Materialized view {EDGE_VIEW} created")
+        if args.refresh:
+            refresh_edge_view(connection)
+            print(f"Materialized view {EDGE_VIEW} refreshed")
+        if not (args.create or args.refresh):
+            parser.print_help()
@@ -1,13 +1,31 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
-import psycopg2
-from sqlalchemy import create_engine
 import os
-import numpy as np
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import psycopg2.extensions
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
 from openpyxl.formatting.rule import ColorScaleRule
+from chart_rendering import CHART_SPECS, HISTOGRAM_BINS, render_charts
+from query_cache import QueryCache
+from render_cache import RenderCache, function_source
+import aggregate_store
+import db
+import airport_edges
+import distinct_sketch
+import excel_streaming
+import flight_rollup
+import timeline
+import ingest
+import instrumentation
+import shared_join
+import snapshot
+import typed_fetch
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -15,68 +33,611 @@ warnings.filterwarnings('ignore')
 os.makedirs('charts', exist_ok=True)
 os.makedirs('exports', exist_ok=True)
 
+# Report queries shared by the sequential and parallel execution paths
+PIE_CHART_QUERY = """
+    SELECT 
+        a.airline_name as airline,
+        COUNT(DISTINCT f.flight_id) as flight_count,
+        COUNT(DISTINCT ap.airport_id) as airports_served
+    FROM airline a 
+    JOIN flights f ON a.airline_id = f.airline_id
+    JOIN airport ap ON f.departure_airport_id = ap.airport_id
+    GROUP BY a.airline_name
+    ORDER BY COUNT(DISTINCT f.flight_id) DESC
+    LIMIT 8;
+    """
+
+BAR_CHART_QUERY = """
+    SELECT 
+        b.booking_platform as platform,
+        COUNT(b.booking_id) as booking_count,
+        ROUND(AVG(b.price), 2) as avg_price
+    FROM booking b
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    JOIN flights f ON bf.flight_id = f.flight_id
+    GROUP BY b.booking_platform
+    ORDER BY COUNT(b.booking_id) DESC
+    LIMIT 10;
+    """
+
+# Busiest airports: joins airports to the unpivoted airport-flight edges
+HORIZONTAL_BAR_CHART_QUERY = airport_edges.HORIZONTAL_BAR_CHART_EDGE_QUERY.format(
+    edges=airport_edges.edge_source())
+
+LINE_CHART_QUERY = """
+    SELECT 
+        f.status as flight_status,
+        COUNT(f.flight_id) as flight_count,
+        COUNT(DISTINCT a.airline_id) as airlines_count,
+        COUNT(DISTINCT ap.airport_id) as airports_count
+    FROM flights f
+    JOIN airline a ON f.airline_id = a.airline_id
+    JOIN airport ap ON f.departure_airport_id = ap.airport_id
+    GROUP BY f.status
+    ORDER BY f.status;
+    """
+
+HISTOGRAM_QUERY = """
+    SELECT 
+        b.price as ticket_price
+    FROM booking b
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    JOIN flights f ON bf.flight_id = f.flight_id
+    WHERE b.price > 0;
+    """
+
+# Histogram binned in the database: bin counts plus min/max/mean/median,
+# about 25 numbers instead of every ticket price
+HISTOGRAM_BINNED_QUERY = f"""
+    WITH prices AS (
+        SELECT b.price
+        FROM booking b
+        JOIN booking_flight bf ON b.booking_id = bf.booking_id
+        JOIN flights f ON bf.flight_id = f.flight_id
+        WHERE b.price > 0
+    ),
+    bounds AS (
+        SELECT
+            MIN(price) as min_price,
+            MAX(price) as max_price,
+            AVG(price) as mean_price,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY price) as median_price,
+            percentile_cont(0.9) WITHIN GROUP (ORDER BY price) as p90_price,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY price) as p95_price,
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY price) as p99_price,
+            COUNT(*) as total_bookings
+        FROM prices
+    )
+    SELECT
+        CASE WHEN bd.max_price = bd.min_price THEN {HISTOGRAM_BINS // 2 + 1}
+             ELSE LEAST(width_bucket(p.price, bd.min_price, bd.max_price, {HISTOGRAM_BINS}), {HISTOGRAM_BINS})
+        END as bin,
+        COUNT(*) as bin_count,
+        bd.min_price, bd.max_price, bd.mean_price, bd.median_price,
+        bd.p90_price, bd.p95_price, bd.p99_price, bd.total_bookings
+    FROM prices p
+    CROSS JOIN bounds bd
+    GROUP BY 1, bd.min_price, bd.max_price, bd.mean_price, bd.median_price,
+        bd.p90_price, bd.p95_price, bd.p99_price, bd.total_bookings
+    ORDER BY 1;
+    """
+
+SCATTER_PLOT_QUERY = """
+    SELECT 
+        bag.weight_in_kg as baggage_weight,
+        b.price as ticket_price
+    FROM baggage bag
+    JOIN booking b ON bag.booking_id = b.booking_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    JOIN flights f ON bf.flight_id = f.flight_id
+    WHERE bag.weight_in_kg > 0 AND b.price > 0
+    LIMIT 200;
+    """
+
+# Scatter plot from a seeded random sample of baggage rows. Correlation and
+# regression coefficients are computed over the full join and attached to
+# every sampled row, so accuracy does not depend on the sample size.
+SCATTER_SAMPLE_QUERY = """
+    WITH stats AS (
+        SELECT
+            COUNT(*) as total_points,
+            corr(b.price, bag.weight_in_kg) as correlation,
+            regr_slope(b.price, bag.weight_in_kg) as slope,
+            regr_intercept(b.price, bag.weight_in_kg) as intercept
+        FROM baggage bag
+        JOIN booking b ON bag.booking_id = b.booking_id
+        JOIN booking_flight bf ON b.booking_id = bf.booking_id
+        JOIN flights f ON bf.flight_id = f.flight_id
+        WHERE bag.weight_in_kg > 0 AND b.price > 0
+    ),
+    sample AS (
+        SELECT
+            bag.weight_in_kg as baggage_weight,
+            b.price as ticket_price
+        FROM baggage bag TABLESAMPLE BERNOULLI (%(percent)s) REPEATABLE (%(seed)s)
+        JOIN booking b ON bag.booking_id = b.booking_id
+        JOIN booking_flight bf ON b.booking_id = bf.booking_id
+        JOIN flights f ON bf.flight_id = f.flight_id
+        WHERE bag.weight_in_kg > 0 AND b.price > 0
+        -- Seeded random order, so the LIMIT trims uniformly rather than keeping the start of the heap
+        ORDER BY md5(bag.baggage_id::text || ':' || bf.booking_flight_id::text || ':' || %(seed)s::text)
+        LIMIT %(sample_size)s
+    )
+    SELECT s.baggage_weight, s.ticket_price, st.total_points, st.correlation, st.slope, st.intercept
+    FROM sample s
+    CROSS JOIN stats st;
+    """
+
+TIMELINE_QUERY = """
+    SELECT 
+        a.airline_name as airline,
+        f.status as flight_status,
+        TO_CHAR(f.scheduled_departure, 'YYYY-MM') as month,
+        COUNT(f.flight_id) as flight_count
+    FROM airline a
+    JOIN flights f ON a.airline_id = f.airline_id
+    WHERE f.scheduled_departure IS NOT NULL
+    GROUP BY a.airline_name, f.status, TO_CHAR(f.scheduled_departure, 'YYYY-MM')
+    ORDER BY TO_CHAR(f.scheduled_departure, 'YYYY-MM'), a.airline_name;
+    """
+
+REPORT_QUERIES = {
+    'pie_chart': PIE_CHART_QUERY,
+    'bar_chart': BAR_CHART_QUERY,
+    'horizontal_bar_chart': HORIZONTAL_BAR_CHART_QUERY,
+    'line_chart': LINE_CHART_QUERY,
+    'histogram': HISTOGRAM_QUERY,
+    'scatter_plot': SCATTER_PLOT_QUERY,
+    'interactive_timeline': TIMELINE_QUERY,
+}
+
+# Plotly timeline output in headless mode
+TIMELINE_HTML = 'charts/interactive_timeline.html'
+
+# p50/p90/p95/p99 of booking prices per platform and per status in one scan of
+# booking: both groupings come from GROUPING SETS, and the array form of
+# percentile_cont sorts each group once for all four percentiles
+PRICE_PERCENTILES_QUERY = """
+    SELECT
+        t.dimension as "Dimension",
+        t.value as "Value",
+        t.priced as "Priced Bookings",
+        ROUND(t.p[1]::numeric, 2) as "P50",
+        ROUND(t.p[2]::numeric, 2) as "P90",
+        ROUND(t.p[3]::numeric, 2) as "P95",
+        ROUND(t.p[4]::numeric, 2) as "P99"
+    FROM (
+        SELECT
+            CASE WHEN GROUPING(b.booking_platform) = 0 THEN 'platform' ELSE 'status' END as dimension,
+            CASE WHEN GROUPING(b.booking_platform) = 0 THEN b.booking_platform ELSE b.status END as value,
+            COUNT(b.price) as priced,
+            percentile_cont(ARRAY[0.5, 0.9, 0.95, 0.99]) WITHIN GROUP (ORDER BY b.price) as p
+        FROM booking b
+        GROUP BY GROUPING SETS ((b.booking_platform), (b.status))
+    ) t
+    ORDER BY 1, 2;
+    """
+
+# Queries for the sheets of the Excel report
+EXCEL_QUERIES = {
+    'Airlines_Performance': """
+        SELECT 
+            a.airline_name as "Airline Name",
+            COUNT(f.flight_id) as "Total Flights",
+            COUNT(DISTINCT f.departure_airport_id) as "Airports Served"
+        FROM airline a
+        LEFT JOIN flights f ON a.airline_id = f.airline_id
+        GROUP BY a.airline_name
+        ORDER BY COUNT(f.flight_id) DESC;
+    """,
+    'Airport_Traffic': airport_edges.AIRPORT_TRAFFIC_EDGE_QUERY.format(edges=airport_edges.edge_source()),
+    'Booking_Summary': """
+        SELECT 
+            b.booking_platform as "Platform",
+            COUNT(*) as "Bookings",
+            ROUND(AVG(b.price), 2) as "Avg Price",
+            ROUND(MIN(b.price), 2) as "Min Price",
+            ROUND(MAX(b.price), 2) as "Max Price"
+        FROM booking b
+        JOIN booking_flight bf ON b.booking_id = bf.booking_id
+        GROUP BY b.booking_platform
+        ORDER BY COUNT(*) DESC;
+    """,
+    'Price_Percentiles': PRICE_PERCENTILES_QUERY,
+}
+
+
 class SkyTrackAnalytics:
-    def __init__(self):
-        """Initialize database connection and matplotlib settings"""
-        self.db_config = {
-            'host': 'localhost',
-            'port': '5432',
-            'database': 'airport_analytics',
-            'user': 'postgres',
-            'password': '0000'
-        }
-        
-        connection_string = f"postgresql://{self.db_config['user']}:{self.db_config['password']}@{self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']}"
-        self.engine = create_engine(connection_string)
+    def __init__(self, max_workers=8, render_processes=None, use_cache=False, use_aggregates=False,
+                 use_edge_view=False, server_histogram=False, scatter_sample_size=None, scatter_seed=42,
+                 streaming_excel=False, headless=False, timeline_top_n=None,
+                 timeline_granularity='month', timeline_lazy_html=False, instrument=False,
+                 metrics_file=None, explain=False, snapshot_dir=None, typed_frames=False,
+                 shared_join=False, use_rollup=False, render_cache=False,
+                 approximate_distinct=False, raise_errors=False):
+        """
+        Initialize database connection and matplotlib settings
+        max_workers: number of report queries run at the same time in parallel mode
+        render_processes: size of the chart rendering process pool (None = CPU count)
+        use_cache: reuse query results until one of their source tables changes
+        use_aggregates: read flight counts from the incrementally maintained
+                        aggregate store and keep it updated on inserts
+        use_edge_view: read airport traffic from the airport_flight_edges
+                       materialized view instead of unpivoting flights inline
+        server_histogram: bin ticket prices in the database and fetch only
+                          the bin counts and summary statistics
+        scatter_sample_size: plot a seeded random sample of this many points and
+                             compute correlation/trend over the full join in SQL
+        scatter_seed: seed of the scatter sample (REPEATABLE), for stable charts
+        streaming_excel: write the Excel report in one streaming pass from
+                         server-side cursors (flat memory, no reformat pass)
+        headless: batch mode for cron/report hosts - non-interactive backend,
+                  no show() calls, Plotly output written to HTML files
+        timeline_top_n: keep the N busiest airlines in the timeline, fold the rest into "Other"
+        timeline_granularity: timeline period - 'day', 'week', 'month' or 'quarter'
+        timeline_lazy_html: write the timeline as a page that loads one small
+                            frame file per period instead of inlining all frames
+        instrument: record per-stage durations, rows, bytes and peak memory of every
+                    report as JSON lines in logs/report_stages.jsonl
+        metrics_file: also write the stage totals to this Prometheus text file
+        explain: also log EXPLAIN (ANALYZE, BUFFERS) for every report query
+        snapshot_dir: compute every chart and sheet from a columnar snapshot
+                      (python snapshot.py --dump) instead of querying the database;
+                      the scatter sample and timeline options are computed from it,
+                      approximate_distinct cannot be combined with it
+        typed_frames: fetch NUMERIC without Decimal objects and convert report columns to
+                      categoricals / int32 / float32 (schemas in typed_fetch); the memory
+                      of every report before and after conversion is printed
+        shared_join: materialize the booking-flight join once per run and read the
+                     bar chart, histogram, scatter plot and Booking_Summary from it
+        use_rollup: build the timeline from the daily flight rollup
+                    (python flight_rollup.py) instead of scanning flights
+        render_cache: skip rendering a chart file whose input DataFrame and render
+                      parameters hash to the key it was last rendered from
+                      (manifest in charts/render_manifest.json)
+        approximate_distinct: answer the distinct counts of the pie, line and airport
+                              charts and two Excel sheets from HyperLogLog sketches
+                              (python distinct_sketch.py --rebuild)
+        raise_errors: let chart and Excel export errors propagate instead of printing
+                      them (benchmarks must not time a failed report as a success)
+        """
+        if snapshot_dir and approximate_distinct:
+            raise ValueError("approximate_distinct reads sketches from the database and cannot use a snapshot")
+        self.max_workers = max_workers
+        self.use_aggregates = use_aggregates
+        self.use_edge_view = use_edge_view
+        self.server_histogram = server_histogram
+        self.scatter_sample_size = scatter_sample_size
+        self.scatter_seed = scatter_seed
+        self.streaming_excel = streaming_excel
+        self.headless = headless
+        self.timeline_top_n = timeline_top_n
+        self.timeline_granularity = timeline_granularity
+        self.timeline_lazy_html = timeline_lazy_html
+        # Seconds spent per artifact (fetch + render) during the last run
+        self.artifact_timings = {}
+        self._timings_lock = threading.Lock()
+        self.render_processes = render_processes
+        # DataFrames waiting for the process-pool rendering stage (None = render in place)
+        self._pending_renders = None
+        # Shared pooled engine (settings from skytrack.ini / SKYTRACK_DB_* variables).
+        # Parallel workers beyond pool_size + max_overflow wait for a free connection.
+        self.engine = db.get_engine()
+        self.cache = QueryCache(self.engine) if use_cache else None
+        self.render_cache = RenderCache() if render_cache else None
+        self.snapshot = snapshot.Snapshot(snapshot_dir) if snapshot_dir else None
+        self.typed_frames = typed_frames
+        self.shared_join = shared_join
+        self.use_rollup = use_rollup
+        self.approximate_distinct = approximate_distinct
+        self.raise_errors = raise_errors
+        # Name of this run's shared join table while it is built and current
+        self._shared_join_table = None
+        # Bytes per report DataFrame (before, after the schema) during the last run
+        self.report_memory = {}
+        self.instrumentation = None
+        if instrument or metrics_file or explain:
+            self.instrumentation = instrumentation.StageRecorder(metrics_path=metrics_file, explain=explain)
         
         # Configure matplotlib default settings
+        if headless:
+            plt.switch_backend('Agg')
         plt.style.use('default')
         plt.rcParams['figure.figsize'] = (10, 6)
         plt.rcParams['font.size'] = 10
         
         print("Database connection established successfully")
     
-    def create_pie_chart(self):
+    def _read_sql(self, query, params=None, report=None):
+        """
+        Run a report query and return the result as a DataFrame. With a shared
+        join the query is rewritten to read it; the cache still keys on the
+        original query, since the shared table gets a new name every run.
+        """
+        run_query = query
+        if self._shared_join_table:
+            run_query = shared_join.rewrite(query, self._shared_join_table)
+        if self.instrumentation is not None or self.typed_frames:
+            fetch = lambda: self._cursor_read(report or 'query', run_query, params)
+        else:
+            fetch = lambda: pd.read_sql_query(run_query, self.engine, params=params)
+        if self.cache is not None:
+            mode = 'typed' if self.typed_frames else 'plain'
+            return self.cache.get_or_fetch(query, params, fetch, mode=mode)
+        return fetch()
+    
+    def _cursor_read(self, report, query, params=None):
+        """
+        Equivalent of read_sql_query on a plain cursor: execution, row fetch and
+        DataFrame construction are recorded as separate stages, and in typed mode
+        NUMERIC values are parsed straight into floats
+        """
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            if self.typed_frames:
+                psycopg2.extensions.register_type(typed_fetch.NUMERIC_AS_FLOAT, cursor)
+            with self._stage(report, 'query'):
+                cursor.execute(query, params)
+            with self._stage(report, 'fetch') as stage:
+                rows = cursor.fetchall()
+                stage['rows'] = len(rows)
+            columns = [column[0] for column in cursor.description]
+            with self._stage(report, 'dataframe') as stage:
+                df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                stage['rows'] = len(df)
+                if self.instrumentation is not None:
+                    stage['bytes'] = typed_fetch.frame_memory(df)
+            # Runs after the timed stages so it does not affect them
+            if self.instrumentation is not None and self.instrumentation.explain:
+                self.instrumentation.record_plan(report, cursor, query, params)
+            cursor.close()
+            conn.rollback()
+        finally:
+            conn.close()
+        return df
+    
+    def _stage(self, report, stage):
+        """Instrumentation stage context, or a no-op when instrumentation is off"""
+        if self.instrumentation is None:
+            return nullcontext({})
+        return self.instrumentation.stage(report, stage)
+    
+    def _report_query(self, name):
+        """SQL for a chart report in the current mode"""
+        if self.use_aggregates and name in ('pie_chart', 'line_chart') and self._aggregates_reconciled():
+            if name == 'pie_chart':
+                return aggregate_store.PIE_CHART_AGGREGATE_QUERY
+            return aggregate_store.LINE_CHART_AGGREGATE_QUERY
+        if self.use_edge_view and name == 'horizontal_bar_chart':
+            return airport_edges.HORIZONTAL_BAR_CHART_EDGE_QUERY.format(edges=airport_edges.EDGE_VIEW)
+        if self.server_histogram and name == 'histogram':
+            return HISTOGRAM_BINNED_QUERY
+        if self.scatter_sample_size and name == 'scatter_plot':
+            return SCATTER_SAMPLE_QUERY
+        if self.use_rollup and name == 'interactive_timeline':
+            return flight_rollup.TIMELINE_ROLLUP_QUERY
+        if self._scalable_timeline() and name == 'interactive_timeline':
+            return timeline.SCALABLE_TIMELINE_QUERY
+        return REPORT_QUERIES[name]
+    
+    def _aggregates_reconciled(self):
+        """Whether the aggregate store holds complete counts; if not, reports read the fact tables"""
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            reconciled = aggregate_store.is_reconciled(cursor)
+            cursor.close()
+            conn.rollback()
+        if not reconciled:
+            print(f"{aggregate_store.AGGREGATE_TABLE} has not been reconciled yet "
+                  f"(python aggregate_store.py --reconcile), reading flights instead")
+        return reconciled
+    
+    def _report_params(self, name):
+        """Query parameters for a chart report in the current mode"""
+        if self.scatter_sample_size and name == 'scatter_plot':
+            return {
+                'percent': self._scatter_sample_percent(),
+                'seed': self.scatter_seed,
+                'sample_size': self.scatter_sample_size,
+            }
+        if self.use_rollup and name == 'interactive_timeline':
+            return flight_rollup.timeline_params(self.timeline_top_n, self.timeline_granularity)
+        if self._scalable_timeline() and name == 'interactive_timeline':
+            return timeline.timeline_params(self.timeline_top_n, self.timeline_granularity)
+        return None
+    
+    def _snapshot_options(self, name):
+        """Snapshot builder options for a chart report in the current mode"""
+        if self.scatter_sample_size and name == 'scatter_plot':
+            return {'sample_size': self.scatter_sample_size, 'seed': self.scatter_seed}
+        if self._scalable_timeline() and name == 'interactive_timeline':
+            return {'top_n': self.timeline_top_n, 'granularity': self.timeline_granularity}
+        return {}
+    
+    def _scalable_timeline(self):
+        """Whether any scalable timeline option is enabled"""
+        return (self.timeline_top_n is not None or self.timeline_granularity != 'month'
+                or self.timeline_lazy_html)
+    
+    def _fetch_report(self, name):
+        """Fetch the data behind a chart report"""
+        if self.snapshot is not None:
+            df = self.snapshot.report(name, **self._snapshot_options(name))
+        elif self.approximate_distinct and name in distinct_sketch.REPORTS:
+            df = self._read_sketches(distinct_sketch.REPORTS[name], report=name)
+        else:
+            df = self._read_sql(self._report_query(name), self._report_params(name), report=name)
+        return self._compact(name, df, typed_fetch.REPORT_SCHEMAS.get(name))
+    
+    def _scatter_sample_percent(self):
+        """
+        BERNOULLI sampling percentage for baggage that yields about
+        scatter_sample_size joined rows (3x oversampled, so a somewhat stale
+        reltuples still gives a full sample; trimmed in seeded random order)
+        """
+        with self.engine.connect() as conn:
+            estimated_rows = conn.exec_driver_sql(
+                "SELECT reltuples FROM pg_class WHERE oid = 'baggage'::regclass;").scalar()
+        if not estimated_rows or estimated_rows <= 0:
+            return 100.0
+        return min(100.0, 100.0 * 3 * self.scatter_sample_size / estimated_rows)
+    
+    def _fetch_sheet(self, sheet_name, query):
+        """Fetch the data of one Excel sheet"""
+        if self.snapshot is not None:
+            df = self.snapshot.sheet(sheet_name)
+        elif self.approximate_distinct and sheet_name in distinct_sketch.SHEETS:
+            df = self._read_sketches(distinct_sketch.SHEETS[sheet_name], report='excel_report')
+        else:
+            df = self._read_sql(query, report='excel_report')
+        return self._compact(sheet_name, df, typed_fetch.SHEET_SCHEMAS.get(sheet_name))
+    
+    def _read_sketches(self, builder, report):
+        """DataFrame of an approximate distinct-count builder from distinct_sketch"""
+        with self._stage(report, 'query') as stage:
+            with db.connection() as conn:
+                cursor = conn.cursor()
+                df = builder(cursor)
+                cursor.close()
+                conn.rollback()
+            stage['rows'] = len(df)
+        return df
+    
+    def _compact(self, name, df, schema):
+        """In typed mode convert df to the report's schema and record its memory"""
+        if not self.typed_frames:
+            return df
+        before = typed_fetch.frame_memory(df)
+        df = typed_fetch.apply_schema(df, schema)
+        with self._timings_lock:
+            self.report_memory[name] = (before, typed_fetch.frame_memory(df))
+        return df
+    
+    def _excel_queries(self):
+        """Sheet name -> SQL for the Excel report in the current mode"""
+        queries = dict(EXCEL_QUERIES)
+        if self.use_edge_view:
+            queries['Airport_Traffic'] = airport_edges.AIRPORT_TRAFFIC_EDGE_QUERY.format(
+                edges=airport_edges.EDGE_VIEW)
+        return queries
+    
+    def _materialize_shared_join(self):
+        """Build the booking-flight join once for this run's booking reports"""
+        table = shared_join.run_table_name()
+        try:
+            with db.connection() as conn:
+                rows = shared_join.materialize(conn, table)
+        except Exception as e:
+            print(f"Shared join unavailable, reports join on their own: {e}")
+            self._drop_shared_join(table)
+            return
+        
+        self._shared_join_table = table
+        print(f"Shared booking-flight join materialized: {rows} rows in {table}")
+    
+    def _drop_shared_join(self, table=None):
+        """Drop this run's shared join table; reports join on their own again"""
+        table = table or self._shared_join_table
+        self._shared_join_table = None
+        if table is None:
+            return
+        try:
+            with db.connection() as conn:
+                shared_join.drop(conn, table)
+        except Exception as e:
+            print(f"Could not drop the shared join table {table}: {e}")
+    
+    def _chart_key(self, name, df, dpi=300):
+        """Render cache key of a PNG chart (None when the render cache is off)"""
+        if self.render_cache is None:
+            return None
+        spec = CHART_SPECS[name]
+        return self.render_cache.make_key(df, {
+            'chart': name,
+            'figsize': spec.figsize,
+            'filename': spec.filename,
+            'dpi': dpi,
+            'draw': function_source(spec.draw),
+        })
+    
+    def _render_chart(self, name, df):
+        """
+        Draw a chart from its spec in chart_rendering.
+        In process-render mode the DataFrame is only queued here and all queued
+        charts are rendered together in a process pool by _render_pending_charts.
+        With the render cache an unchanged chart is not saved again; in headless
+        mode it is not drawn at all.
+        """
+        if self._pending_renders is not None:
+            self._pending_renders[name] = df
+            return
+        
+        spec = CHART_SPECS[name]
+        key = self._chart_key(name, df)
+        unchanged = key is not None and self.render_cache.is_current(name, key, spec.filename)
+        if unchanged:
+            print(f"Unchanged since the last render, kept {spec.filename}")
+            if self.headless:
+                return
+        
+        with self._stage(name, 'figure') as stage:
+            fig = plt.figure(figsize=spec.figsize)
+            spec.draw(fig, df)
+            fig.tight_layout()
+            stage['rows'] = len(df)
+        if not unchanged:
+            with self._stage(name, 'savefig') as stage:
+                fig.savefig(spec.filename, dpi=300, bbox_inches='tight')
+                stage['bytes'] = os.path.getsize(spec.filename)
+            if key is not None:
+                self.render_cache.record(name, key, spec.filename)
+        if not self.headless:
+            plt.show()
+        # Release the figure so memory stays bounded across the run
+        plt.close(fig)
+    
+    def _render_pending_charts(self):
+        """Render all queued charts in parallel, one worker process per chart"""
+        frames, self._pending_renders = self._pending_renders, None
+        if not frames:
+            return
+        
+        keys = {name: self._chart_key(name, df) for name, df in frames.items()}
+        if self.render_cache is not None:
+            for name, key in keys.items():
+                if self.render_cache.is_current(name, key, CHART_SPECS[name].filename):
+                    print(f"Unchanged since the last render, kept {CHART_SPECS[name].filename}")
+                    del frames[name]
+            if not frames:
+                return
+        
+        print(f"\nRendering {len(frames)} charts in a process pool...")
+        results = render_charts(frames, max_workers=self.render_processes)
+        for name, result in results.items():
+            if isinstance(result, Exception):
+                print(f"Error rendering {name}: {result}")
+            else:
+                if keys[name] is not None:
+                    self.render_cache.record(name, keys[name], result)
+                print(f"Rendered: {result}")
+    
+    def create_pie_chart(self, df=None):
         """
         Task 1.1: Pie chart showing flight distribution by airlines
         Uses 2 JOINs: airline -> flights -> airport
         """
         print("\nCreating pie chart...")
         
-        query = """
-        SELECT 
-            a.airline_name as airline,
-            COUNT(DISTINCT f.flight_id) as flight_count,
-            COUNT(DISTINCT ap.airport_id) as airports_served
-        FROM airline a 
-        JOIN flights f ON a.airline_id = f.airline_id
-        JOIN airport ap ON f.departure_airport_id = ap.airport_id
-        GROUP BY a.airline_name
-        ORDER BY COUNT(DISTINCT f.flight_id) DESC
-        LIMIT 8;
-        """
-        
         try:
-            df = pd.read_sql_query(query, self.engine)
+            if df is None:
+                df = self._fetch_report('pie_chart')
             
             if df.empty:
                 print("No data available for pie chart")
                 return
             
-            plt.figure(figsize=(10, 8))
-            colors = ['#FF9999', '#66B2FF', '#99FF99', '#FFCC99', '#FF99CC', '#99CCFF', '#FFB366', '#B3B3FF']
-            
-            wedges, texts, autotexts = plt.pie(df['flight_count'], 
-                                             labels=df['airline'], 
-                                             autopct='%1.1f%%',
-                                             colors=colors,
-                                             startangle=90)
-            
-            plt.title('Flight Distribution by Airlines', fontsize=14, fontweight='bold')
-            plt.axis('equal')
-            plt.tight_layout()
-            plt.savefig('charts/pie_chart_airlines.png', dpi=300, bbox_inches='tight')
-            plt.show()
+            self._render_chart('pie_chart', df)
             
             total_rows = len(df)
             total_flights = df['flight_count'].sum()
@@ -87,53 +648,26 @@ class SkyTrackAnalytics:
             print(f"SQL JOINs used: 2 (airline -> flights -> airport)")
             
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"Error creating pie chart: {e}")
     
-    def create_bar_chart(self):
+    def create_bar_chart(self, df=None):
         """
         Task 1.2: Bar chart showing top booking platforms
         Uses 2 JOINs: booking -> booking_flight -> flights
         """
         print("\nCreating bar chart...")
         
-        query = """
-        SELECT 
-            b.booking_platform as platform,
-            COUNT(b.booking_id) as booking_count,
-            ROUND(AVG(b.price), 2) as avg_price
-        FROM booking b
-        JOIN booking_flight bf ON b.booking_id = bf.booking_id
-        JOIN flights f ON bf.flight_id = f.flight_id
-        GROUP BY b.booking_platform
-        ORDER BY COUNT(b.booking_id) DESC
-        LIMIT 10;
-        """
-        
         try:
-            df = pd.read_sql_query(query, self.engine)
+            if df is None:
+                df = self._fetch_report('bar_chart')
             
             if df.empty:
                 print("No data available for bar chart")
                 return
             
-            plt.figure(figsize=(12, 6))
-            bars = plt.bar(range(len(df)), df['booking_count'], 
-                          color='skyblue', edgecolor='navy', linewidth=0.7)
-            
-            # Add value labels on top of bars
-            for i, (bar, count) in enumerate(zip(bars, df['booking_count'])):
-                plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
-                        str(count), ha='center', va='bottom', fontweight='bold')
-            
-            plt.title('Top 10 Booking Platforms by Volume', fontsize=14, fontweight='bold')
-            plt.xlabel('Booking Platform', fontsize=12)
-            plt.ylabel('Number of Bookings', fontsize=12)
-            plt.xticks(range(len(df)), [p[:15] + '...' if len(p) > 15 else p for p in df['platform']], rotation=45, ha='right')
-            plt.grid(axis='y', alpha=0.3)
-            
-            plt.tight_layout()
-            plt.savefig('charts/bar_chart_platforms.png', dpi=300, bbox_inches='tight')
-            plt.show()
+            self._render_chart('bar_chart', df)
             
             total_rows = len(df)
             print(f"Rows retrieved: {total_rows}")
@@ -143,59 +677,26 @@ class SkyTrackAnalytics:
             print(f"SQL JOINs used: 2 (booking -> booking_flight -> flights)")
             
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"Error creating bar chart: {e}")
     
-    def create_horizontal_bar_chart(self):
+    def create_horizontal_bar_chart(self, df=None):
         """
         Task 1.3: Horizontal bar chart showing busiest airports
-        Uses 2 JOINs: airport -> flights -> airline
+        Uses airport -> airport-flight edges (flights unpivoted into departure and arrival rows)
         """
         print("\nCreating horizontal bar chart...")
         
-        query = """
-        SELECT 
-            ap.airport_name as airport,
-            ap.city as city,
-            COUNT(DISTINCT f.flight_id) as flight_count,
-            COUNT(DISTINCT a.airline_id) as airlines_count
-        FROM airport ap
-        LEFT JOIN flights f ON (ap.airport_id = f.departure_airport_id OR ap.airport_id = f.arrival_airport_id)
-        LEFT JOIN airline a ON f.airline_id = a.airline_id
-        GROUP BY ap.airport_name, ap.city
-        HAVING COUNT(DISTINCT f.flight_id) > 0
-        ORDER BY COUNT(DISTINCT f.flight_id) DESC
-        LIMIT 15;
-        """
-        
         try:
-            df = pd.read_sql_query(query, self.engine)
+            if df is None:
+                df = self._fetch_report('horizontal_bar_chart')
             
             if df.empty:
                 print("No data available for horizontal bar chart")
                 return
             
-            plt.figure(figsize=(12, 8))
-            
-            labels = [f"{airport}\n({city})" for airport, city in zip(df['airport'], df['city'])]
-            
-            bars = plt.barh(range(len(df)), df['flight_count'], 
-                           color='lightcoral', edgecolor='darkred', linewidth=0.7)
-            
-            # Add value labels at the end of bars
-            for i, (bar, count) in enumerate(zip(bars, df['flight_count'])):
-                plt.text(bar.get_width() + 1, bar.get_y() + bar.get_height()/2,
-                        str(count), va='center', fontweight='bold')
-            
-            plt.title('Top 15 Busiest Airports by Flight Volume', fontsize=14, fontweight='bold')
-            plt.xlabel('Number of Flights', fontsize=12)
-            plt.ylabel('Airport', fontsize=12)
-            plt.yticks(range(len(df)), labels)
-            plt.grid(axis='x', alpha=0.3)
-            plt.gca().invert_yaxis()
-            
-            plt.tight_layout()
-            plt.savefig('charts/horizontal_bar_airports.png', dpi=300, bbox_inches='tight')
-            plt.show()
+            self._render_chart('horizontal_bar_chart', df)
             
             total_rows = len(df)
             top_airport = df.iloc[0]
@@ -203,60 +704,29 @@ class SkyTrackAnalytics:
             print(f"Graph type: Horizontal bar chart")
             print(f"Shows: Major transportation hubs. Busiest: {top_airport['airport']} ({top_airport['flight_count']} flights)")
             print(f"Saved to: charts/horizontal_bar_airports.png")
-            print(f"SQL JOINs used: 2 (airport -> flights -> airline)")
+            print(f"SQL JOINs used: 1 (airport -> airport-flight edges from flights)")
             
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"Error creating horizontal bar chart: {e}")
     
-    def create_line_chart(self):
+    def create_line_chart(self, df=None):
         """
         Task 1.4: Line chart showing flight distribution by status
         Uses 2 JOINs: flights -> airline -> airport
         """
         print("\nCreating line chart...")
         
-        query = """
-        SELECT 
-            f.status as flight_status,
-            COUNT(f.flight_id) as flight_count,
-            COUNT(DISTINCT a.airline_id) as airlines_count,
-            COUNT(DISTINCT ap.airport_id) as airports_count
-        FROM flights f
-        JOIN airline a ON f.airline_id = a.airline_id
-        JOIN airport ap ON f.departure_airport_id = ap.airport_id
-        GROUP BY f.status
-        ORDER BY f.status;
-        """
-        
         try:
-            df = pd.read_sql_query(query, self.engine)
+            if df is None:
+                df = self._fetch_report('line_chart')
             
             if df.empty:
                 print("No data available for line chart")
                 return
             
-            plt.figure(figsize=(12, 6))
-            
-            plt.plot(df['flight_status'], df['flight_count'], 
-                    marker='o', linewidth=3, markersize=8, 
-                    color='green', markerfacecolor='lightgreen', 
-                    markeredgecolor='darkgreen', markeredgewidth=2)
-            
-            # Add value labels above each point
-            for i, (status, count) in enumerate(zip(df['flight_status'], df['flight_count'])):
-                plt.annotate(str(count), (i, count), 
-                           textcoords="offset points", xytext=(0,10), ha='center',
-                           fontweight='bold', fontsize=11)
-            
-            plt.title('Flight Count by Status', fontsize=14, fontweight='bold')
-            plt.xlabel('Flight Status', fontsize=12)
-            plt.ylabel('Number of Flights', fontsize=12)
-            plt.xticks(rotation=45, ha='right')
-            plt.grid(True, alpha=0.3)
-            
-            plt.tight_layout()
-            plt.savefig('charts/line_chart_flight_status.png', dpi=300, bbox_inches='tight')
-            plt.show()
+            self._render_chart('line_chart', df)
             
             total_flights = df['flight_count'].sum()
             print(f"Rows retrieved: {len(df)}")
@@ -266,252 +736,232 @@ class SkyTrackAnalytics:
             print(f"SQL JOINs used: 2 (flights -> airline -> airport)")
             
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"Error creating line chart: {e}")
     
-    def create_histogram(self):
+    def create_histogram(self, df=None):
         """
         Task 1.5: Histogram showing ticket price distribution
         Uses 2 JOINs: booking -> booking_flight -> flights
         """
         print("\nCreating histogram...")
         
-        query = """
-        SELECT 
-            b.price as ticket_price
-        FROM booking b
-        JOIN booking_flight bf ON b.booking_id = bf.booking_id
-        JOIN flights f ON bf.flight_id = f.flight_id
-        WHERE b.price > 0;
-        """
-        
         try:
-            df = pd.read_sql_query(query, self.engine)
+            if df is None:
+                df = self._fetch_report('histogram')
             
             if df.empty:
                 print("No data available for histogram")
                 return
             
-            plt.figure(figsize=(12, 6))
-            
-            # Create histogram with colored bins
-            n, bins, patches = plt.hist(df['ticket_price'], bins=20, 
-                                       color='orange', alpha=0.7, 
-                                       edgecolor='darkorange', linewidth=1.2)
-            
-            # Apply gradient colors to bins
-            for i, patch in enumerate(patches):
-                patch.set_facecolor(plt.cm.viridis(i / len(patches)))
-            
-            plt.title('Distribution of Ticket Prices', fontsize=14, fontweight='bold')
-            plt.xlabel('Ticket Price ($)', fontsize=12)
-            plt.ylabel('Number of Bookings', fontsize=12)
-            plt.grid(axis='y', alpha=0.3)
-            
-            # Add mean and median lines
-            mean_price = df['ticket_price'].mean()
-            median_price = df['ticket_price'].median()
-            plt.axvline(mean_price, color='red', linestyle='--', linewidth=2, label=f'Mean: ${mean_price:.0f}')
-            plt.axvline(median_price, color='blue', linestyle='--', linewidth=2, label=f'Median: ${median_price:.0f}')
-            plt.legend()
-            
-            plt.tight_layout()
-            plt.savefig('charts/histogram_ticket_prices.png', dpi=300, bbox_inches='tight')
-            plt.show()
-            
-            total_bookings = len(df)
-            print(f"Rows retrieved: {total_bookings}")
+            self._render_chart('histogram', df)
+            
+            if 'bin_count' in df.columns:
+                # Pre-binned in the database: statistics come with every row
+                total_bookings = int(df['total_bookings'].iloc[0])
+                min_price = float(df['min_price'].iloc[0])
+                max_price = float(df['max_price'].iloc[0])
+                mean_price = float(df['mean_price'].iloc[0])
+                tail = [float(df[f'{p}_price'].iloc[0]) for p in ('p90', 'p95', 'p99')]
+                print(f"Rows retrieved: {len(df)} bins covering {total_bookings} bookings")
+            else:
+                total_bookings = len(df)
+                min_price = df['ticket_price'].min()
+                max_price = df['ticket_price'].max()
+                mean_price = df['ticket_price'].mean()
+                tail = df['ticket_price'].astype(float).quantile([0.9, 0.95, 0.99]).tolist()
+                print(f"Rows retrieved: {total_bookings}")
             print(f"Graph type: Histogram")
-            print(f"Shows: Price distribution (Range: ${df['ticket_price'].min():.2f}-${df['ticket_price'].max():.2f}, Avg: ${mean_price:.2f})")
+            print(f"Shows: Price distribution (Range: ${min_price:.2f}-${max_price:.2f}, Avg: ${mean_price:.2f})")
+            print(f"Tail prices: p90 ${tail[0]:.2f}, p95 ${tail[1]:.2f}, p99 ${tail[2]:.2f}")
             print(f"Saved to: charts/histogram_ticket_prices.png")
             print(f"SQL JOINs used: 2 (booking -> booking_flight -> flights)")
             
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"Error creating histogram: {e}")
     
-    def create_scatter_plot(self):
+    def create_scatter_plot(self, df=None):
         """
         Task 1.6: Scatter plot showing baggage weight vs ticket price correlation
         Uses 3 JOINs: baggage -> booking -> booking_flight -> flights
         """
         print("\nCreating scatter plot...")
         
-        query = """
-        SELECT 
-            bag.weight_in_kg as baggage_weight,
-            b.price as ticket_price
-        FROM baggage bag
-        JOIN booking b ON bag.booking_id = b.booking_id
-        JOIN booking_flight bf ON b.booking_id = bf.booking_id
-        JOIN flights f ON bf.flight_id = f.flight_id
-        WHERE bag.weight_in_kg > 0 AND b.price > 0
-        LIMIT 200;
-        """
-        
         try:
-            df = pd.read_sql_query(query, self.engine)
+            if df is None:
+                df = self._fetch_report('scatter_plot')
             
             if df.empty:
                 print("No data available for scatter plot")
                 return
             
-            plt.figure(figsize=(12, 8))
-            
-            plt.scatter(df['baggage_weight'], df['ticket_price'], 
-                       alpha=0.6, s=50, color='purple', edgecolors='indigo')
-            
-            plt.title('Relationship between Baggage Weight and Ticket Price', fontsize=14, fontweight='bold')
-            plt.xlabel('Baggage Weight (kg)', fontsize=12)
-            plt.ylabel('Ticket Price ($)', fontsize=12)
-            plt.grid(True, alpha=0.3)
-            
-            # Add trend line
-            z = np.polyfit(df['baggage_weight'], df['ticket_price'], 1)
-            p = np.poly1d(z)
-            plt.plot(df['baggage_weight'], p(df['baggage_weight']), "r--", alpha=0.8, linewidth=2)
+            self._render_chart('scatter_plot', df)
             
-            plt.tight_layout()
-            plt.savefig('charts/scatter_plot_baggage_price.png', dpi=300, bbox_inches='tight')
-            plt.show()
-            
-            total_points = len(df)
-            correlation = df['baggage_weight'].corr(df['ticket_price'])
-            print(f"Rows retrieved: {total_points}")
+            if 'correlation' in df.columns:
+                # Sampled points; r comes from the full join
+                correlation = float(df['correlation'].iloc[0])
+                print(f"Rows retrieved: {len(df)} sampled of {int(df['total_points'].iloc[0])}")
+            else:
+                total_points = len(df)
+                correlation = df['baggage_weight'].corr(df['ticket_price'])
+                print(f"Rows retrieved: {total_points}")
             print(f"Graph type: Scatter plot")
             print(f"Shows: Correlation between baggage weight and ticket price (r={correlation:.3f})")
             print(f"Saved to: charts/scatter_plot_baggage_price.png")
             print(f"SQL JOINs used: 3 (baggage -> booking -> booking_flight -> flights)")
             
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"Error creating scatter plot: {e}")
     
-    def create_interactive_timeline(self):
+    def create_interactive_timeline(self, df=None):
         """
         Task 2: Interactive Plotly chart with time slider
         Uses animation_frame parameter with real dates from scheduled_departure column
         """
         print("\nCreating interactive timeline with Plotly...")
         
-        query = """
-        SELECT 
-            a.airline_name as airline,
-            f.status as flight_status,
-            TO_CHAR(f.scheduled_departure, 'YYYY-MM') as month,
-            COUNT(f.flight_id) as flight_count
-        FROM airline a
-        JOIN flights f ON a.airline_id = f.airline_id
-        WHERE f.scheduled_departure IS NOT NULL
-        GROUP BY a.airline_name, f.status, TO_CHAR(f.scheduled_departure, 'YYYY-MM')
-        ORDER BY TO_CHAR(f.scheduled_departure, 'YYYY-MM'), a.airline_name;
-        """
-        
         try:
-            df = pd.read_sql_query(query, self.engine)
+            if df is None:
+                df = self._fetch_report('interactive_timeline')
             
             if df.empty:
                 print("No data available for interactive chart")
                 return
             
-            # Create animated scatter plot with time slider
-            fig = px.scatter(df, 
-                           x="airline", 
-                           y="flight_count",
-                           animation_frame="month",
-                           size="flight_count",
-                           color="flight_status",
-                           title="Flight Count Evolution by Airline (Monthly Timeline)",
-                           labels={
-                               "airline": "Airline",
-                               "flight_count": "Number of Flights",
-                               "flight_status": "Flight Status"
-                           },
-                           range_y=[0, df['flight_count'].max() + 5])
-            
-            fig.update_layout(
-                width=1200,
-                height=700,
-                title_font_size=16,
-                xaxis_tickangle=-45
-            )
-            
-            fig.show()
+            # Scalable mode returns a generic period column instead of month
+            period_column = 'period' if 'period' in df.columns else 'month'
+            title = timeline.timeline_title(self.timeline_granularity)
+            
+            if self.timeline_lazy_html:
+                with self._stage('interactive_timeline', 'savefig') as stage:
+                    path = timeline.write_lazy_timeline(df, title=title)
+                    stage['rows'] = len(df)
+                print(f"Saved to: {path} (one frame file per period, loaded on demand)")
+            else:
+                # Only the headless HTML file is cached; interactive mode always shows the figure
+                key = None
+                if self.headless and self.render_cache is not None:
+                    key = self.render_cache.make_key(df, {
+                        'chart': 'interactive_timeline',
+                        'filename': TIMELINE_HTML,
+                        'scalable': self._scalable_timeline(),
+                        'title': title,
+                        'draw': function_source(SkyTrackAnalytics.create_interactive_timeline),
+                    })
+                if key is not None and self.render_cache.is_current('interactive_timeline', key, TIMELINE_HTML):
+                    print(f"Unchanged since the last render, kept {TIMELINE_HTML}")
+                else:
+                    # Create animated scatter plot with time slider
+                    with self._stage('interactive_timeline', 'figure') as stage:
+                        fig = px.scatter(df, 
+                                       x="airline", 
+                                       y="flight_count",
+                                       animation_frame=period_column,
+                                       size="flight_count",
+                                       color="flight_status",
+                                       title=title,
+                                       labels={
+                                           "airline": "Airline",
+                                           "flight_count": "Number of Flights",
+                                           "flight_status": "Flight Status"
+                                       },
+                                       range_y=[0, df['flight_count'].max() + 5],
+                                       render_mode='webgl' if self._scalable_timeline() else 'auto')
+                    
+                        fig.update_layout(
+                            width=1200,
+                            height=700,
+                            title_font_size=16,
+                            xaxis_tickangle=-45
+                        )
+                        stage['rows'] = len(df)
+                
+                    if self.headless:
+                        with self._stage('interactive_timeline', 'savefig') as stage:
+                            fig.write_html(TIMELINE_HTML)
+                            stage['bytes'] = os.path.getsize(TIMELINE_HTML)
+                        if key is not None:
+                            self.render_cache.record('interactive_timeline', key, TIMELINE_HTML)
+                        print(f"Saved to: {TIMELINE_HTML}")
+                    else:
+                        fig.show()
             
             total_airlines = df['airline'].nunique()
-            total_months = df['month'].nunique()
+            total_periods = df[period_column].nunique()
             print(f"Interactive timeline created successfully")
-            print(f"Shows: Airline performance evolution across {total_months} months")
+            print(f"Shows: Airline performance evolution across {total_periods} periods")
             print(f"Airlines tracked: {total_airlines}")
             print(f"Time data source: scheduled_departure column from flights table")
             print(f"Use the slider at the bottom to navigate through time periods")
             
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"Error creating interactive timeline: {e}")
     
-    def export_to_excel(self):
+    def export_to_excel(self, frames=None):
         """
         Task 3: Export data to Excel with advanced formatting
         Includes: frozen headers, filters, gradient fills, conditional formatting
+        frames: optional {sheet_name: DataFrame} already fetched by the parallel runner
         """
         print("\nExporting analytical data to Excel...")
         
-        # Define queries for different sheets
-        queries = {
-            'Airlines_Performance': """
-                SELECT 
-                    a.airline_name as "Airline Name",
-                    COUNT(f.flight_id) as "Total Flights",
-                    COUNT(DISTINCT f.departure_airport_id) as "Airports Served"
-                FROM airline a
-                LEFT JOIN flights f ON a.airline_id = f.airline_id
-                GROUP BY a.airline_name
-                ORDER BY COUNT(f.flight_id) DESC;
-            """,
-            'Airport_Traffic': """
-                SELECT 
-                    ap.airport_name as "Airport Name",
-                    ap.city as "City",
-                    COUNT(DISTINCT f.flight_id) as "Flight Count",
-                    COUNT(DISTINCT a.airline_id) as "Airlines Operating"
-                FROM airport ap
-                LEFT JOIN flights f ON (ap.airport_id = f.departure_airport_id OR ap.airport_id = f.arrival_airport_id)
-                LEFT JOIN airline a ON f.airline_id = a.airline_id
-                GROUP BY ap.airport_name, ap.city
-                ORDER BY COUNT(DISTINCT f.flight_id) DESC;
-            """,
-            'Booking_Summary': """
-                SELECT 
-                    b.booking_platform as "Platform",
-                    COUNT(*) as "Bookings",
-                    ROUND(AVG(b.price), 2) as "Avg Price",
-                    ROUND(MIN(b.price), 2) as "Min Price",
-                    ROUND(MAX(b.price), 2) as "Max Price"
-                FROM booking b
-                JOIN booking_flight bf ON b.booking_id = bf.booking_id
-                GROUP BY b.booking_platform
-                ORDER BY COUNT(*) DESC;
-            """
-        }
+        queries = self._excel_queries()
         
         try:
             filename = 'exports/skytrack_analytics_report.xlsx'
             
+            if self.streaming_excel and frames is None and self.snapshot is None:
+                # Single write-only pass, formatting applied while rows stream in
+                if self._shared_join_table:
+                    queries = {name: shared_join.rewrite(query, self._shared_join_table)
+                               for name, query in queries.items()}
+                with self._stage('excel_report', 'excel_write') as stage:
+                    total_rows = excel_streaming.export_queries(self.engine, filename, queries)
+                    stage['rows'] = total_rows
+                print(f"Created file: {filename}, {len(queries)} sheets, {total_rows} rows (streamed)")
+                return
+            
             # Write data to Excel
             with pd.ExcelWriter(filename, engine='openpyxl') as writer:
                 total_rows = 0
                 
                 for sheet_name, query in queries.items():
-                    df = pd.read_sql_query(query, self.engine)
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+                    if frames is not None:
+                        df = frames[sheet_name]
+                    else:
+                        df = self._fetch_sheet(sheet_name, query)
+                    with self._stage('excel_report', 'excel_write') as stage:
+                        df.to_excel(writer, sheet_name=sheet_name, index=False)
+                        stage['rows'] = len(df)
                     total_rows += len(df)
             
             # Apply formatting after writing
-            self._apply_excel_formatting(filename, list(queries.keys()))
+            with self._stage('excel_report', 'excel_write') as stage:
+                self._apply_excel_formatting(filename, list(queries.keys()))
+                stage['bytes'] = os.path.getsize(filename)
             
             sheet_count = len(queries)
             print(f"Created file: {filename}, {sheet_count} sheets, {total_rows} rows")
             
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"Error during Excel export: {e}")
     
+    def price_percentiles(self):
+        """
+        p50/p90/p95/p99 of booking prices per platform and per status, computed
+        in the database (also the Price_Percentiles sheet of the Excel report)
+        """
+        return self._fetch_sheet('Price_Percentiles', EXCEL_QUERIES['Price_Percentiles'])
+    
     def _apply_excel_formatting(self, filename, sheet_names):
         """
         Apply Excel formatting: frozen panes, filters, gradients, conditional formatting
@@ -571,57 +1021,209 @@ class SkyTrackAnalytics:
         print("\n=== DEMO: Adding new flight for demonstration ===")
         
         try:
-            conn = psycopg2.connect(**self.db_config)
-            cursor = conn.cursor()
-            
-            # Insert new flight with current date
-            query = """
-            INSERT INTO flights (airline_id, departure_airport_id, arrival_airport_id, 
-                               status, scheduled_departure, scheduled_arrival, flight_no)
-            VALUES (1, 1, 2, 'Scheduled', CURRENT_DATE, CURRENT_DATE + INTERVAL '2 hours', 'DEMO001')
-            RETURNING flight_id;
-            """
+            with db.connection() as conn:
+                cursor = conn.cursor()
+                
+                # Insert new flight with current date
+                query = """
+                INSERT INTO flights (airline_id, departure_airport_id, arrival_airport_id, 
+                                   status, scheduled_departure, scheduled_arrival, flight_no)
+                VALUES (1, 1, 2, 'Scheduled', CURRENT_DATE, CURRENT_DATE + INTERVAL '2 hours', 'DEMO001')
+                RETURNING flight_id;
+                """
+                
+                cursor.execute(query)
+                flight_id = cursor.fetchone()[0]
+                
+                # Keep the aggregate store in step within the same transaction
+                if self.use_aggregates:
+                    aggregate_store.apply_flight_rows(
+                        cursor, [{'airline_id': 1, 'departure_airport_id': 1, 'status': 'Scheduled'}])
+                conn.commit()
+                cursor.close()
             
-            cursor.execute(query)
-            flight_id = cursor.fetchone()[0]
-            conn.commit()
+            # Only cached results that read from flights are affected
+            if self.cache is not None:
+                self.cache.invalidate_table('flights')
             
             print(f"New flight added successfully. Flight ID: {flight_id}")
-            print("Regenerate the chart to see the changes reflected in the visualization.")
-            
-            cursor.close()
-            conn.close()
+            print("Regenerate the chart to see the changes reflected in the visualization,")
+            print("or keep live_refresh.py running to have the affected charts redrawn on commit.")
             
         except Exception as e:
             print(f"Error adding demo flight: {e}")
     
-    def run_all_analytics(self):
+    def add_flights(self, flights):
+        """
+        Bulk-ingest path: COPY many flights (dicts keyed by ingest.FLIGHT_COLUMNS)
+        in batches and return their ids. Aggregates are updated as deltas.
+        """
+        with db.connection() as conn:
+            flight_ids = ingest.insert_flights(conn, flights, update_aggregates=self.use_aggregates)
+        
+        if self.cache is not None:
+            self.cache.invalidate_table('flights')
+        
+        print(f"Flights added: {len(flight_ids)}")
+        return flight_ids
+    
+    @contextmanager
+    def _timed(self, name):
+        """Add the time spent in the block to artifact_timings[name]"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._timings_lock:
+                self.artifact_timings[name] = self.artifact_timings.get(name, 0.0) + elapsed
+    
+    def _timed_call(self, name, function, *args):
+        """Call function(*args) and charge its duration to the named artifact"""
+        with self._timed(name):
+            return function(*args)
+    
+    def _print_timings(self):
+        """Per-artifact timing summary of the last run"""
+        print("\nArtifact timings:")
+        for name, seconds in self.artifact_timings.items():
+            print(f"   {name:<24} {seconds:8.2f} s")
+    
+    def _print_memory(self):
+        """Per-report DataFrame memory before and after the typed schema"""
+        print("\nReport memory (before -> after typed schema):")
+        for name, (before, after) in self.report_memory.items():
+            saved = 100.0 * (1 - after / before) if before else 0.0
+            print(f"   {name:<24} {before / 1024:10.1f} KB -> {after / 1024:10.1f} KB  (-{saved:.0f}%)")
+    
+    def _report_jobs(self):
+        """
+        Chart and timeline reports as (name, renderer) pairs.
+        Each renderer accepts the fetched DataFrame through its df argument.
+        """
+        return [
+            ('pie_chart', self.create_pie_chart),
+            ('bar_chart', self.create_bar_chart),
+            ('horizontal_bar_chart', self.create_horizontal_bar_chart),
+            ('line_chart', self.create_line_chart),
+            ('histogram', self.create_histogram),
+            ('scatter_plot', self.create_scatter_plot),
+            ('interactive_timeline', self.create_interactive_timeline),
+        ]
+    
+    def _run_parallel(self):
+        """
+        Send every report query at once over the engine's connection pool.
+        Results are rendered in the main thread as soon as they arrive
+        (pyplot is not thread-safe); the Excel export starts once all its sheets are in.
+        """
+        excel_queries = self._excel_queries()
+        excel_frames = {}
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for name, renderer in self._report_jobs():
+                futures[executor.submit(self._timed_call, name, self._fetch_report, name)] = (name, renderer)
+            streaming = self.streaming_excel and self.snapshot is None
+            if not streaming:
+                for sheet_name, query in excel_queries.items():
+                    future = executor.submit(self._timed_call, 'excel_report', self._fetch_sheet,
+                                             sheet_name, query)
+                    futures[future] = (sheet_name, None)
+            
+            for future in as_completed(futures):
+                name, renderer = futures[future]
+                try:
+                    df = future.result()
+                except Exception as e:
+                    print(f"Error fetching data for {name}: {e}")
+                    continue
+                
+                if renderer is not None:
+                    self._timed_call(name, renderer, df)
+                else:
+                    excel_frames[name] = df
+                    if len(excel_frames) == len(excel_queries):
+                        self._timed_call('excel_report', self.export_to_excel, excel_frames)
+        
+        if streaming:
+            # Streams from its own server-side cursors rather than prefetched frames
+            self._timed_call('excel_report', self.export_to_excel)
+        elif len(excel_frames) < len(excel_queries):
+            print("Excel export skipped: not all sheets could be fetched")
+    
+    def _run_reports(self, parallel, process_render):
+        """The charts, timeline and Excel export of one run"""
+        if process_render:
+            self._pending_renders = {}
+        
+        if parallel:
+            print(f"\n[PARALLEL MODE: all report queries running on up to {self.max_workers} connections]")
+            print("-" * 70)
+            self._run_parallel()
+        else:
+            print("\n[TASK 1: Creating 6 visualizations with minimum 2 JOINs each]")
+            print("-" * 70)
+            self._timed_call('pie_chart', self.create_pie_chart)
+            self._timed_call('bar_chart', self.create_bar_chart)
+            self._timed_call('horizontal_bar_chart', self.create_horizontal_bar_chart)
+            self._timed_call('line_chart', self.create_line_chart)
+            self._timed_call('histogram', self.create_histogram)
+            self._timed_call('scatter_plot', self.create_scatter_plot)
+            
+            print("\n" + "-" * 70)
+            print("[TASK 2: Interactive Plotly timeline with real date-based slider]")
+            print("-" * 70)
+            self._timed_call('interactive_timeline', self.create_interactive_timeline)
+            
+            print("\n" + "-" * 70)
+            print("[TASK 3: Excel export with advanced formatting]")
+            print("-" * 70)
+            self._timed_call('excel_report', self.export_to_excel)
+        
+        if process_render:
+            self._timed_call('chart_rendering', self._render_pending_charts)
+    
+    def run_all_analytics(self, parallel=False, process_render=False):
         """
         Main execution function
-        Runs all three assignment tasks in sequence
+        Runs all three assignment tasks in sequence, or with parallel=True
+        runs all report queries concurrently (up to max_workers at a time).
+        With process_render=True the six PNG charts are rendered after fetching,
+        in parallel worker processes.
         """
         print("=" * 70)
         print("SKYTRACK SOLUTIONS - COMPREHENSIVE ANALYTICS SUITE")
         print("=" * 70)
         
-        print("\n[TASK 1: Creating 6 visualizations with minimum 2 JOINs each]")
-        print("-" * 70)
-        self.create_pie_chart()
-        self.create_bar_chart()
-        self.create_horizontal_bar_chart()
-        self.create_line_chart()
-        self.create_histogram()
-        self.create_scatter_plot()
-        
-        print("\n" + "-" * 70)
-        print("[TASK 2: Interactive Plotly timeline with real date-based slider]")
-        print("-" * 70)
-        self.create_interactive_timeline()
+        self.artifact_timings = {}
+        self.report_memory = {}
+        if self.render_cache is not None:
+            self.render_cache.hits = self.render_cache.misses = 0
+        if self.shared_join and self.snapshot is None:
+            self._timed_call('shared_join', self._materialize_shared_join)
+        try:
+            self._run_reports(parallel, process_render)
+        finally:
+            # Later ad-hoc reports must not read this run's join after data changes
+            self._drop_shared_join()
         
-        print("\n" + "-" * 70)
-        print("[TASK 3: Excel export with advanced formatting]")
-        print("-" * 70)
-        self.export_to_excel()
+        self._print_timings()
+        if self.render_cache is not None:
+            print(f"\nRender cache: {self.render_cache.hits} unchanged, "
+                  f"{self.render_cache.misses} rendered ({self.render_cache.manifest_path})")
+        if self.approximate_distinct:
+            print(f"\nDistinct counts are approximate (HyperLogLog, standard error "
+                  f"{distinct_sketch.relative_error():.1%} at precision {distinct_sketch.DEFAULT_PRECISION})")
+        if self.typed_frames:
+            self._print_memory()
+        if self.instrumentation is not None:
+            print("\nReport stages:")
+            print(self.instrumentation.summary())
+            print(f"Stage records: {self.instrumentation.log_path}")
+            metrics_path = self.instrumentation.write_metrics()
+            if metrics_path:
+                print(f"Prometheus metrics: {metrics_path}")
         
         print("\n" + "=" * 70)
         print("ALL ANALYTICAL TASKS COMPLETED SUCCESSFULLY")
@@ -634,10 +1236,72 @@ class SkyTrackAnalytics:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SkyTrack analytics suite")
+    parser.add_argument('--parallel', action='store_true',
+                        help="run all report queries concurrently")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="maximum number of concurrent queries in parallel mode")
+    parser.add_argument('--process-render', action='store_true',
+                        help="render the PNG charts in parallel worker processes")
+    parser.add_argument('--render-processes', type=int, default=None,
+                        help="size of the chart rendering process pool")
+    parser.add_argument('--cache', action='store_true',
+                        help="reuse cached query results while their source tables are unchanged")
+    parser.add_argument('--aggregates', action='store_true',
+                        help="read flight counts from the incrementally maintained aggregate store")
+    parser.add_argument('--edge-view', action='store_true',
+                        help="read airport traffic from the airport_flight_edges materialized view")
+    parser.add_argument('--server-histogram', action='store_true',
+                        help="bin ticket prices in the database instead of fetching every price")
+    parser.add_argument('--scatter-sample', type=int, default=None,
+                        help="plot a random sample of N baggage/price points (stats over all rows)")
+    parser.add_argument('--scatter-seed', type=int, default=42,
+                        help="seed of the scatter plot sample")
+    parser.add_argument('--streaming-excel', action='store_true',
+                        help="stream the Excel report in write-only mode from server-side cursors")
+    parser.add_argument('--headless', action='store_true',
+                        help="batch mode: no windows, figures closed, Plotly written to HTML")
+    parser.add_argument('--timeline-top', type=int, default=None,
+                        help="show the N busiest airlines in the timeline, the rest as 'Other'")
+    parser.add_argument('--timeline-granularity', choices=['day', 'week', 'month', 'quarter'], default='month',
+                        help="timeline period")
+    parser.add_argument('--timeline-lazy', action='store_true',
+                        help="write a timeline page that loads each period on demand")
+    parser.add_argument('--instrument', action='store_true',
+                        help="log per-stage timings, rows, bytes and peak memory as JSON lines")
+    parser.add_argument('--metrics-file', default=None,
+                        help="also write stage totals to this Prometheus text file")
+    parser.add_argument('--explain', action='store_true',
+                        help="also log EXPLAIN (ANALYZE, BUFFERS) for every report query")
+    parser.add_argument('--typed', action='store_true',
+                        help="compact report DataFrames (categoricals, int32/float32, no Decimal)")
+    parser.add_argument('--shared-join', action='store_true',
+                        help="materialize the booking-flight join once and reuse it across reports")
+    parser.add_argument('--rollup', action='store_true',
+                        help="build the timeline from the daily flight rollup table")
+    parser.add_argument('--snapshot', default=None, metavar='DIR',
+                        help="build every report from a columnar snapshot instead of the database")
+    parser.add_argument('--render-cache', action='store_true',
+                        help="skip re-rendering charts whose data and parameters are unchanged")
+    parser.add_argument('--approximate', action='store_true',
+                        help="answer distinct counts from HyperLogLog sketches (distinct_sketch.py)")
+    args = parser.parse_args()
+    if args.snapshot and args.approximate:
+        parser.error("--approximate reads sketches from the database and cannot be combined with --snapshot")
+    
     # Initialize analytics system
-    analytics = SkyTrackAnalytics()
+    analytics = SkyTrackAnalytics(max_workers=args.workers, render_processes=args.render_processes,
+                                  use_cache=args.cache, use_aggregates=args.aggregates,
+                                  use_edge_view=args.edge_view, server_histogram=args.server_histogram,
+                                  scatter_sample_size=args.scatter_sample, scatter_seed=args.scatter_seed,
+                                  streaming_excel=args.streaming_excel, headless=args.headless,
+                                  timeline_top_n=args.timeline_top,
+                                  timeline_granularity=args.timeline_granularity,
+                                  timeline_lazy_html=args.timeline_lazy, instrument=args.instrument,
+                                  metrics_file=args.metrics_file, explain=args.explain,
+                                  snapshot_dir=args.snapshot, typed_frames=args.typed,
+                                  shared_join=args.shared_join, use_rollup=args.rollup,
+                                  render_cache=args.render_cache, approximate_distinct=args.approximate)
     
     # Run all analytics tasks
-    analytics.run_all_analytics()
-    
-    
\ No newline at end of file
+    analytics.run_all_analytics(parallel=args.parallel, process_render=args.process_render)
@@ -0,0 +1,163 @@
+"""
+End-to-end report benchmarks at several scale factors.
+
+For each scale the synthetic data set is (re)loaded, then every report is
+timed: each statement of queries.sql, the main.py report modes and every
+SkyTrackAnalytics chart plus the Excel export. Results are written as JSON
+keyed by git commit, so runs can be compared across commits.
+
+    python benchmark.py --scales 10000 100000 1000000 --repeat 3
+    python benchmark.py --scales 100000 --compare benchmarks/<old commit>.json
+
+Run it against a scratch database (SKYTRACK_DB_DATABASE=...): loading a
+scale drops and recreates the tables.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import analytics
+import db
+import main
+import report_registry
+import synthetic
+
+RESULTS_DIR = 'benchmarks'
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_sql(statement):
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(statement)
+        cursor.fetchall()
+        cursor.close()
+
+
+def _run_main(mode):
+    runner = {
+        'default': main.run_report,
+        'single_pass': main.run_single_pass_report,
+    }[mode]
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        runner(connection, cursor)
+        cursor.close()
+
+
+def benchmark_cases():
+    """(suite, report, callable) for every timed report"""
+    cases = []
+    for name, report in report_registry.load_reports().items():
+        cases.append(('queries.sql', name, lambda s=report.sql: _run_sql(s)))
+    for mode in ('default', 'single_pass'):
+        cases.append(('main.py', mode, lambda m=mode: _run_main(m)))
+
+    # Failed reports raise, so time_case records an error instead of a fast success
+    report = analytics.SkyTrackAnalytics(headless=True, raise_errors=True)
+    for name, renderer in report._report_jobs():
+        cases.append(('analytics.py', name, renderer))
+    cases.append(('analytics.py', 'excel_export', report.export_to_excel))
+    return cases
+
+
+def time_case(function, repeat):
+    """Wall-clock seconds of each run; report output is discarded"""
+    runs = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            function()
+            runs.append(time.perf_counter() - started)
+    return runs
+
+
+def run_benchmarks(scales, repeat=3, seed=42, load_data=True):
+    results = []
+    for scale in scales:
+        if load_data:
+            print(f"Loading scale {scale:,}")
+            with db.connection() as connection:
+                synthetic.load(connection, scale, seed, reset=True)
+
+        for suite, name, function in benchmark_cases():
+            entry = {'scale': scale, 'suite': suite, 'report': name}
+            try:
+                runs = time_case(function, repeat)
+                entry.update(runs=runs, min=min(runs), median=statistics.median(runs))
+                print(f"  {scale:>12,}  {suite:<13} {name:<22} {entry['median']:8.3f}s")
+            except Exception as e:
+                entry['error'] = str(e)
+                print(f"  {scale:>12,}  {suite:<13} {name:<22} failed: {e}")
+            results.append(entry)
+    return results
+
+
+def server_version():
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SHOW server_version;")
+        version = cursor.fetchone()[0]
+        cursor.close()
+    return version
+
+
+def compare(results, baseline_path):
+    """Print median time ratios against a previous results file"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['scale'], r['suite'], r['report']): r.get('median') for r in baseline['results']}
+
+    print(f"\nCompared with {baseline.get('commit')}:")
+    for entry in results:
+        old = previous.get((entry['scale'], entry['suite'], entry['report']))
+        new = entry.get('median')
+        if old and new:
+            print(f"  {entry['scale']:>12,}  {entry['suite']:<13} {entry['report']:<22} "
+                  f"{old:8.3f}s -> {new:8.3f}s  x{new / old:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SkyTrack reports on synthetic data")
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 100000],
+                        help="scale factors in flights")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-load', action='store_true', help="benchmark the data already loaded")
+    parser.add_argument('--output', default=None, help="results file (default benchmarks/<commit>.json)")
+    parser.add_argument('--compare', default=None, help="previous results file to compare against")
+    args = parser.parse_args()
+
+    commit = _git('rev-parse', '--short', 'HEAD') or 'unknown'
+    results = run_benchmarks(args.scales, args.repeat, args.seed, load_data=not args.no_load)
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': commit,
+            'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'postgres': server_version(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
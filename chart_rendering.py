@@ -0,0 +1,211 @@
+"""
+Chart rendering stage for SkyTrack analytics.
+
+Every chart is drawn with the object-oriented Figure API, so the same drawing
+code works both in the interactive pyplot session and in worker processes,
+where charts are rendered in parallel without touching global pyplot state.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib import cm
+from matplotlib.figure import Figure
+
+# Number of ticket price bins, shared with the in-database binning query
+HISTOGRAM_BINS = 20
+
+# draw: function(fig, df) that builds the chart on an empty figure
+ChartSpec = namedtuple('ChartSpec', ['draw', 'figsize', 'filename'])
+
+
+def draw_pie_chart(fig, df):
+    """Flight distribution by airlines"""
+    ax = fig.add_subplot()
+    colors = ['#FF9999', '#66B2FF', '#99FF99', '#FFCC99', '#FF99CC', '#99CCFF', '#FFB366', '#B3B3FF']
+
+    ax.pie(df['flight_count'],
+           labels=df['airline'],
+           autopct='%1.1f%%',
+           colors=colors,
+           startangle=90)
+
+    ax.set_title('Flight Distribution by Airlines', fontsize=14, fontweight='bold')
+    ax.axis('equal')
+
+
+def draw_bar_chart(fig, df):
+    """Top booking platforms by volume"""
+    ax = fig.add_subplot()
+    bars = ax.bar(range(len(df)), df['booking_count'],
+                  color='skyblue', edgecolor='navy', linewidth=0.7)
+
+    # Add value labels on top of bars
+    for bar, count in zip(bars, df['booking_count']):
+        ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
+                str(count), ha='center', va='bottom', fontweight='bold')
+
+    ax.set_title('Top 10 Booking Platforms by Volume', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Booking Platform', fontsize=12)
+    ax.set_ylabel('Number of Bookings', fontsize=12)
+    ax.set_xticks(range(len(df)))
+    ax.set_xticklabels([p[:15] + '...' if len(p) > 15 else p for p in df['platform']], rotation=45, ha='right')
+    ax.grid(axis='y', alpha=0.3)
+
+
+def draw_horizontal_bar_chart(fig, df):
+    """Busiest airports by flight volume"""
+    ax = fig.add_subplot()
+    labels = [f"{airport}\n({city})" for airport, city in zip(df['airport'], df['city'])]
+
+    bars = ax.barh(range(len(df)), df['flight_count'],
+                   color='lightcoral', edgecolor='darkred', linewidth=0.7)
+
+    # Add value labels at the end of bars
+    for bar, count in zip(bars, df['flight_count']):
+        ax.text(bar.get_width() + 1, bar.get_y() + bar.get_height()/2,
+                str(count), va='center', fontweight='bold')
+
+    ax.set_title('Top 15 Busiest Airports by Flight Volume', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Number of Flights', fontsize=12)
+    ax.set_ylabel('Airport', fontsize=12)
+    ax.set_yticks(range(len(df)))
+    ax.set_yticklabels(labels)
+    ax.grid(axis='x', alpha=0.3)
+    ax.invert_yaxis()
+
+
+def draw_line_chart(fig, df):
+    """Flight count by status"""
+    ax = fig.add_subplot()
+    ax.plot(df['flight_status'], df['flight_count'],
+            marker='o', linewidth=3, markersize=8,
+            color='green', markerfacecolor='lightgreen',
+            markeredgecolor='darkgreen', markeredgewidth=2)
+
+    # Add value labels above each point
+    for i, count in enumerate(df['flight_count']):
+        ax.annotate(str(count), (i, count),
+                    textcoords="offset points", xytext=(0, 10), ha='center',
+                    fontweight='bold', fontsize=11)
+
+    ax.set_title('Flight Count by Status', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Flight Status', fontsize=12)
+    ax.set_ylabel('Number of Flights', fontsize=12)
+    ax.set_xticks(range(len(df)))
+    ax.set_xticklabels(df['flight_status'], rotation=45, ha='right')
+    ax.grid(True, alpha=0.3)
+
+
+def draw_histogram(fig, df):
+    """
+    Distribution of ticket prices with mean and median lines.
+    df holds either raw ticket_price rows or bins computed in the database
+    (bin, bin_count, min_price, max_price, mean_price, median_price).
+    """
+    ax = fig.add_subplot()
+
+    if 'bin_count' in df.columns:
+        # Rebuild the same equal-width bins and weight each by its count
+        low, high = float(df['min_price'].iloc[0]), float(df['max_price'].iloc[0])
+        if low == high:
+            # Same range matplotlib uses when all values are equal
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, HISTOGRAM_BINS + 1)
+        counts = np.zeros(HISTOGRAM_BINS)
+        counts[df['bin'].astype(int).values - 1] = df['bin_count'].values
+        values, weights = edges[:-1], counts
+        mean_price = float(df['mean_price'].iloc[0])
+        median_price = float(df['median_price'].iloc[0])
+    else:
+        values, weights, edges = df['ticket_price'], None, HISTOGRAM_BINS
+        mean_price = df['ticket_price'].mean()
+        median_price = df['ticket_price'].median()
+
+    # Create histogram with colored bins
+    n, bins, patches = ax.hist(values, bins=edges, weights=weights,
+                               color='orange', alpha=0.7,
+                               edgecolor='darkorange', linewidth=1.2)
+
+    # Apply gradient colors to bins
+    for i, patch in enumerate(patches):
+        patch.set_facecolor(cm.viridis(i / len(patches)))
+
+    ax.set_title('Distribution of Ticket Prices', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Ticket Price ($)', fontsize=12)
+    ax.set_ylabel('Number of Bookings', fontsize=12)
+    ax.grid(axis='y', alpha=0.3)
+
+    # Add mean and median lines
+    ax.axvline(mean_price, color='red', linestyle='--', linewidth=2, label=f'Mean: ${mean_price:.0f}')
+    ax.axvline(median_price, color='blue', linestyle='--', linewidth=2, label=f'Median: ${median_price:.0f}')
+    ax.legend()
+
+
+def draw_scatter_plot(fig, df):
+    """
+    Baggage weight vs ticket price with a linear trend line.
+    If df carries slope/intercept computed over the full data, the trend line
+    uses them instead of a fit on the plotted points.
+    """
+    ax = fig.add_subplot()
+    ax.scatter(df['baggage_weight'], df['ticket_price'],
+               alpha=0.6, s=50, color='purple', edgecolors='indigo')
+
+    ax.set_title('Relationship between Baggage Weight and Ticket Price', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Baggage Weight (kg)', fontsize=12)
+    ax.set_ylabel('Ticket Price ($)', fontsize=12)
+    ax.grid(True, alpha=0.3)
+
+    # Add trend line
+    if 'slope' in df.columns:
+        z = [float(df['slope'].iloc[0]), float(df['intercept'].iloc[0])]
+    else:
+        z = np.polyfit(df['baggage_weight'].astype(float), df['ticket_price'].astype(float), 1)
+    p = np.poly1d(z)
+    ax.plot(df['baggage_weight'], p(df['baggage_weight'].astype(float)), "r--", alpha=0.8, linewidth=2)
+
+
+CHART_SPECS = {
+    'pie_chart': ChartSpec(draw_pie_chart, (10, 8), 'charts/pie_chart_airlines.png'),
+    'bar_chart': ChartSpec(draw_bar_chart, (12, 6), 'charts/bar_chart_platforms.png'),
+    'horizontal_bar_chart': ChartSpec(draw_horizontal_bar_chart, (12, 8), 'charts/horizontal_bar_airports.png'),
+    'line_chart': ChartSpec(draw_line_chart, (12, 6), 'charts/line_chart_flight_status.png'),
+    'histogram': ChartSpec(draw_histogram, (12, 6), 'charts/histogram_ticket_prices.png'),
+    'scatter_plot': ChartSpec(draw_scatter_plot, (12, 8), 'charts/scatter_plot_baggage_price.png'),
+}
+
+
+def render_chart(name, df, dpi=300, output_dir=None):
+    """
+    Render one chart to its PNG file without pyplot.
+    Safe to call in a worker process; returns the path of the saved file.
+    output_dir: write the PNG under this directory instead of charts/
+    """
+    spec = CHART_SPECS[name]
+    filename = spec.filename
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        filename = os.path.join(output_dir, os.path.basename(filename))
+    fig = Figure(figsize=spec.figsize)
+    spec.draw(fig, df)
+    fig.tight_layout()
+    fig.savefig(filename, dpi=dpi, bbox_inches='tight')
+    return filename
+
+
+def render_charts(frames, max_workers=None, dpi=300):
+    """
+    Render several charts in parallel in a process pool.
+    frames: {chart_name: DataFrame}; returns {chart_name: saved path or exception}
+    """
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {name: pool.submit(render_chart, name, df, dpi) for name, df in frames.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+    return results
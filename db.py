@@ -0,0 +1,140 @@
+"""
+Shared database connection layer for main.py, analytics.py and the tools.
+
+One SQLAlchemy engine (and its connection pool) is created per process and
+reused by every report, writer and maintenance job. Settings are read from,
+in increasing priority:
+
+    1. built-in defaults (local airport_analytics database)
+    2. an INI file - skytrack.ini, or the path in SKYTRACK_CONFIG - section [database]
+    3. environment variables SKYTRACK_DB_<KEY>, e.g. SKYTRACK_DB_PASSWORD
+
+Keys: host, port, database, user, password, pool_size, max_overflow,
+statement_timeout_ms, application_name.
+"""
+import configparser
+import os
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+
+DEFAULT_CONFIG = {
+    'host': 'localhost',
+    'port': '5432',
+    'database': 'airport_analytics',
+    'user': 'postgres',
+    'password': '0000',
+    'pool_size': '8',
+    'max_overflow': '4',
+    'statement_timeout_ms': '300000',
+    'application_name': 'skytrack',
+}
+
+CONFIG_FILE = 'skytrack.ini'
+ENV_PREFIX = 'SKYTRACK_DB_'
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def load_config():
+    """Connection settings merged from defaults, the config file and the environment"""
+    config = dict(DEFAULT_CONFIG)
+
+    path = os.environ.get('SKYTRACK_CONFIG', CONFIG_FILE)
+    parser = configparser.ConfigParser()
+    if parser.read(path) and parser.has_section('database'):
+        config.update(parser['database'])
+
+    for key in DEFAULT_CONFIG:
+        value = os.environ.get(ENV_PREFIX + key.upper())
+        if value is not None:
+            config[key] = value
+    return config
+
+
+def get_engine():
+    """Process-wide engine; the pool is created on first use and then reused"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            config = load_config()
+            url = URL.create(
+                'postgresql+psycopg2',
+                username=config['user'],
+                password=config['password'],
+                host=config['host'],
+                port=int(config['port']),
+                database=config['database'],
+            )
+            _engine = create_engine(
+                url,
+                pool_size=int(config['pool_size']),
+                max_overflow=int(config['max_overflow']),
+                # Replace connections dropped by the server before handing them out
+                pool_pre_ping=True,
+                connect_args={
+                    'options': f"-c statement_timeout={int(config['statement_timeout_ms'])}",
+                    'application_name': config['application_name'],
+                },
+            )
+        return _engine
+
+
+@contextmanager
+def connection():
+    """
+    Raw psycopg2 connection borrowed from the shared pool.
+    Rolled back if the block raises, returned to the pool on exit.
+    """
+    conn = get_engine().raw_connection()
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def driver_connection(conn):
+    """
+    The psycopg2 connection behind a pooled one. The pool wrapper forwards
+    attribute reads but not writes, so settings such as autocommit must be
+    set on the driver connection.
+    """
+    driver = getattr(conn, 'dbapi_connection', None) or getattr(conn, 'connection', None)
+    return driver if driver is not None else conn
+
+
+@contextmanager
+def autocommit(conn):
+    """
+    Run the block with autocommit on, e.g. for CREATE INDEX CONCURRENTLY or an
+    ANALYZE whose statistics must survive the pool's rollback on return
+    """
+    driver = driver_connection(conn)
+    driver.autocommit = True
+    try:
+        yield conn
+    finally:
+        driver.autocommit = False
+
+
+def stream_rows(query, params=None, itersize=10000, cursor_name='skytrack_stream'):
+    """
+    Iterate over a large result through a server-side (named) cursor,
+    fetching itersize rows per round trip instead of the whole result.
+    """
+    with connection() as conn:
+        cursor = conn.cursor(name=cursor_name)
+        cursor.itersize = itersize
+        try:
+            cursor.execute(query, params)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+            conn.rollback()
@@ -0,0 +1,448 @@
+"""
+Approximate COUNT(DISTINCT) for the flight reports with HyperLogLog sketches.
+
+The pie and line charts, the busiest-airport chart, the Airlines_Performance
+and Airport_Traffic sheets and main.py section 10 count distinct airlines and
+airports over all of flights, which costs a sort or hash per query. In
+approximate mode those counts come from HyperLogLog sketches kept in
+skytrack_distinct_sketches, one per metric, key and month of scheduled
+departure. Sketches are built in a single streaming pass over flights and
+merge by register-wise max, so any range of months (or several keys, e.g. all
+statuses for the overall totals) reduces to a merge of stored sketches.
+
+With 2^precision registers the standard error of a count is
+1.04 / sqrt(2^precision): 1.6% at the default precision 12, so about 95% of
+counts are within 3.3% of the exact value. Small counts - dozens of airports
+or airlines - use linear counting and are usually exact. A sketch is stored
+sparse (only its non-zero registers, 5 bytes each) while that is smaller than
+the dense 4 KB, so low-cardinality keys such as the airlines of one airport
+take a few hundred bytes. Row counts (flights per key) are stored exactly
+next to each sketch.
+
+Like the daily rollup, a refresh recomputes only the newest months; flights
+without a scheduled departure are kept in one undated bucket that only a
+rebuild recomputes.
+
+    python distinct_sketch.py --rebuild
+    python distinct_sketch.py --refresh --months 1 --every 900
+    python analytics.py --approximate
+    python main.py --approximate
+"""
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+import db
+
+SKETCH_TABLE = 'skytrack_distinct_sketches'
+
+DEFAULT_PRECISION = 12
+
+# NULL keys are stored as an empty string (key is part of the primary key)
+NULL_KEY = ''
+
+# Bucket of flights without a scheduled departure
+UNDATED = date(1, 1, 1)
+
+CREATE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {SKETCH_TABLE} (
+        metric TEXT NOT NULL,
+        key TEXT NOT NULL,
+        bucket DATE NOT NULL,
+        row_count BIGINT NOT NULL,
+        registers BYTEA NOT NULL,
+        PRIMARY KEY (metric, bucket, key)
+    );
+"""
+
+# metric -> (key column, counted column); airport metrics are built over the
+# airport-flight edges (one row per departure and per arrival airport)
+SKETCH_METRICS = {
+    'airports_by_airline': ('airline_id', 'departure_airport_id'),
+    'airlines_by_status': ('status', 'airline_id'),
+    'airports_by_status': ('status', 'departure_airport_id'),
+    'arrival_airports_by_status': ('status', 'arrival_airport_id'),
+    'airlines_by_airport': ('airport_id', 'airline_id'),
+}
+
+EDGE_METRICS = {'airlines_by_airport'}
+
+FLIGHTS_SQL = """
+    SELECT
+        flight_id,
+        airline_id,
+        status,
+        departure_airport_id,
+        arrival_airport_id,
+        date_trunc('month', scheduled_departure)::date as bucket
+    FROM flights
+    WHERE %(since)s::date IS NULL OR scheduled_departure >= %(since)s::date;
+"""
+
+FLIGHT_COLUMNS = ['flight_id', 'airline_id', 'status', 'departure_airport_id', 'arrival_airport_id', 'bucket']
+
+INSERT_SQL = f"""
+    INSERT INTO {SKETCH_TABLE} (metric, key, bucket, row_count, registers)
+    VALUES %s;
+"""
+
+INSERT_PAGE_SIZE = 1000
+
+# First byte of a sparse sketch; dense registers never exceed 64 - precision + 1
+SPARSE_MARKER = 0xFF
+
+READ_SQL = f"""
+    SELECT key, row_count, registers
+    FROM {SKETCH_TABLE}
+    WHERE metric = %(metric)s
+      AND (%(start)s::date IS NULL OR bucket >= %(start)s::date)
+      AND (%(end)s::date IS NULL OR bucket < %(end)s::date);
+"""
+
+
+def _leading_zeros(words):
+    """Leading zero bits of each non-zero uint64, by binary search over the shifts"""
+    zeros = np.zeros(len(words), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = words < (np.uint64(1) << np.uint64(64 - shift))
+        zeros[empty] += shift
+        words = np.where(empty, words << np.uint64(shift), words)
+    return zeros
+
+
+def hash_ids(values):
+    """64-bit hashes of integer ids; NULLs must be dropped beforehand"""
+    return pd.util.hash_array(np.asarray(values, dtype=np.int64))
+
+
+class HyperLogLog:
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        """
+        precision: log2 of the number of registers (4..18)
+        registers: uint8 register array of an existing sketch
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            registers = np.zeros(self.size, dtype=np.uint8)
+        self.registers = registers
+
+    @property
+    def relative_error(self):
+        """Standard error of count() relative to the true count"""
+        return 1.04 / np.sqrt(self.size)
+
+    def add_hashes(self, hashes):
+        """Add uint64 hashes; the top bits pick the register, the rest give the rank"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return self
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        # The sentinel bit bounds the rank at 64 - precision + 1
+        remainder = (hashes << np.uint64(self.precision)) | (np.uint64(1) << np.uint64(self.precision - 1))
+        np.maximum.at(self.registers, index, _leading_zeros(remainder) + 1)
+        return self
+
+    def add_ids(self, values):
+        """Add integer ids"""
+        return self.add_hashes(hash_ids(values))
+
+    def copy(self):
+        return HyperLogLog(self.precision, self.registers.copy())
+
+    def merge(self, other):
+        """Fold another sketch of the same precision into this one (union of the sets)"""
+        if other.precision != self.precision:
+            raise ValueError(f"cannot merge precision {other.precision} into {self.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """Estimated number of distinct values added"""
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and empty:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = self.size * np.log(self.size / empty)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        """
+        Dense registers, or when smaller the sparse form: marker, precision,
+        the uint32 indexes of the non-zero registers and then their values
+        """
+        index = np.flatnonzero(self.registers).astype('<u4')
+        if 2 + 5 * len(index) >= self.size:
+            return self.registers.tobytes()
+        return (bytes([SPARSE_MARKER, self.precision]) + index.tobytes()
+                + self.registers[index].tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Sketch from stored registers; dense precision follows from their number"""
+        data = bytes(data)
+        if data[:1] != bytes([SPARSE_MARKER]):
+            registers = np.frombuffer(data, dtype=np.uint8).copy()
+            return cls(int(registers.size).bit_length() - 1, registers)
+        sketch = cls(data[1])
+        count = (len(data) - 2) // 5
+        index = np.frombuffer(data, dtype='<u4', count=count, offset=2)
+        sketch.registers[index] = np.frombuffer(data, dtype=np.uint8, count=count, offset=2 + 4 * count)
+        return sketch
+
+
+def _key(value):
+    if value is None or value != value:
+        return NULL_KEY
+    # Id columns with NULLs arrive as floats
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _sketch_chunk(sketches, chunk, precision):
+    """Fold one chunk of flights into {(metric, key, bucket): [row_count, sketch]}"""
+    chunk['bucket'] = chunk['bucket'].where(chunk['bucket'].notna(), UNDATED)
+    edges = pd.concat([
+        chunk[['departure_airport_id', 'airline_id', 'bucket']].rename(columns={'departure_airport_id': 'airport_id'}),
+        chunk[['arrival_airport_id', 'airline_id', 'bucket']].rename(columns={'arrival_airport_id': 'airport_id'}),
+    ])
+    edges = edges[edges['airport_id'].notna()]
+
+    for metric, (key_column, value_column) in SKETCH_METRICS.items():
+        rows = edges if metric in EDGE_METRICS else chunk
+        for (key, bucket), group in rows.groupby([rows[key_column].map(_key), 'bucket'], sort=False):
+            entry = sketches.get((metric, key, bucket))
+            if entry is None:
+                entry = sketches[(metric, key, bucket)] = [0, HyperLogLog(precision)]
+            entry[0] += len(group)
+            entry[1].add_ids(group[value_column].dropna())
+
+
+def build_sketches(since=None, precision=DEFAULT_PRECISION, chunk_rows=100000):
+    """
+    Sketches of every metric, key and month from one streaming pass over
+    flights (from since on, or all of them); memory stays at one chunk plus
+    the sketches
+    """
+    sketches = {}
+    chunk = []
+    for row in db.stream_rows(FLIGHTS_SQL, {'since': since}, itersize=chunk_rows,
+                              cursor_name='skytrack_distinct_sketch'):
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            _sketch_chunk(sketches, pd.DataFrame(chunk, columns=FLIGHT_COLUMNS), precision)
+            chunk = []
+    if chunk:
+        _sketch_chunk(sketches, pd.DataFrame(chunk, columns=FLIGHT_COLUMNS), precision)
+    return sketches
+
+
+def ensure_schema(cursor):
+    """Create the sketch table if it does not exist yet"""
+    cursor.execute(CREATE_TABLE_SQL)
+
+
+def _recompute(connection, since, precision):
+    """Replace every bucket from since (None = all) with freshly built sketches"""
+    sketches = build_sketches(since, precision)
+    cursor = connection.cursor()
+    try:
+        ensure_schema(cursor)
+        cursor.execute(f"LOCK TABLE {SKETCH_TABLE} IN EXCLUSIVE MODE;")
+        if since is None:
+            cursor.execute(f"DELETE FROM {SKETCH_TABLE};")
+        else:
+            cursor.execute(f"DELETE FROM {SKETCH_TABLE} WHERE bucket >= %s;", (since,))
+        execute_values(cursor, INSERT_SQL, [
+            (metric, key, bucket, rows, sketch.to_bytes())
+            for (metric, key, bucket), (rows, sketch) in sketches.items()
+        ], page_size=INSERT_PAGE_SIZE)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(sketches)
+
+
+def rebuild(connection, precision=DEFAULT_PRECISION):
+    """Recompute every sketch; returns the number of sketches written"""
+    return _recompute(connection, None, precision)
+
+
+def refresh(connection, months=1, precision=DEFAULT_PRECISION):
+    """Recompute the sketches of the current month, the `months` before it and all later months"""
+    today = date.today()
+    month_index = today.year * 12 + today.month - 1 - months
+    return _recompute(connection, date(month_index // 12, month_index % 12 + 1, 1), precision)
+
+
+def read_sketches(cursor, metric, start=None, end=None):
+    """
+    {key: (row_count, merged sketch)} of one metric over the months in
+    [start, end) (None = unbounded; the undated bucket needs start=None).
+    Empty-string keys are returned as None.
+    """
+    cursor.execute(READ_SQL, {'metric': metric, 'start': start, 'end': end})
+    merged = {}
+    for key, rows, registers in cursor.fetchall():
+        key = None if key == NULL_KEY else key
+        sketch = HyperLogLog.from_bytes(registers)
+        if key in merged:
+            merged[key][0] += rows
+            merged[key][1].merge(sketch)
+        else:
+            merged[key] = [rows, sketch]
+    return {key: (rows, sketch) for key, (rows, sketch) in merged.items()}
+
+
+def merge_all(sketches):
+    """(row_count, sketch) over several keys, e.g. all statuses"""
+    total, merged = 0, None
+    for rows, sketch in sketches.values():
+        total += rows
+        merged = sketch.copy() if merged is None else merged.merge(sketch)
+    return total, merged
+
+
+def _count(sketch):
+    return sketch.count() if sketch is not None else 0
+
+
+def _int_keys(sketches):
+    """Sketches keyed by integer id (ids are stored as text keys)"""
+    return {int(key): value for key, value in sketches.items() if key is not None}
+
+
+def _labels(cursor, query):
+    cursor.execute(query)
+    return cursor.fetchall()
+
+
+def _merge_by_label(sketches, labels):
+    """
+    Merge the per-id sketches of ids sharing a label, as GROUP BY label does.
+    labels: [(id, *label)]; returns {label: (row_count, sketch or None)}
+    """
+    merged = {}
+    for item_id, *label in labels:
+        rows, sketch = sketches.get(item_id, (0, None))
+        total, current = merged.get(tuple(label), (0, None))
+        if sketch is not None:
+            current = sketch.copy() if current is None else current.merge(sketch)
+        merged[tuple(label)] = (total + rows, current)
+    return merged
+
+
+def relative_error(precision=DEFAULT_PRECISION):
+    """Standard error of the approximate counts at this precision"""
+    return HyperLogLog(precision).relative_error
+
+
+def pie_chart(cursor):
+    """PIE_CHART_QUERY columns: top 8 airlines by flights, distinct departure airports approximate"""
+    merged = _merge_by_label(_int_keys(read_sketches(cursor, 'airports_by_airline')),
+                             _labels(cursor, "SELECT airline_id, airline_name FROM airline;"))
+    df = pd.DataFrame([(name, rows, _count(sketch)) for (name,), (rows, sketch) in merged.items() if rows],
+                      columns=['airline', 'flight_count', 'airports_served'])
+    return df.sort_values('flight_count', ascending=False).head(8).reset_index(drop=True)
+
+
+def line_chart(cursor):
+    """LINE_CHART_QUERY columns: flights per status with approximate distinct airlines and airports"""
+    airlines = read_sketches(cursor, 'airlines_by_status')
+    airports = read_sketches(cursor, 'airports_by_status')
+    rows = [(status, count, _count(sketch), _count(airports.get(status, (0, None))[1]))
+            for status, (count, sketch) in airlines.items()]
+    # ORDER BY status: NULL sorts last
+    rows.sort(key=lambda row: (row[0] is None, row[0] or ''))
+    return pd.DataFrame(rows, columns=['flight_status', 'flight_count', 'airlines_count', 'airports_count'])
+
+
+def _airport_traffic(cursor):
+    """[(airport_name, city, flight_count, airlines_count)] for every airport"""
+    merged = _merge_by_label(_int_keys(read_sketches(cursor, 'airlines_by_airport')),
+                             _labels(cursor, "SELECT airport_id, airport_name, city FROM airport;"))
+    # Edge rows count a flight twice only if it departs and arrives at the same airport
+    rows = [(name, city, count, _count(sketch)) for (name, city), (count, sketch) in merged.items()]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows
+
+
+def horizontal_bar_chart(cursor):
+    """HORIZONTAL_BAR_CHART_QUERY columns: top 15 airports, distinct airlines approximate"""
+    rows = [row for row in _airport_traffic(cursor) if row[2]][:15]
+    return pd.DataFrame(rows, columns=['airport', 'city', 'flight_count', 'airlines_count'])
+
+
+def airlines_performance(cursor):
+    """Airlines_Performance sheet: every airline, distinct departure airports approximate"""
+    merged = _merge_by_label(_int_keys(read_sketches(cursor, 'airports_by_airline')),
+                             _labels(cursor, "SELECT airline_id, airline_name FROM airline;"))
+    df = pd.DataFrame([(name, rows, _count(sketch)) for (name,), (rows, sketch) in merged.items()],
+                      columns=['Airline Name', 'Total Flights', 'Airports Served'])
+    return df.sort_values('Total Flights', ascending=False).reset_index(drop=True)
+
+
+def airport_traffic(cursor):
+    """Airport_Traffic sheet: every airport, distinct airlines approximate"""
+    return pd.DataFrame(_airport_traffic(cursor),
+                        columns=['Airport Name', 'City', 'Flight Count', 'Airlines Operating'])
+
+
+def flight_totals(cursor):
+    """main.py section 10 rows: exact total flights, approximate distinct airlines and airports"""
+    total, airlines = merge_all(read_sketches(cursor, 'airlines_by_status'))
+    _, departures = merge_all(read_sketches(cursor, 'airports_by_status'))
+    _, arrivals = merge_all(read_sketches(cursor, 'arrival_airports_by_status'))
+    return [(total, _count(airlines), _count(departures), _count(arrivals))]
+
+
+# Approximate builders by chart report / Excel sheet name
+REPORTS = {
+    'pie_chart': pie_chart,
+    'horizontal_bar_chart': horizontal_bar_chart,
+    'line_chart': line_chart,
+}
+
+SHEETS = {
+    'Airlines_Performance': airlines_performance,
+    'Airport_Traffic': airport_traffic,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SkyTrack distinct-count sketch maintenance")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild every sketch in one pass over flights")
+    parser.add_argument('--refresh', action='store_true', help="rebuild only the newest months")
+    parser.add_argument('--months', type=int, default=1, help="months before the current one a refresh rebuilds")
+    parser.add_argument('--precision', type=int, default=DEFAULT_PRECISION,
+                        help="log2 of the registers per sketch (error 1.04/sqrt(2^p))")
+    parser.add_argument('--every', type=int, default=None, help="repeat the refresh every N seconds")
+    args = parser.parse_args()
+
+    if not (args.rebuild or args.refresh):
+        parser.print_help()
+    else:
+        print(f"Standard error of distinct counts: {relative_error(args.precision):.2%}")
+        with db.connection() as connection:
+            if args.rebuild:
+                started = time.time()
+                sketches = rebuild(connection, args.precision)
+                print(f"Sketches rebuilt: {sketches} in {time.time() - started:.2f}s")
+            while args.refresh:
+                started = time.time()
+                sketches = refresh(connection, args.months, args.precision)
+                print(f"Sketches refreshed: {sketches} in {time.time() - started:.2f}s")
+                if args.every is None:
+                    break
+                time.sleep(args.every)
@@ -0,0 +1,92 @@
+"""
+Streaming Excel export for SkyTrack analytics.
+
+Sheets are written with openpyxl's write-only mode while query results are
+read in chunks from a server-side cursor, so each row is serialized once and
+only one chunk is held in memory. The header style, frozen panes, auto-filter
+and color-scale rules are applied during that single write; the workbook is
+never reloaded.
+"""
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+HEADER_FONT = Font(name='Calibri', size=11, color="FFFFFF", bold=True)
+
+
+def _color_scale_rule():
+    """Gradient from min (red) through median (yellow) to max (green)"""
+    return ColorScaleRule(
+        start_type="min", start_color="FFAA0000",
+        mid_type="percentile", mid_value=50, mid_color="FFFFFF00",
+        end_type="max", end_color="FF00AA00"
+    )
+
+
+def _cell_value(value):
+    """Missing values are written as empty cells, like DataFrame.to_excel"""
+    return None if pd.isna(value) else value
+
+
+def write_sheet(workbook, sheet_name, chunks):
+    """
+    Append DataFrame chunks to a new write-only sheet.
+    Returns the number of data rows written.
+    """
+    ws = workbook.create_sheet(sheet_name)
+    # Panes must be frozen before the first row is streamed out
+    ws.freeze_panes = "B2"
+
+    columns = None
+    numeric_columns = []
+    row_count = 0
+
+    for chunk in chunks:
+        if columns is None:
+            columns = list(chunk.columns)
+            header = []
+            for name in columns:
+                cell = WriteOnlyCell(ws, value=name)
+                cell.fill = HEADER_FILL
+                cell.font = HEADER_FONT
+                header.append(cell)
+            ws.append(header)
+            # Color scales go on numeric columns after the first (label) column
+            numeric_columns = [idx for idx, name in enumerate(columns, start=1)
+                               if idx > 1 and pd.api.types.is_numeric_dtype(chunk[name])]
+
+        for row in chunk.itertuples(index=False, name=None):
+            ws.append([_cell_value(value) for value in row])
+        row_count += len(chunk)
+
+    if columns is not None and row_count > 0:
+        last_row = row_count + 1
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{last_row}"
+        for idx in numeric_columns:
+            letter = get_column_letter(idx)
+            ws.conditional_formatting.add(f"{letter}2:{letter}{last_row}", _color_scale_rule())
+
+    return row_count
+
+
+def export_queries(engine, filename, queries, chunksize=10000):
+    """
+    Stream every {sheet_name: query} into one workbook.
+    Returns the total number of data rows written.
+    """
+    workbook = Workbook(write_only=True)
+    total_rows = 0
+
+    for sheet_name, query in queries.items():
+        with engine.connect() as conn:
+            # Server-side cursor: rows arrive chunk by chunk instead of all at once
+            conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+            chunks = pd.read_sql_query(query, conn, chunksize=chunksize)
+            total_rows += write_sheet(workbook, sheet_name, chunks)
+
+    workbook.save(filename)
+    return total_rows
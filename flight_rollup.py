@@ -0,0 +1,175 @@
+"""
+Daily flight-count rollup for timeline and trend reports.
+
+skytrack_flight_daily keeps the number of flights per airline, status and
+scheduled departure day. Any coarser view - week, month, quarter, year - is
+a date_trunc over those buckets, so a timeline over years of history reads
+(airlines x statuses x days) rows instead of scanning flights.
+
+Past days rarely change, so a refresh only recomputes the newest buckets
+(the last N days and everything scheduled after them); a rebuild recomputes
+all of them. Flights without an airline or a scheduled departure are not
+counted, as in the timeline report.
+
+    python flight_rollup.py --rebuild
+    python flight_rollup.py --refresh --days 3 --every 300
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import db
+import timeline
+
+ROLLUP_TABLE = 'skytrack_flight_daily'
+
+# NULL statuses are stored as an empty string (status is part of the primary key)
+NULL_STATUS = ''
+
+CREATE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        airline_id INT NOT NULL,
+        status TEXT NOT NULL,
+        day DATE NOT NULL,
+        flight_count BIGINT NOT NULL,
+        PRIMARY KEY (day, airline_id, status)
+    );
+"""
+
+FILL_SQL = f"""
+    INSERT INTO {ROLLUP_TABLE} (airline_id, status, day, flight_count)
+    SELECT airline_id, COALESCE(status, %(null_status)s), scheduled_departure::date, COUNT(*)
+    FROM flights
+    WHERE airline_id IS NOT NULL
+      AND scheduled_departure IS NOT NULL
+      AND (%(since)s::date IS NULL OR scheduled_departure >= %(since)s::date)
+    GROUP BY 1, 2, 3;
+"""
+
+# Flight counts per airline, status and period from the rollup
+COUNTS_QUERY = f"""
+    SELECT
+        r.airline_id,
+        NULLIF(r.status, '') as status,
+        date_trunc(%(granularity)s, r.day)::date as period_start,
+        SUM(r.flight_count) as flight_count
+    FROM {ROLLUP_TABLE} r
+    WHERE (%(start)s::date IS NULL OR r.day >= %(start)s::date)
+      AND (%(end)s::date IS NULL OR r.day < %(end)s::date)
+    GROUP BY 1, 2, 3
+    ORDER BY 3, 1, 2;
+"""
+
+# Same columns as timeline.SCALABLE_TIMELINE_QUERY, answered from the rollup
+TIMELINE_ROLLUP_QUERY = f"""
+    WITH buckets AS (
+        SELECT
+            r.airline_id,
+            NULLIF(r.status, '') as status,
+            date_trunc(%(granularity)s, r.day) as bucket,
+            SUM(r.flight_count) as flight_count
+        FROM {ROLLUP_TABLE} r
+        WHERE (%(start)s::date IS NULL OR r.day >= %(start)s::date)
+          AND (%(end)s::date IS NULL OR r.day < %(end)s::date)
+        GROUP BY 1, 2, 3
+    ),
+    top_airlines AS (
+        SELECT airline_id
+        FROM buckets
+        GROUP BY airline_id
+        ORDER BY SUM(flight_count) DESC
+        LIMIT %(top_n)s
+    )
+    SELECT
+        CASE WHEN t.airline_id IS NULL THEN %(other)s ELSE a.airline_name END as airline,
+        b.status as flight_status,
+        TO_CHAR(b.bucket, %(period_format)s) as period,
+        SUM(b.flight_count) as flight_count
+    FROM buckets b
+    JOIN airline a ON a.airline_id = b.airline_id
+    LEFT JOIN top_airlines t ON t.airline_id = b.airline_id
+    GROUP BY 1, 2, 3
+    ORDER BY 3, 1;
+"""
+
+
+def ensure_schema(cursor):
+    """Create the rollup table if it does not exist yet"""
+    cursor.execute(CREATE_TABLE_SQL)
+
+
+def _recompute(connection, since):
+    """Replace every bucket from since (None = all) with counts from flights"""
+    cursor = connection.cursor()
+    try:
+        ensure_schema(cursor)
+        # Refreshes and rebuilds of the same buckets must not interleave
+        cursor.execute(f"LOCK TABLE {ROLLUP_TABLE} IN EXCLUSIVE MODE;")
+        if since is None:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE};")
+        else:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE day >= %s;", (since,))
+        cursor.execute(FILL_SQL, {'null_status': NULL_STATUS, 'since': since})
+        buckets = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return buckets
+
+
+def rebuild(connection):
+    """Recompute every bucket; returns the number of buckets written"""
+    return _recompute(connection, None)
+
+
+def refresh(connection, days=3):
+    """Recompute the buckets of the last `days` days and all later (scheduled) days"""
+    return _recompute(connection, date.today() - timedelta(days=days))
+
+
+def query_params(granularity='month', start=None, end=None):
+    """Parameters for COUNTS_QUERY; start is inclusive, end exclusive, None = unbounded"""
+    if granularity not in timeline.GRANULARITY_FORMATS:
+        raise ValueError(f"Unknown granularity {granularity!r}, expected one of {sorted(timeline.GRANULARITY_FORMATS)}")
+    return {'granularity': granularity, 'start': start, 'end': end}
+
+
+def flight_counts(cursor, granularity='month', start=None, end=None):
+    """[(airline_id, status, period_start, flight_count)] rolled up to the granularity"""
+    cursor.execute(COUNTS_QUERY, query_params(granularity, start, end))
+    return cursor.fetchall()
+
+
+def timeline_params(top_n=None, granularity='month', start=None, end=None):
+    """Parameters for TIMELINE_ROLLUP_QUERY"""
+    params = timeline.timeline_params(top_n, granularity)
+    params.update(start=start, end=end)
+    return params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SkyTrack daily flight rollup maintenance")
+    parser.add_argument('--rebuild', action='store_true', help="recompute every bucket")
+    parser.add_argument('--refresh', action='store_true', help="recompute only the newest buckets")
+    parser.add_argument('--days', type=int, default=3, help="days of history a refresh recomputes")
+    parser.add_argument('--every', type=int, default=None, help="repeat the refresh every N seconds")
+    args = parser.parse_args()
+
+    if not (args.rebuild or args.refresh):
+        parser.print_help()
+    else:
+        with db.connection() as connection:
+            if args.rebuild:
+                started = time.time()
+                buckets = rebuild(connection)
+                print(f"Rollup rebuilt: {buckets} buckets in {time.time() - started:.2f}s")
+            while args.refresh:
+                started = time.time()
+                buckets = refresh(connection, args.days)
+                print(f"Rollup refreshed: {buckets} buckets in {time.time() - started:.2f}s")
+                if args.every is None:
+                    break
+                time.sleep(args.every)
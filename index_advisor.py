@@ -0,0 +1,240 @@
+"""
+Index advisor for the SkyTrack report queries.
+
+Parses the queries of main.py (as kept in queries.sql) and SkyTrackAnalytics,
+collects the columns they join and filter on, and checks each query's plan
+for sequential scans of those tables. Columns without an index that starts
+with them become proposals:
+
+- join columns get a plain btree index, with INCLUDE of the other columns the
+  query reads from that table when that makes the index covering
+- columns filtered with IS NOT NULL get a partial index on that predicate
+
+With --apply the proposals are created CONCURRENTLY (no write lock on the
+tables), the tables are analyzed and the plans are compared again.
+
+    python index_advisor.py                 # proposals and current plan costs
+    python index_advisor.py --apply --analyze
+"""
+import argparse
+import json
+import re
+from collections import namedtuple
+
+import analytics
+import db
+import report_registry
+
+IndexProposal = namedtuple('IndexProposal', ['table', 'columns', 'include', 'where', 'reason'])
+
+# "FROM flights f" / "JOIN booking_flight bf"; the alias is optional
+TABLE_ALIAS_PATTERN = re.compile(
+    r'\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)(?:\s+(?:AS\s+)?(?!ON\b|JOIN\b|WHERE\b|GROUP\b|'
+    r'ORDER\b|LEFT\b|RIGHT\b|INNER\b|FULL\b|CROSS\b|LIMIT\b|HAVING\b|UNION\b|TABLESAMPLE\b)([A-Za-z_][A-Za-z0-9_]*))?',
+    re.IGNORECASE)
+JOIN_PATTERN = re.compile(r'\b([A-Za-z_]\w*)\.(\w+)\s*=\s*([A-Za-z_]\w*)\.(\w+)')
+NOT_NULL_PATTERN = re.compile(r'\b(?:([A-Za-z_]\w*)\.)?(\w+)\s+IS\s+NOT\s+NULL', re.IGNORECASE)
+COLUMN_PATTERN = re.compile(r'\b([A-Za-z_]\w*)\.(\w+)\b')
+# EXTRACT(YEAR FROM col) would otherwise read as a FROM clause
+EXTRACT_PATTERN = re.compile(r'\bEXTRACT\s*\([^()]*\)', re.IGNORECASE)
+
+# Covering indexes only pay off while the included payload stays small
+MAX_INCLUDE_COLUMNS = 3
+
+EXISTING_INDEXES_QUERY = """
+    SELECT t.relname, i.relname, a.attname
+    FROM pg_index x
+    JOIN pg_class t ON t.oid = x.indrelid
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = x.indkey[0]
+    WHERE n.nspname = 'public';
+"""
+
+
+def report_queries():
+    """Name -> SQL of every parameterless query used by main.py and SkyTrackAnalytics"""
+    queries = {}
+    for name, report in report_registry.load_reports().items():
+        queries[f'main_{name}'] = report.sql
+    queries.update(analytics.REPORT_QUERIES)
+    queries.update({f'excel_{name}': query for name, query in analytics.EXCEL_QUERIES.items()})
+    return queries
+
+
+def _aliases(query):
+    """alias -> table for every table in FROM/JOIN (a table is also its own alias)"""
+    aliases = {}
+    for table, alias in TABLE_ALIAS_PATTERN.findall(query):
+        aliases[table.lower()] = table.lower()
+        if alias:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def query_columns(query):
+    """
+    (join columns, not-null columns, referenced columns) of a query,
+    each a set of (table, column)
+    """
+    query = EXTRACT_PATTERN.sub('NULL', query)
+    aliases = _aliases(query)
+    tables = set(aliases.values())
+
+    def resolve(alias, column):
+        if alias is None:
+            # Unqualified columns are only attributable in single-table queries
+            return (next(iter(tables)), column.lower()) if len(tables) == 1 else None
+        table = aliases.get(alias.lower())
+        return (table, column.lower()) if table else None
+
+    joins = set()
+    for left_alias, left_column, right_alias, right_column in JOIN_PATTERN.findall(query):
+        for side in (resolve(left_alias, left_column), resolve(right_alias, right_column)):
+            if side:
+                joins.add(side)
+
+    not_null = {resolved for alias, column in NOT_NULL_PATTERN.findall(query)
+                if (resolved := resolve(alias or None, column))}
+    referenced = {resolved for alias, column in COLUMN_PATTERN.findall(query)
+                  if (resolved := resolve(alias, column))}
+    return joins, not_null, referenced
+
+
+def existing_leading_columns(cursor):
+    """{(table, column)} for every column that some index starts with"""
+    cursor.execute(EXISTING_INDEXES_QUERY)
+    return {(table, column) for table, _, column in cursor.fetchall()}
+
+
+def explain(cursor, query, analyze=False):
+    """(total cost, execution ms or None, plan) of a query"""
+    options = 'ANALYZE, FORMAT JSON' if analyze else 'FORMAT JSON'
+    cursor.execute(f"EXPLAIN ({options}) {query}")
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]
+    return top['Plan']['Total Cost'], top.get('Execution Time'), top['Plan']
+
+
+def seq_scanned_tables(plan):
+    """Tables read with a sequential scan anywhere in the plan"""
+    tables = set()
+    if plan.get('Node Type') == 'Seq Scan':
+        tables.add(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        tables |= seq_scanned_tables(child)
+    return tables
+
+
+def propose_indexes(queries, plans, indexed):
+    """Index proposals for the columns of seq-scanned tables that no index starts with"""
+    proposals = {}
+    for name, query in queries.items():
+        scanned = seq_scanned_tables(plans[name])
+        joins, not_null, referenced = query_columns(query)
+
+        for table, column in sorted(joins):
+            if table not in scanned or (table, column) in indexed:
+                continue
+            include = sorted(c for t, c in referenced if t == table and c != column)
+            if len(include) > MAX_INCLUDE_COLUMNS:
+                include = []
+            key = (table, (column,), None)
+            previous = proposals.get(key)
+            if previous is None or len(include) > len(previous.include):
+                proposals[key] = IndexProposal(table, (column,), tuple(include), None,
+                                               f"join in {name}")
+
+        for table, column in sorted(not_null):
+            if table not in scanned or (table, column) in indexed:
+                continue
+            include = sorted(c for t, c in referenced if t == table and c != column)
+            if len(include) > MAX_INCLUDE_COLUMNS:
+                include = []
+            key = (table, (column,), f"{column} IS NOT NULL")
+            proposals.setdefault(key, IndexProposal(table, (column,), tuple(include),
+                                                    f"{column} IS NOT NULL", f"filter in {name}"))
+    return list(proposals.values())
+
+
+def index_name(proposal):
+    suffix = '_partial' if proposal.where else ''
+    return f"idx_{proposal.table}_{'_'.join(proposal.columns)}{suffix}"
+
+
+def create_index_sql(proposal):
+    sql = (f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(proposal)} "
+           f"ON {proposal.table} ({', '.join(proposal.columns)})")
+    if proposal.include:
+        sql += f" INCLUDE ({', '.join(proposal.include)})"
+    if proposal.where:
+        sql += f" WHERE {proposal.where}"
+    return sql + ';'
+
+
+def measure(cursor, queries, analyze=False):
+    """name -> (total cost, execution ms or None, plan)"""
+    return {name: explain(cursor, query, analyze) for name, query in queries.items()}
+
+
+def apply_proposals(connection, proposals):
+    """Create the indexes concurrently (outside a transaction) and analyze their tables"""
+    with db.autocommit(connection):
+        cursor = connection.cursor()
+        try:
+            for proposal in proposals:
+                print(f"  {create_index_sql(proposal)}")
+                cursor.execute(create_index_sql(proposal))
+            for table in sorted({proposal.table for proposal in proposals}):
+                cursor.execute(f"ANALYZE {table};")
+        finally:
+            cursor.close()
+
+
+def _format_ms(value):
+    return f"{value:10.1f}" if value is not None else f"{'-':>10}"
+
+
+def print_comparison(before, after):
+    print(f"\n{'query':<32} {'cost before':>12} {'cost after':>12} {'ms before':>10} {'ms after':>10}")
+    for name, (cost, runtime, _) in before.items():
+        new_cost, new_runtime, _ = after.get(name, (None, None, None))
+        new_cost_text = f"{new_cost:12.1f}" if new_cost is not None else f"{'-':>12}"
+        print(f"{name:<32} {cost:12.1f} {new_cost_text} {_format_ms(runtime)} {_format_ms(new_runtime)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) indexes for the report queries")
+    parser.add_argument('--apply', action='store_true', help="create the proposed indexes CONCURRENTLY")
+    parser.add_argument('--analyze', action='store_true',
+                        help="measure runtime with EXPLAIN ANALYZE (runs every query)")
+    args = parser.parse_args()
+
+    queries = report_queries()
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        before = measure(cursor, queries, args.analyze)
+        indexed = existing_leading_columns(cursor)
+        connection.rollback()
+        cursor.close()
+
+        proposals = propose_indexes(queries, {name: plan for name, (_, _, plan) in before.items()}, indexed)
+        if not proposals:
+            print("No index proposals: every join and filter column of a scanned table is indexed")
+        else:
+            print(f"Proposed indexes ({len(proposals)}):")
+            for proposal in proposals:
+                print(f"  {create_index_sql(proposal)}  -- {proposal.reason}")
+
+        after = {}
+        if args.apply and proposals:
+            print("\nCreating indexes...")
+            apply_proposals(connection, proposals)
+            cursor = connection.cursor()
+            after = measure(cursor, queries, args.analyze)
+            connection.rollback()
+            cursor.close()
+
+    print_comparison(before, after)
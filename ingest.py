@@ -0,0 +1,190 @@
+"""
+Bulk ingestion for flights, booking, booking_flight and baggage.
+
+Rows are streamed to Postgres in batches with COPY FROM STDIN instead of one
+INSERT per row. Primary keys are reserved up front from the table's sequence,
+so the assigned ids are known without RETURNING and come back in input order.
+Flight foreign keys are checked against cached airline and airport id sets
+before anything is written, and the aggregate store is updated in the same
+transaction (once it has been reconciled; until then it holds no counts to update).
+
+    python ingest.py flights feed.csv     # CSV with a header row of column names
+"""
+import argparse
+import csv
+import io
+
+import aggregate_store
+import db
+
+FLIGHT_COLUMNS = ['airline_id', 'departure_airport_id', 'arrival_airport_id', 'status',
+                  'scheduled_departure', 'scheduled_arrival', 'flight_no']
+
+BOOKING_COLUMNS = ['passenger_id', 'booking_platform', 'status', 'price']
+
+BOOKING_FLIGHT_COLUMNS = ['booking_id', 'flight_id']
+
+BAGGAGE_COLUMNS = ['booking_id', 'weight_in_kg']
+
+# table -> (id column, insertable columns)
+TABLES = {
+    'flights': ('flight_id', FLIGHT_COLUMNS),
+    'booking': ('booking_id', BOOKING_COLUMNS),
+    'booking_flight': ('booking_flight_id', BOOKING_FLIGHT_COLUMNS),
+    'baggage': ('baggage_id', BAGGAGE_COLUMNS),
+}
+
+DEFAULT_BATCH_SIZE = 50000
+
+
+class ReferenceCache:
+    """
+    Airline and airport ids, loaded once and reused for every feed; reloaded
+    once when a feed references an id it does not know, so airlines and
+    airports added while a long-running ingester is up are accepted
+    """
+
+    def __init__(self):
+        self.airline_ids = None
+        self.airport_ids = None
+
+    def load(self, cursor):
+        cursor.execute("SELECT airline_id FROM airline;")
+        self.airline_ids = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT airport_id FROM airport;")
+        self.airport_ids = {row[0] for row in cursor.fetchall()}
+
+    def ensure_loaded(self, cursor):
+        if self.airline_ids is None or self.airport_ids is None:
+            self.load(cursor)
+
+    def _unknown_keys(self, rows, offset):
+        """(row index, column, value) of every id missing from the cached sets"""
+        bad_rows = []
+        for index, row in enumerate(rows, start=offset):
+            if row.get('airline_id') is not None and int(row['airline_id']) not in self.airline_ids:
+                bad_rows.append((index, 'airline_id', row['airline_id']))
+            for column in ('departure_airport_id', 'arrival_airport_id'):
+                if row.get(column) is not None and int(row[column]) not in self.airport_ids:
+                    bad_rows.append((index, column, row[column]))
+        return bad_rows
+
+    def check_flights(self, cursor, rows, offset=0):
+        """Raise ValueError listing the rows whose airline or airports do not exist"""
+        bad_rows = self._unknown_keys(rows, offset)
+        if bad_rows:
+            self.load(cursor)
+            bad_rows = self._unknown_keys(rows, offset)
+        if bad_rows:
+            preview = ', '.join(f"row {i}: {column}={value}" for i, column, value in bad_rows[:10])
+            raise ValueError(f"{len(bad_rows)} unknown foreign keys ({preview})")
+
+
+references = ReferenceCache()
+
+
+def _copy_value(value):
+    """Value in COPY text format: \\N for NULL, special characters escaped"""
+    if value is None:
+        return '\\N'
+    text = str(value)
+    return (text.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _reserve_ids(cursor, table, id_column, count):
+    """Take count ids from the table's sequence (or past MAX(id) if it has none)"""
+    cursor.execute("SELECT pg_get_serial_sequence(%s, %s);", (table, id_column))
+    sequence = cursor.fetchone()[0]
+    if sequence is not None:
+        cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s);", (sequence, count))
+        return [row[0] for row in cursor.fetchall()]
+
+    # No sequence: serialize writers on the table and continue after the highest id
+    cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE;")
+    cursor.execute(f"SELECT COALESCE(MAX({id_column}), 0) FROM {table};")
+    start = cursor.fetchone()[0] + 1
+    return list(range(start, start + count))
+
+
+def _copy_batch(cursor, table, id_column, columns, ids, rows):
+    buffer = io.StringIO()
+    for row_id, row in zip(ids, rows):
+        buffer.write(str(row_id))
+        for column in columns:
+            buffer.write('\t')
+            buffer.write(_copy_value(row.get(column)))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({id_column}, {', '.join(columns)}) FROM STDIN", buffer)
+
+
+def bulk_insert(connection, table, rows, batch_size=DEFAULT_BATCH_SIZE, update_aggregates=True):
+    """
+    Insert rows (dicts keyed by the table's columns) with COPY and commit.
+    Returns the assigned ids in input order. Nothing is written if any batch fails.
+    """
+    id_column, columns = TABLES[table]
+    cursor = connection.cursor()
+    assigned_ids = []
+    try:
+        if table == 'flights':
+            references.ensure_loaded(cursor)
+
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            if table == 'flights':
+                references.check_flights(cursor, batch, offset=start)
+            ids = _reserve_ids(cursor, table, id_column, len(batch))
+            _copy_batch(cursor, table, id_column, columns, ids, batch)
+            assigned_ids.extend(ids)
+
+        if update_aggregates and table == 'flights':
+            aggregate_store.apply_flight_rows(cursor, rows)
+        elif update_aggregates and table == 'booking':
+            aggregate_store.apply_booking_rows(cursor, rows)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return assigned_ids
+
+
+def insert_flights(connection, rows, batch_size=DEFAULT_BATCH_SIZE, update_aggregates=True):
+    """Bulk-insert flights given as dicts keyed by FLIGHT_COLUMNS; returns flight ids"""
+    return bulk_insert(connection, 'flights', rows, batch_size, update_aggregates)
+
+
+def insert_bookings(connection, rows, batch_size=DEFAULT_BATCH_SIZE, update_aggregates=True):
+    """Bulk-insert bookings given as dicts keyed by BOOKING_COLUMNS; returns booking ids"""
+    return bulk_insert(connection, 'booking', rows, batch_size, update_aggregates)
+
+
+def insert_booking_flights(connection, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Bulk-insert booking/flight links (booking_id, flight_id); returns their ids"""
+    return bulk_insert(connection, 'booking_flight', rows, batch_size)
+
+
+def insert_baggage(connection, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Bulk-insert baggage (booking_id, weight_in_kg); returns baggage ids"""
+    return bulk_insert(connection, 'baggage', rows, batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load a CSV feed with COPY")
+    parser.add_argument('table', choices=sorted(TABLES), help="target table")
+    parser.add_argument('csv_file', help="CSV file with a header row of column names")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    with open(args.csv_file, newline='', encoding='utf-8') as f:
+        # Empty CSV fields become NULLs
+        feed = [{key: (value if value != '' else None) for key, value in row.items()}
+                for row in csv.DictReader(f)]
+
+    with db.connection() as connection:
+        ids = bulk_insert(connection, args.table, feed, args.batch_size)
+    print(f"Inserted {len(ids)} rows into {args.table}"
+          + (f" (ids {ids[0]}..{ids[-1]})" if ids else ""))
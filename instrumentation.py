@@ -0,0 +1,137 @@
+"""
+Per-stage instrumentation for SkyTrack reports.
+
+Every report is split into stages - query execution, row fetch, DataFrame
+construction, figure building and savefig / Excel write - and each stage is
+recorded with its duration, row count, bytes and peak Python memory
+(tracemalloc). Records are appended as JSON lines as they happen; a
+Prometheus text-format file with the per-stage totals can be written at the
+end of a run (for the node_exporter textfile collector). Optionally every
+query is also run under EXPLAIN (ANALYZE, BUFFERS) and its plan logged.
+
+Peak memory is process-wide: in parallel mode stages that overlap in time
+share the same peak.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+DEFAULT_LOG = 'logs/report_stages.jsonl'
+
+STAGES = ['query', 'fetch', 'dataframe', 'figure', 'savefig', 'excel_write']
+
+EXPLAIN_PREFIX = 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) '
+
+
+class StageRecorder:
+    def __init__(self, log_path=DEFAULT_LOG, metrics_path=None, explain=False):
+        """
+        log_path: JSON lines file that every stage record is appended to
+        metrics_path: Prometheus text file written by write_metrics()
+        explain: also capture EXPLAIN (ANALYZE, BUFFERS) for every query
+        """
+        self.log_path = log_path
+        self.metrics_path = metrics_path
+        self.explain = explain
+        # (report, stage) -> [seconds, rows, bytes, peak memory, count]
+        self.totals = {}
+        self._lock = threading.Lock()
+
+        if os.path.dirname(log_path):
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _emit(self, record):
+        record['time'] = datetime.now(timezone.utc).isoformat()
+        with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    @contextmanager
+    def stage(self, report, stage):
+        """
+        Time the block as one stage of a report. The block may fill in
+        'rows' and 'bytes' on the yielded dict.
+        """
+        record = {'report': report, 'stage': stage, 'rows': None, 'bytes': None}
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            record['peak_memory_bytes'] = max(0, tracemalloc.get_traced_memory()[1] - start_memory)
+            with self._lock:
+                totals = self.totals.setdefault((report, stage), [0.0, 0, 0, 0, 0])
+                totals[0] += record['seconds']
+                totals[1] += record['rows'] or 0
+                totals[2] += record['bytes'] or 0
+                totals[3] = max(totals[3], record['peak_memory_bytes'])
+                totals[4] += 1
+            self._emit(record)
+
+    def record_plan(self, report, cursor, query, params=None):
+        """Run the query under EXPLAIN (ANALYZE, BUFFERS) and log the plan"""
+        cursor.execute(EXPLAIN_PREFIX + query, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        top = plan[0]
+        self._emit({
+            'report': report,
+            'stage': 'explain',
+            'planning_ms': top.get('Planning Time'),
+            'execution_ms': top.get('Execution Time'),
+            'shared_hit_blocks': top['Plan'].get('Shared Hit Blocks'),
+            'shared_read_blocks': top['Plan'].get('Shared Read Blocks'),
+            'plan': top['Plan'],
+        })
+
+    def write_metrics(self, path=None):
+        """
+        Write per-stage totals in Prometheus text format. The file is replaced
+        atomically so a collector never reads a partial file.
+        """
+        path = path or self.metrics_path
+        if path is None:
+            return None
+
+        metrics = [
+            ('skytrack_report_stage_seconds', 'Seconds spent in the stage', 0),
+            ('skytrack_report_stage_rows', 'Rows handled by the stage', 1),
+            ('skytrack_report_stage_bytes', 'Bytes of data produced by the stage', 2),
+            ('skytrack_report_stage_peak_memory_bytes', 'Peak Python memory during the stage', 3),
+        ]
+        with self._lock:
+            totals = dict(self.totals)
+
+        lines = []
+        for metric, help_text, index in metrics:
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            for (report, stage), values in sorted(totals.items()):
+                lines.append(f'{metric}{{report="{report}",stage="{stage}"}} {values[index]}')
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+        return path
+
+    def summary(self):
+        """Per-report stage durations of the run, for the console"""
+        reports = {}
+        for (report, stage), values in self.totals.items():
+            reports.setdefault(report, {})[stage] = values
+        lines = []
+        for report, stages in reports.items():
+            parts = [f"{stage} {stages[stage][0]:.2f}s" for stage in STAGES if stage in stages]
+            lines.append(f"   {report:<24} " + ', '.join(parts))
+        return '\n'.join(lines)
@@ -0,0 +1,442 @@
+"""
+Push-based live refresh of the SkyTrack charts with LISTEN/NOTIFY.
+
+Statement-level triggers on flights and booking read the rows each INSERT,
+UPDATE, DELETE or COPY changed (transition tables), group them by the
+report keys and send the net deltas on the skytrack_changes channel when the
+transaction commits:
+
+    {"id": "...", "table": "flights", "rows": [[airline_id, departure_airport_id, arrival_airport_id, status, delta], ...]}
+    {"id": "...", "table": "booking", "rows": [[booking_platform, delta, price_sum_delta, priced_delta], ...]}
+
+Postgres delivers identical payloads sent in one transaction only once, so
+every payload carries a unique id (transaction id and a sequence number).
+
+The listener subscribes first and then loads the counts behind the pie, line,
+busiest-airport and platform bar charts from one snapshot; deltas of
+transactions that snapshot already saw are skipped, so no change is lost or
+counted twice. After that it applies each delta in memory and redraws only
+the charts it affects. Changes are debounced: a chart is redrawn once no
+change arrived for `debounce` seconds, or at the latest `max_delay` seconds
+after the first pending change, so a burst of inserts causes one redraw.
+
+The live bar chart counts bookings per platform (booking rows); the batch
+report counts booked flights (booking joined to booking_flight). Live charts
+are therefore written to their own directory, charts/live/, and never replace
+the batch PNGs or their render cache entries.
+
+    python live_refresh.py --install          # create the triggers (PostgreSQL 10+)
+    python live_refresh.py --debounce 0.2     # listen and redraw charts/live/*.png
+    python live_refresh.py --uninstall
+"""
+import argparse
+import json
+import select
+import time
+from collections import Counter
+
+import pandas as pd
+
+import db
+from chart_rendering import CHART_SPECS, render_chart
+
+CHANNEL = 'skytrack_changes'
+
+# Live PNGs go here, next to (not over) the batch charts
+OUTPUT_DIR = 'charts/live'
+
+# NOTIFY payloads are limited to 8000 bytes; larger deltas are split
+MAX_PAYLOAD = 7000
+
+# Numbers the payloads so that no two are identical
+NOTIFY_SEQUENCE = 'skytrack_notify_seq'
+
+NOTIFY_FUNCTION_SQL = f"""
+    CREATE SEQUENCE IF NOT EXISTS {NOTIFY_SEQUENCE};
+
+    CREATE OR REPLACE FUNCTION skytrack_notify_send(source TEXT, batch TEXT) RETURNS void AS $$
+    BEGIN
+        PERFORM pg_notify('{CHANNEL}',
+            '{{"id": "' || txid_current() || '.' || nextval('{NOTIFY_SEQUENCE}')
+            || '", "table": "' || source || '", "rows": [' || batch || ']}}');
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION skytrack_notify_changes(source TEXT, entries TEXT[]) RETURNS void AS $$
+    DECLARE
+        entry TEXT;
+        batch TEXT := '';
+    BEGIN
+        FOREACH entry IN ARRAY entries LOOP
+            IF batch <> '' AND length(batch) + length(entry) > {MAX_PAYLOAD} THEN
+                PERFORM skytrack_notify_send(source, batch);
+                batch := '';
+            END IF;
+            batch := CASE WHEN batch = '' THEN entry ELSE batch || ',' || entry END;
+        END LOOP;
+        IF batch <> '' THEN
+            PERFORM skytrack_notify_send(source, batch);
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# table -> (columns read from the changed rows, grouping keys, aggregated deltas)
+SOURCES = {
+    'flights': (
+        'airline_id, departure_airport_id, arrival_airport_id, status',
+        'airline_id, departure_airport_id, arrival_airport_id, status',
+        ['SUM(delta)'],
+    ),
+    'booking': (
+        'booking_platform, price',
+        'booking_platform',
+        ['SUM(delta)',
+         'COALESCE(SUM(delta * price), 0)',
+         'COALESCE(SUM(delta) FILTER (WHERE price IS NOT NULL), 0)'],
+    ),
+}
+
+# operation -> (transition tables, changed rows with +1 / -1 deltas)
+OPERATIONS = {
+    'insert': ('NEW TABLE AS new_rows', 'SELECT {columns}, 1 AS delta FROM new_rows'),
+    'delete': ('OLD TABLE AS old_rows', 'SELECT {columns}, -1 AS delta FROM old_rows'),
+    'update': ('OLD TABLE AS old_rows NEW TABLE AS new_rows',
+               'SELECT {columns}, 1 AS delta FROM new_rows UNION ALL SELECT {columns}, -1 AS delta FROM old_rows'),
+}
+
+TRIGGER_SQL = """
+    CREATE OR REPLACE FUNCTION skytrack_notify_{table}_{operation}() RETURNS trigger AS $$
+    BEGIN
+        PERFORM skytrack_notify_changes('{table}', ARRAY(
+            SELECT json_build_array({keys}, {deltas})::text
+            FROM ({changes}) changes
+            GROUP BY {keys}
+            HAVING {having}
+        ));
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS skytrack_notify_{operation} ON {table};
+    CREATE TRIGGER skytrack_notify_{operation}
+        AFTER {event} ON {table}
+        REFERENCING {transitions}
+        FOR EACH STATEMENT EXECUTE PROCEDURE skytrack_notify_{table}_{operation}();
+"""
+
+# Charts each source table feeds
+AFFECTED_CHARTS = {
+    'flights': {'pie_chart', 'line_chart', 'horizontal_bar_chart'},
+    'booking': {'bar_chart'},
+}
+
+
+def trigger_sql():
+    """DDL of the notify function and the three statement triggers per table"""
+    statements = [NOTIFY_FUNCTION_SQL]
+    for table, (columns, keys, deltas) in SOURCES.items():
+        for operation, (transitions, changes) in OPERATIONS.items():
+            statements.append(TRIGGER_SQL.format(
+                table=table,
+                operation=operation,
+                event=operation.upper(),
+                transitions=transitions,
+                columns=columns,
+                keys=keys,
+                deltas=', '.join(deltas),
+                changes=changes.format(columns=columns),
+                having=' OR '.join(f'{delta} <> 0' for delta in deltas),
+            ))
+    return '\n'.join(statements)
+
+
+def install(connection):
+    """Create (or replace) the notify triggers on flights and booking"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(trigger_sql())
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def uninstall(connection):
+    """Drop the notify triggers and their functions"""
+    cursor = connection.cursor()
+    try:
+        for table in SOURCES:
+            for operation in OPERATIONS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS skytrack_notify_{operation} ON {table};")
+                cursor.execute(f"DROP FUNCTION IF EXISTS skytrack_notify_{table}_{operation}();")
+        cursor.execute("DROP FUNCTION IF EXISTS skytrack_notify_changes(TEXT, TEXT[]);")
+        cursor.execute("DROP FUNCTION IF EXISTS skytrack_notify_send(TEXT, TEXT);")
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {NOTIFY_SEQUENCE};")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+class LiveAggregates:
+    """
+    In-memory counts behind the live charts. Distinct counts are kept exact
+    as multisets: an airport stops counting for an airline once its last
+    flight there is deleted.
+    """
+
+    def __init__(self):
+        # (airline_id, departure_airport_id, status) -> flights; both ids set (pie and line charts)
+        self.flights = Counter()
+        # (airport_id, airline_id) -> departure and arrival edges (busiest-airport chart)
+        self.edges = Counter()
+        # booking_platform -> [bookings, price sum, priced bookings]
+        self.platforms = {}
+        self.airlines = {}
+        self.airports = {}
+        # (xmin, xmax, in-progress txids) of the snapshot load() read
+        self.snapshot = None
+
+    def load(self, cursor):
+        """
+        Initial state: one grouped query per aggregate and the label tables, all
+        read in one REPEATABLE READ transaction. Ends that transaction, so
+        notifications queued meanwhile are delivered.
+        """
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+        cursor.execute("SELECT txid_current_snapshot()::text;")
+        xmin, xmax, in_progress = cursor.fetchone()[0].split(':')
+        self.snapshot = (int(xmin), int(xmax), {int(txid) for txid in in_progress.split(',') if txid})
+
+        cursor.execute("""
+            SELECT airline_id, departure_airport_id, status, COUNT(*)
+            FROM flights
+            WHERE airline_id IS NOT NULL AND departure_airport_id IS NOT NULL
+            GROUP BY 1, 2, 3;
+        """)
+        self.flights = Counter({tuple(row[:3]): row[3] for row in cursor.fetchall()})
+
+        cursor.execute("""
+            SELECT airport_id, airline_id, COUNT(*)
+            FROM (
+                SELECT departure_airport_id AS airport_id, airline_id FROM flights
+                UNION ALL
+                SELECT arrival_airport_id, airline_id FROM flights
+            ) e
+            WHERE airport_id IS NOT NULL
+            GROUP BY 1, 2;
+        """)
+        self.edges = Counter({tuple(row[:2]): row[2] for row in cursor.fetchall()})
+
+        cursor.execute("""
+            SELECT booking_platform, COUNT(*), COALESCE(SUM(price), 0), COUNT(price)
+            FROM booking
+            GROUP BY 1;
+        """)
+        self.platforms = {row[0]: [row[1], float(row[2]), row[3]] for row in cursor.fetchall()}
+
+        cursor.execute("SELECT airline_id, airline_name FROM airline;")
+        self.airlines = dict(cursor.fetchall())
+        cursor.execute("SELECT airport_id, airport_name, city FROM airport;")
+        self.airports = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        cursor.connection.rollback()
+
+    def already_loaded(self, message):
+        """True if the transaction that sent message was committed before load()'s snapshot"""
+        if self.snapshot is None:
+            return False
+        xmin, xmax, in_progress = self.snapshot
+        txid = int(message['id'].split('.')[0])
+        return txid < xmin or (txid < xmax and txid not in in_progress)
+
+    def load_missing_labels(self, cursor):
+        """Look up names of airlines and airports first seen in a delta"""
+        airline_ids = {key[0] for key in self.flights} - set(self.airlines)
+        airport_ids = ({key[1] for key in self.flights} | {key[0] for key in self.edges}) - set(self.airports)
+        if airline_ids:
+            cursor.execute("SELECT airline_id, airline_name FROM airline WHERE airline_id = ANY(%s);",
+                           (list(airline_ids),))
+            self.airlines.update(cursor.fetchall())
+        if airport_ids:
+            cursor.execute("SELECT airport_id, airport_name, city FROM airport WHERE airport_id = ANY(%s);",
+                           (list(airport_ids),))
+            self.airports.update({row[0]: (row[1], row[2]) for row in cursor.fetchall()})
+
+    def apply(self, message):
+        """
+        Fold one notification into the counts; returns the names of the affected charts.
+        Deltas already contained in the loaded snapshot are skipped.
+        """
+        if self.already_loaded(message):
+            return set()
+        table = message['table']
+        if table == 'flights':
+            for airline_id, departure_id, arrival_id, status, delta in message['rows']:
+                if airline_id is not None and departure_id is not None:
+                    self.flights[(airline_id, departure_id, status)] += delta
+                for airport_id in (departure_id, arrival_id):
+                    if airport_id is not None:
+                        self.edges[(airport_id, airline_id)] += delta
+            # Drop keys whose last row was deleted
+            self.flights += Counter()
+            self.edges += Counter()
+        elif table == 'booking':
+            for platform, delta, price_delta, priced_delta in message['rows']:
+                totals = self.platforms.setdefault(platform, [0, 0.0, 0])
+                totals[0] += delta
+                totals[1] += float(price_delta)
+                totals[2] += priced_delta
+                if totals[0] <= 0:
+                    del self.platforms[platform]
+        return AFFECTED_CHARTS.get(table, set())
+
+    # Chart frames (same columns as analytics.REPORT_QUERIES)
+
+    def pie_chart(self):
+        flights, airports = Counter(), {}
+        for (airline_id, airport_id, _), count in self.flights.items():
+            if airline_id in self.airlines and airport_id in self.airports:
+                name = self.airlines[airline_id]
+                flights[name] += count
+                airports.setdefault(name, set()).add(airport_id)
+        rows = [(name, count, len(airports[name])) for name, count in flights.most_common(8)]
+        return pd.DataFrame(rows, columns=['airline', 'flight_count', 'airports_served'])
+
+    def line_chart(self):
+        flights, airlines, airports = Counter(), {}, {}
+        for (airline_id, airport_id, status), count in self.flights.items():
+            if airline_id in self.airlines and airport_id in self.airports:
+                flights[status] += count
+                airlines.setdefault(status, set()).add(airline_id)
+                airports.setdefault(status, set()).add(airport_id)
+        # ORDER BY status: NULL sorts last
+        statuses = sorted(flights, key=lambda status: (status is None, status or ''))
+        rows = [(status, flights[status], len(airlines[status]), len(airports[status])) for status in statuses]
+        return pd.DataFrame(rows, columns=['flight_status', 'flight_count', 'airlines_count', 'airports_count'])
+
+    def horizontal_bar_chart(self):
+        flights, airlines = Counter(), {}
+        for (airport_id, airline_id), count in self.edges.items():
+            if airport_id in self.airports:
+                label = self.airports[airport_id]
+                flights[label] += count
+                if airline_id is not None:
+                    airlines.setdefault(label, set()).add(airline_id)
+        rows = [(name, city, count, len(airlines.get((name, city), ())))
+                for (name, city), count in flights.most_common(15)]
+        return pd.DataFrame(rows, columns=['airport', 'city', 'flight_count', 'airlines_count'])
+
+    def bar_chart(self):
+        top = sorted(self.platforms.items(), key=lambda item: item[1][0], reverse=True)[:10]
+        rows = [(platform, count, round(price_sum / priced, 2) if priced else None)
+                for platform, (count, price_sum, priced) in top]
+        return pd.DataFrame(rows, columns=['platform', 'booking_count', 'avg_price'])
+
+    def frame(self, name):
+        return getattr(self, name)()
+
+
+class LiveRefresh:
+    def __init__(self, debounce=0.2, max_delay=1.0, dpi=100, output_dir=OUTPUT_DIR):
+        """
+        debounce: redraw once no change arrived for this many seconds
+        max_delay: redraw at the latest this many seconds after the first pending change
+        dpi: resolution of the redrawn PNGs (the batch report uses 300)
+        output_dir: directory of the redrawn PNGs, kept apart from the batch charts
+        """
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.dpi = dpi
+        self.output_dir = output_dir
+        self.aggregates = LiveAggregates()
+
+    def redraw(self, charts, changed_at):
+        """Render the affected charts from the in-memory counts"""
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            self.aggregates.load_missing_labels(cursor)
+            cursor.close()
+            conn.rollback()
+
+        for name in sorted(charts):
+            df = self.aggregates.frame(name)
+            if df.empty:
+                continue
+            render_chart(name, df, dpi=self.dpi, output_dir=self.output_dir)
+        print(f"Redrawn {', '.join(sorted(charts))} "
+              f"{time.monotonic() - changed_at:.2f}s after the first change")
+
+    def run(self, duration=None):
+        """Listen for changes and redraw until interrupted (or for duration seconds)"""
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            # LISTEN takes effect at commit; subscribing before the load means every
+            # change after the snapshot is queued, notifications arrive between transactions
+            cursor.execute(f"LISTEN {CHANNEL};")
+            conn.commit()
+            self.aggregates.load(cursor)
+            rendered = set(CHART_SPECS) & set().union(*AFFECTED_CHARTS.values())
+            self.redraw(rendered, time.monotonic())
+            print(f"Listening on {CHANNEL} (debounce {self.debounce}s, max delay {self.max_delay}s)")
+
+            pending = set()
+            first_change = last_change = None
+            stop_at = time.monotonic() + duration if duration is not None else None
+            try:
+                while stop_at is None or time.monotonic() < stop_at:
+                    timeout = 1.0
+                    if pending:
+                        deadline = min(last_change + self.debounce, first_change + self.max_delay)
+                        timeout = max(0.0, deadline - time.monotonic())
+
+                    if select.select([conn], [], [], timeout) != ([], [], []):
+                        conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        pending |= self.aggregates.apply(json.loads(notify.payload))
+                        last_change = time.monotonic()
+                        if first_change is None:
+                            first_change = last_change
+
+                    # Checked after every drain, so a steady stream still redraws every max_delay
+                    now = time.monotonic()
+                    if pending and (now >= last_change + self.debounce or now >= first_change + self.max_delay):
+                        self.redraw(pending, first_change)
+                        pending = set()
+                        first_change = last_change = None
+            finally:
+                cursor.execute(f"UNLISTEN {CHANNEL};")
+                conn.commit()
+                cursor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SkyTrack live chart refresh (LISTEN/NOTIFY)")
+    parser.add_argument('--install', action='store_true', help="create the notify triggers and exit")
+    parser.add_argument('--uninstall', action='store_true', help="drop the notify triggers and exit")
+    parser.add_argument('--debounce', type=float, default=0.2,
+                        help="seconds without changes before the affected charts are redrawn")
+    parser.add_argument('--max-delay', type=float, default=1.0,
+                        help="redraw at the latest this many seconds after the first change")
+    parser.add_argument('--dpi', type=int, default=100, help="resolution of the redrawn charts")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="directory of the redrawn charts")
+    args = parser.parse_args()
+
+    if args.install or args.uninstall:
+        with db.connection() as connection:
+            if args.install:
+                install(connection)
+                print(f"Notify triggers installed on {', '.join(SOURCES)}")
+            else:
+                uninstall(connection)
+                print("Notify triggers removed")
+    else:
+        try:
+            LiveRefresh(args.debounce, args.max_delay, args.dpi, args.output_dir).run()
+        except KeyboardInterrupt:
+            print("Live refresh stopped")
@@ -1,193 +1,208 @@
-import psycopg2
-
-# Database connection parameters
-host = 'localhost'
-port = '5432'
-database = 'airport_analytics'
-user = 'postgres'
-password = '0000'
-
-# Establish connection
-connection = psycopg2.connect(
-    database=database,
-    user=user,
-    password=password,
-    host=host,
-    port=port
-)
-
-cursor = connection.cursor()
-
-# Get all tables in the database
-cursor.execute("""               
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public'
-        ORDER BY table_name;
-               """
-)
-record = cursor.fetchall()
-print("Data from Database:- ", record)
-print("\n" + "="*60 + "\n")
-
-# 1. КОЛИЧЕСТВО РЕЙСОВ ПО АВИАКОМПАНИЯМ
-cursor.execute("""               
-SELECT 
-    airline_id,
-    COUNT(*) as total_flights
-FROM flights
-GROUP BY airline_id
-ORDER BY total_flights DESC;
+import argparse
+
+import aggregate_store
+import db
+import distinct_sketch
+import report_registry
+
+# Параметры подключения читаются в db.py (skytrack.ini или переменные SKYTRACK_DB_*)
+# Запросы отчета хранятся в queries.sql, форматирование секций - в report_registry.py
+
+
+def run_report(connection, cursor, precomputed=None, names=None):
+    """
+    Классический режим: отдельный подготовленный запрос (PREPARE/EXECUTE) на каждую секцию.
+    precomputed: {имя секции: строки} - уже посчитанные секции, их запросы пропускаются
+    names: секции для вывода (по умолчанию все)
+    """
+    report_registry.run_reports(connection, cursor, names=names, precomputed=precomputed)
+
+
+def _sorted_desc(rows):
+    """Сортировка как ORDER BY count DESC в исходных запросах"""
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def _percentile_rows(booking_rows):
     """
-)
-record = cursor.fetchall()
-print("1 - КОЛИЧЕСТВО РЕЙСОВ ПО АВИАКОМПАНИЯМ:")
-for row in record:
-    print(f"   Авиакомпания {row[0]}: {row[1]} рейсов")
-print()
-
-# 2. СРЕДНЯЯ ЦЕНА БИЛЕТОВ ПО СТАТУСАМ БРОНИРОВАНИЯ
-cursor.execute("""
-SELECT 
-    status,
-    COUNT(*) as bookings_count,
-    AVG(price) as avg_price,
-    MIN(price) as min_price,
-    MAX(price) as max_price
-FROM booking
-GROUP BY status;
-""")
-record = cursor.fetchall()
-print("2 - СРЕДНЯЯ/МИН/МАКС ЦЕНА ПО СТАТУСАМ БРОНИРОВАНИЯ:")
-for row in record:
-    print(f"   Статус '{row[0]}': {row[1]} бронирований, средняя цена: {float(row[2]):.2f}, мин: {float(row[3]):.2f}, макс: {float(row[4]):.2f}")
-print()
-
-# 3. КОЛИЧЕСТВО ПАССАЖИРОВ ПО СТРАНАМ
-cursor.execute("""
-SELECT 
-    country_of_citizenship,
-    COUNT(*) as passengers_count
-FROM passengers
-GROUP BY country_of_citizenship
-ORDER BY passengers_count DESC;
-""")
-record = cursor.fetchall()
-print("3 - КОЛИЧЕСТВО ПАССАЖИРОВ ПО СТРАНАМ:")
-for row in record:
-    print(f"   {row[0]}: {row[1]} пассажиров")
-print()
-
-# 4. СТАТИСТИКА ПО БАГАЖУ
-cursor.execute("""
-SELECT 
-    COUNT(*) as total_baggage,
-    AVG(weight_in_kg) as avg_weight,
-    MIN(weight_in_kg) as min_weight,
-    MAX(weight_in_kg) as max_weight
-FROM baggage;
-""")
-record = cursor.fetchall()
-print("4 - СТАТИСТИКА ПО БАГАЖУ:")
-for row in record:
-    print(f"   Всего багажа: {row[0]}, средний вес: {row[1]:.2f} кг, мин: {row[2]} кг, макс: {row[3]} кг")
-print()
-
-# 5. РЕЙСЫ ПО СТАТУСАМ
-cursor.execute("""
-SELECT 
-    status,
-    COUNT(*) as flights_count
-FROM flights
-GROUP BY status
-ORDER BY flights_count DESC;
-""")
-record = cursor.fetchall()
-print("5 - РЕЙСЫ ПО СТАТУСАМ:")
-for row in record:
-    print(f"   Статус '{row[0]}': {row[1]} рейсов")
-print()
-
-# 6. РЕЗУЛЬТАТЫ ПРОВЕРКИ БЕЗОПАСНОСТИ
-cursor.execute("""
-SELECT 
-    check_result,
-    COUNT(*) as checks_count
-FROM security_check
-GROUP BY check_result;
-""")
-record = cursor.fetchall()
-print("6 - РЕЗУЛЬТАТЫ ПРОВЕРКИ БЕЗОПАСНОСТИ:")
-for row in record:
-    print(f"   Результат '{row[0]}': {row[1]} проверок")
-print()
-
-# 7. ПАССАЖИРЫ ПО ПОЛУ И ВОЗРАСТУ
-cursor.execute("""
-SELECT 
-    gender,
-    COUNT(*) as passengers_count,
-    AVG(EXTRACT(YEAR FROM CURRENT_DATE) - EXTRACT(YEAR FROM date_of_birth)) as avg_age
-FROM passengers
-WHERE date_of_birth IS NOT NULL
-GROUP BY gender;
-""")
-record = cursor.fetchall()
-print("7 - ПАССАЖИРЫ ПО ПОЛУ И ВОЗРАСТУ:")
-for row in record:
-    print(f"   Пол '{row[0]}': {row[1]} пассажиров, средний возраст: {row[2]:.1f} лет")
-print()
-
-# 8. ПОПУЛЯРНЫЕ ПЛАТФОРМЫ БРОНИРОВАНИЯ
-cursor.execute("""
-SELECT 
-    booking_platform,
-    COUNT(*) as bookings_count,
-    AVG(price) as avg_price
-FROM booking
-GROUP BY booking_platform
-ORDER BY bookings_count DESC;
-""")
-record = cursor.fetchall()
-print("8 - ПОПУЛЯРНЫЕ ПЛАТФОРМЫ БРОНИРОВАНИЯ:")
-for row in record:
-    print(f"   Платформа '{row[0]}': {row[1]} бронирований, средняя цена: {row[2]:.2f}")
-print()
-
-# 9. АЭРОПОРТЫ ПО СТРАНАМ
-cursor.execute("""
-SELECT 
-    country,
-    COUNT(*) as airports_count
-FROM airport
-GROUP BY country
-ORDER BY airports_count DESC;
-""")
-record = cursor.fetchall()
-print("9 - АЭРОПОРТЫ ПО СТРАНАМ:")
-for row in record:
-    print(f"   {row[0]}: {row[1]} аэропортов")
-print()
-
-# 10. ОБЩАЯ СТАТИСТИКА ПО РЕЙСАМ
-cursor.execute("""
-SELECT 
-    COUNT(*) as total_flights,
-    COUNT(DISTINCT airline_id) as unique_airlines,
-    COUNT(DISTINCT departure_airport_id) as departure_airports,
-    COUNT(DISTINCT arrival_airport_id) as arrival_airports
-FROM flights;
-""")
-record = cursor.fetchall()
-print("10 - ОБЩАЯ СТАТИСТИКА ПО РЕЙСАМ:")
-for row in record:
-    print(f"   Всего рейсов: {row[0]}")
-    print(f"   Уникальных авиакомпаний: {row[1]}")
-    print(f"   Аэропортов отправления: {row[2]}")
-    print(f"   Аэропортов прибытия: {row[3]}")
-
-# Close connection
-cursor.close()
-connection.close()
-print("\n" + "="*60)
-print("Анализ завершен. Соединение закрыто.")
\ No newline at end of file
+    Строки запроса 11 из строк booking с GROUPING SETS ((status), (booking_platform)):
+    (dimension, value, priced_bookings, p50, p90, p95, p99),
+    ORDER BY dimension, value (NULL последним), как в запросе 11
+    """
+    return sorted(
+        [('status' if row[0] == 0 else 'platform', row[1] if row[0] == 0 else row[2], row[7], *(row[8] or [None] * 4))
+         for row in booking_rows],
+        key=lambda row: (row[0], row[1] is None, row[1] or ''))
+
+
+def run_single_pass_report(connection, cursor, names=None):
+    """
+    Режим одного прохода: все агрегаты по таблице считаются за одно сканирование.
+    flights (запросы 1, 5, 10), booking (2, 8, 11) и passengers (3, 7) читаются через
+    GROUPING SETS; GROUPING() показывает, к какому набору относится строка.
+    """
+
+    # FLIGHTS: запросы 1, 5 и 10 за одно сканирование
+    cursor.execute("""
+    SELECT
+        GROUPING(airline_id) as g_airline,
+        GROUPING(status) as g_status,
+        airline_id,
+        status,
+        COUNT(*) as flights_count,
+        COUNT(DISTINCT airline_id) as unique_airlines,
+        COUNT(DISTINCT departure_airport_id) as departure_airports,
+        COUNT(DISTINCT arrival_airport_id) as arrival_airports
+    FROM flights
+    GROUP BY GROUPING SETS ((airline_id), (status), ());
+    """)
+    flights_rows = cursor.fetchall()
+    by_airline = [(row[2], row[4]) for row in flights_rows if row[0] == 0]
+    by_status = [(row[3], row[4]) for row in flights_rows if row[1] == 0]
+    totals = [row[4:8] for row in flights_rows if row[0] == 1 and row[1] == 1]
+
+    # BOOKING: запросы 2, 8 и 11 за одно сканирование
+    cursor.execute("""
+    SELECT
+        GROUPING(status) as g_status,
+        status,
+        booking_platform,
+        COUNT(*) as bookings_count,
+        AVG(price) as avg_price,
+        MIN(price) as min_price,
+        MAX(price) as max_price,
+        COUNT(price) as priced_bookings,
+        percentile_cont(ARRAY[0.5, 0.9, 0.95, 0.99]) WITHIN GROUP (ORDER BY price) as percentiles
+    FROM booking
+    GROUP BY GROUPING SETS ((status), (booking_platform));
+    """)
+    booking_rows = cursor.fetchall()
+    by_booking_status = [(row[1], row[3], row[4], row[5], row[6]) for row in booking_rows if row[0] == 0]
+    by_platform = [(row[2], row[3], row[4]) for row in booking_rows if row[0] == 1]
+    percentiles = _percentile_rows(booking_rows)
+
+    # PASSENGERS: запросы 3 и 7 за одно сканирование
+    # Фильтр date_of_birth IS NOT NULL из запроса 7 перенесен в FILTER
+    cursor.execute("""
+    SELECT
+        GROUPING(country_of_citizenship) as g_country,
+        country_of_citizenship,
+        gender,
+        COUNT(*) as passengers_count,
+        COUNT(*) FILTER (WHERE date_of_birth IS NOT NULL) as passengers_with_dob,
+        AVG(EXTRACT(YEAR FROM CURRENT_DATE) - EXTRACT(YEAR FROM date_of_birth))
+            FILTER (WHERE date_of_birth IS NOT NULL) as avg_age
+    FROM passengers
+    GROUP BY GROUPING SETS ((country_of_citizenship), (gender));
+    """)
+    passenger_rows = cursor.fetchall()
+    by_country = [(row[1], row[3]) for row in passenger_rows if row[0] == 0]
+    by_gender = [(row[2], row[4], row[5]) for row in passenger_rows if row[0] == 1 and row[4] > 0]
+
+    # baggage, security_check и airport читаются одним запросом каждая - как в обычном режиме
+    run_report(connection, cursor, names=names, precomputed={
+        'flights_by_airline': _sorted_desc(by_airline),
+        'booking_price_by_status': by_booking_status,
+        'passengers_by_country': _sorted_desc(by_country),
+        'flights_by_status': _sorted_desc(by_status),
+        'passengers_by_gender': by_gender,
+        'booking_platforms': _sorted_desc(by_platform),
+        'flight_totals': totals,
+        'price_percentiles': percentiles,
+    })
+
+
+def run_aggregate_report(connection, cursor, names=None):
+    """
+    Режим агрегатов: секции 1, 2, 5 и 8 читаются из таблицы skytrack_aggregates
+    (O(ключей) строк вместо сканирования flights и booking), остальные - обычными запросами.
+    Пока таблица ни разу не сверена, ее счетчики неполные - тогда все секции читаются обычными запросами
+    """
+    if not aggregate_store.is_reconciled(cursor):
+        print("Таблица агрегатов еще не сверена (python aggregate_store.py --reconcile), "
+              "секции читаются обычными запросами\n")
+        run_report(connection, cursor, names=names)
+        return
+
+    metrics = aggregate_store.read_metrics(
+        cursor, ['flights_by_airline', 'flights_by_status', 'bookings_by_status', 'bookings_by_platform'])
+
+    def average(row):
+        return row[3] / row[2] if row[2] else None
+
+    run_report(connection, cursor, names=names, precomputed={
+        'flights_by_airline': _sorted_desc([(row[0], row[1]) for row in metrics['flights_by_airline']]),
+        'booking_price_by_status': [(row[0], row[1], average(row), row[4], row[5])
+                                    for row in metrics['bookings_by_status']],
+        'flights_by_status': _sorted_desc([(row[0], row[1]) for row in metrics['flights_by_status']]),
+        'booking_platforms': _sorted_desc([(row[0], row[1], average(row))
+                                           for row in metrics['bookings_by_platform']]),
+    })
+
+
+def run_approximate_report(connection, cursor, names=None):
+    """
+    Приближенный режим: секция 10 считается по HyperLogLog-скетчам из skytrack_distinct_sketches
+    (число рейсов точное, уникальные авиакомпании и аэропорты - с погрешностью), остальные - обычными запросами
+    """
+    run_report(connection, cursor, names=names, precomputed={
+        'flight_totals': distinct_sketch.flight_totals(cursor),
+    })
+    if not names or 'flight_totals' in names:
+        print(f"   (приближенно: стандартная ошибка {distinct_sketch.relative_error():.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SkyTrack console report")
+    mode = parser.add_mutually_exclusive_group()
+    # Режим одного прохода: каждая таблица сканируется один раз
+    mode.add_argument('--single-pass', action='store_true', help="scan each table once (GROUPING SETS)")
+    # Режим агрегатов: счетчики из skytrack_aggregates
+    mode.add_argument('--aggregates', action='store_true', help="read counters from skytrack_aggregates")
+    # Приближенный режим: уникальные значения из HyperLogLog-скетчей
+    mode.add_argument('--approximate', action='store_true',
+                      help="approximate distinct counts from skytrack_distinct_sketches")
+    parser.add_argument('--only', nargs='+', metavar='NAME', default=None,
+                        help="print only these report sections (see --list)")
+    parser.add_argument('--list', action='store_true', help="list the report sections and exit")
+    args = parser.parse_args()
+
+    reports = report_registry.load_reports()
+    if args.list:
+        for name, report in reports.items():
+            print(f"{name:<25} {', '.join(report.columns)}")
+        raise SystemExit(0)
+    try:
+        report_registry.select_reports(reports, args.only)
+    except KeyError as e:
+        parser.error(e.args[0])
+
+    # Establish connection (из общего пула db.py)
+    with db.connection() as connection:
+        cursor = connection.cursor()
+
+        # Get all tables in the database
+        cursor.execute("""
+                SELECT table_name
+                FROM information_schema.tables
+                WHERE table_schema = 'public'
+                ORDER BY table_name;
+                       """
+        )
+        record = cursor.fetchall()
+        print("Data from Database:- ", record)
+        print("\n" + "="*60 + "\n")
+
+        if args.single_pass:
+            run_single_pass_report(connection, cursor, names=args.only)
+        elif args.aggregates:
+            run_aggregate_report(connection, cursor, names=args.only)
+        elif args.approximate:
+            run_approximate_report(connection, cursor, names=args.only)
+        else:
+            run_report(connection, cursor, names=args.only)
+
+        # Close connection
+        cursor.close()
+    print("\n" + "="*60)
+    print("Анализ завершен. Соединение закрыто.")
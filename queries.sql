@@ -1,6 +1,7 @@
 -- ПРОСТЫЕ АНАЛИТИЧЕСКИЕ ЗАПРОСЫ ДЛЯ АВИАКОМПАНИИ
 -- =================================================
 
+-- name: flights_by_airline
 -- 1. КОЛИЧЕСТВО РЕЙСОВ ПО АВИАКОМПАНИЯМ
 -- Считает сколько рейсов у каждой авиакомпании
 SELECT 
@@ -10,6 +11,7 @@ FROM flights
 GROUP BY airline_id
 ORDER BY total_flights DESC;
 
+-- name: booking_price_by_status
 -- 2. СРЕДНЯЯ ЦЕНА БИЛЕТОВ ПО СТАТУСАМ БРОНИРОВАНИЯ
 -- Показывает среднюю цену для разных статусов бронирований
 SELECT 
@@ -21,6 +23,7 @@ SELECT
 FROM booking
 GROUP BY status;
 
+-- name: passengers_by_country
 -- 3. КОЛИЧЕСТВО ПАССАЖИРОВ ПО СТРАНАМ
 -- Считает пассажиров по странам гражданства
 SELECT 
@@ -30,6 +33,7 @@ FROM passengers
 GROUP BY country_of_citizenship
 ORDER BY passengers_count DESC;
 
+-- name: baggage_stats
 -- 4. СТАТИСТИКА ПО БАГАЖУ
 -- Анализ веса багажа
 SELECT 
@@ -39,6 +43,7 @@ SELECT
     MAX(weight_in_kg) as max_weight
 FROM baggage;
 
+-- name: flights_by_status
 -- 5. РЕЙСЫ ПО СТАТУСАМ
 -- Показывает количество рейсов в каждом статусе
 SELECT 
@@ -48,6 +53,7 @@ FROM flights
 GROUP BY status
 ORDER BY flights_count DESC;
 
+-- name: security_results
 -- 6. РЕЗУЛЬТАТЫ ПРОВЕРКИ БЕЗОПАСНОСТИ
 -- Статистика прохождения контроля безопасности
 SELECT 
@@ -56,6 +62,7 @@ SELECT
 FROM security_check
 GROUP BY check_result;
 
+-- name: passengers_by_gender
 -- 7. ПАССАЖИРЫ ПО ПОЛУ И ВОЗРАСТУ
 -- Считает пассажиров по полу
 SELECT 
@@ -66,6 +73,7 @@ FROM passengers
 WHERE date_of_birth IS NOT NULL
 GROUP BY gender;
 
+-- name: booking_platforms
 -- 8. ПОПУЛЯРНЫЕ ПЛАТФОРМЫ БРОНИРОВАНИЯ
 -- Показывает какие платформы используют чаще
 SELECT 
@@ -76,6 +84,7 @@ FROM booking
 GROUP BY booking_platform
 ORDER BY bookings_count DESC;
 
+-- name: airports_by_country
 -- 9. АЭРОПОРТЫ ПО СТРАНАМ
 -- Количество аэропортов в каждой стране
 SELECT 
@@ -85,6 +94,7 @@ FROM airport
 GROUP BY country
 ORDER BY airports_count DESC;
 
+-- name: flight_totals
 -- 10. РЕЙСЫ ПО МЕСЯЦАМ (за текущий год)
 -- Показывает в какие месяцы больше рейсов
 SELECT 
@@ -94,5 +104,27 @@ SELECT
     COUNT(DISTINCT arrival_airport_id) as arrival_airports
 FROM flights;
 
+-- name: price_percentiles
+-- 11. ПЕРЦЕНТИЛИ ЦЕН ПО ПЛАТФОРМАМ И СТАТУСАМ
+-- p50/p90/p95/p99 цены билета за одно сканирование booking (GROUPING SETS)
+SELECT
+    t.dimension,
+    t.value,
+    t.priced as priced_bookings,
+    t.p[1] as p50,
+    t.p[2] as p90,
+    t.p[3] as p95,
+    t.p[4] as p99
+FROM (
+    SELECT
+        CASE WHEN GROUPING(booking_platform) = 0 THEN 'platform' ELSE 'status' END as dimension,
+        CASE WHEN GROUPING(booking_platform) = 0 THEN booking_platform ELSE status END as value,
+        COUNT(price) as priced,
+        percentile_cont(ARRAY[0.5, 0.9, 0.95, 0.99]) WITHIN GROUP (ORDER BY price) as p
+    FROM booking
+    GROUP BY GROUPING SETS ((booking_platform), (status))
+) t
+ORDER BY 1, 2;
+
 
 
@@ -0,0 +1,194 @@
+"""
+Query result cache for SkyTrack analytics.
+
+Results are keyed by query text, parameters and fetch mode (typed and plain
+fetches of one query build different frames) and kept in two LRU tiers:
+a small in-memory tier and a larger on-disk tier of pickled DataFrames.
+Each entry remembers the version of every table it reads from; the versions
+come from the n_tup_ins/n_tup_upd/n_tup_del counters in pg_stat_user_tables,
+so validating all cached reports costs a single catalog query.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# Tables referenced by a query: every identifier after FROM or JOIN
+TABLE_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+
+TABLE_VERSIONS_QUERY = """
+    SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS changes
+    FROM pg_stat_user_tables;
+"""
+
+
+def query_tables(query):
+    """Names of the tables a query reads from"""
+    return sorted({name.lower() for name in TABLE_PATTERN.findall(query)})
+
+
+class QueryCache:
+    def __init__(self, engine, cache_dir='.cache/queries', max_memory_entries=32,
+                 max_disk_entries=256, version_ttl=2.0):
+        """
+        engine: SQLAlchemy engine used for the catalog lookup
+        version_ttl: seconds a table version snapshot is reused, so one
+                     dashboard refresh triggers one catalog lookup
+        """
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.version_ttl = version_ttl
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = None
+        self._versions_time = 0.0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index_path = os.path.join(self.cache_dir, 'index.json')
+        self._index = self._load_index()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _load_index(self):
+        """Disk tier index: key -> {'deps': {...}, 'used': timestamp}"""
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        with open(self._index_path, 'w') as f:
+            json.dump(self._index, f)
+
+    @staticmethod
+    def make_key(query, params=None, mode=None):
+        """Cache key from the query text, its parameters and the fetch mode"""
+        raw = query.strip() + '\n' + repr(params) + '\n' + repr(mode)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def table_versions(self):
+        """Current {table: version}; refreshed at most once per version_ttl"""
+        now = time.monotonic()
+        if self._versions is None or now - self._versions_time > self.version_ttl:
+            with self.engine.connect() as conn:
+                rows = conn.exec_driver_sql(TABLE_VERSIONS_QUERY).fetchall()
+            self._versions = {row[0]: int(row[1]) for row in rows}
+            self._versions_time = now
+        return self._versions
+
+    def _current_deps(self, tables):
+        versions = self.table_versions()
+        return {table: versions.get(table) for table in tables}
+
+    def get_or_fetch(self, query, params, fetch, mode=None):
+        """
+        Return the cached DataFrame for (query, params, mode) if none of its source
+        tables changed since it was stored; otherwise call fetch() and cache it.
+        query is the text the result is cached under; fetch() may run an
+        equivalent rewrite of it.
+        """
+        key = self.make_key(query, params, mode)
+        tables = query_tables(query)
+
+        with self._lock:
+            deps = self._current_deps(tables)
+            df = self._lookup(key, deps)
+            if df is not None:
+                self.hits += 1
+                return df
+            self.misses += 1
+
+        df = fetch()
+
+        with self._lock:
+            self._store(key, deps, df)
+        return df
+
+    def _lookup(self, key, deps):
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] == deps:
+                self._memory.move_to_end(key)
+                return entry[1]
+            del self._memory[key]
+
+        meta = self._index.get(key)
+        if meta is None:
+            return None
+        if meta['deps'] != deps:
+            self._drop_disk_entry(key)
+            self._save_index()
+            return None
+        try:
+            df = pd.read_pickle(self._entry_path(key))
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self._drop_disk_entry(key)
+            self._save_index()
+            return None
+
+        meta['used'] = time.time()
+        self._save_index()
+        self._remember(key, deps, df)
+        return df
+
+    def _store(self, key, deps, df):
+        self._remember(key, deps, df)
+
+        df.to_pickle(self._entry_path(key))
+        self._index[key] = {'deps': deps, 'used': time.time()}
+
+        # Evict least recently used disk entries
+        while len(self._index) > self.max_disk_entries:
+            oldest = min(self._index, key=lambda k: self._index[k]['used'])
+            self._drop_disk_entry(oldest)
+        self._save_index()
+
+    def _remember(self, key, deps, df):
+        self._memory[key] = (deps, df)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def _drop_disk_entry(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def invalidate_table(self, table):
+        """
+        Drop every cached result that reads from the given table.
+        Used for writes made by this process: pg_stat counters are only
+        flushed at transaction end, with a delay, so they can lag behind.
+        """
+        with self._lock:
+            self._versions = None
+
+            for key in [k for k, entry in self._memory.items() if table in entry[0]]:
+                del self._memory[key]
+            for key in [k for k, meta in self._index.items() if table in meta['deps']]:
+                self._drop_disk_entry(key)
+            self._save_index()
+
+    def clear(self):
+        """Drop all cached results"""
+        with self._lock:
+            self._memory.clear()
+            for key in list(self._index):
+                self._drop_disk_entry(key)
+            self._save_index()
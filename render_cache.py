@@ -0,0 +1,95 @@
+"""
+Content-addressed render cache for the chart files in charts/.
+
+Every chart is keyed by a hash of its input DataFrame (values, index, column
+names and dtypes) together with its render parameters: size, dpi, output file
+and the source of its drawing function. A small JSON manifest remembers the
+key each file was last rendered from; when a chart's key matches and the file
+is still there with the same size, rendering and savefig are skipped.
+"""
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+MANIFEST_PATH = 'charts/render_manifest.json'
+
+
+def frame_digest(df):
+    """sha256 over the DataFrame's columns, dtypes, index and values"""
+    digest = hashlib.sha256()
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in df.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def function_source(function):
+    """Source of a drawing function, so edits to the chart code invalidate its files"""
+    try:
+        return inspect.getsource(function)
+    except (OSError, TypeError):
+        return f'{function.__module__}.{function.__qualname__}'
+
+
+class RenderCache:
+    def __init__(self, manifest_path=MANIFEST_PATH):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._manifest = self._load_manifest()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _load_manifest(self):
+        """chart name -> {'key', 'path', 'bytes', 'rendered'}"""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        # Written to a temporary file and swapped in, so a crash never leaves half a manifest
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def make_key(df, params):
+        """Cache key from the input DataFrame and the render parameters"""
+        raw = frame_digest(df) + '\n' + json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def is_current(self, name, key, path):
+        """True if path was rendered from key and has not been replaced or removed since"""
+        with self._lock:
+            entry = self._manifest.get(name)
+            current = (entry is not None and entry['key'] == key and entry['path'] == path
+                       and os.path.exists(path) and os.path.getsize(path) == entry['bytes'])
+            if current:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return current
+
+    def record(self, name, key, path):
+        """Remember that path was just rendered from key"""
+        with self._lock:
+            self._manifest[name] = {
+                'key': key,
+                'path': path,
+                'bytes': os.path.getsize(path),
+                'rendered': time.time(),
+            }
+            self._save_manifest()
+
+    def clear(self):
+        """Forget every entry; the next run renders all charts"""
+        with self._lock:
+            self._manifest = {}
+            self._save_manifest()
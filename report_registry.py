@@ -0,0 +1,201 @@
+"""
+Registry of the console report sections (main.py).
+
+The SQL lives only in queries.sql, one statement per `-- name: <report>`
+annotation. Each named query is paired here with its result schema (the
+column names it must return) and the formatter that prints its section.
+Queries are prepared once per connection (PREPARE) and afterwards run with
+EXECUTE, so repeated and scheduled runs skip parsing and planning.
+
+    python main.py --list
+    python main.py --only flights_by_airline baggage_stats
+"""
+import re
+from collections import OrderedDict, namedtuple
+
+QUERIES_FILE = 'queries.sql'
+
+NAME_PATTERN = re.compile(r'^--\s*name:\s*(\w+)\s*$', re.MULTILINE)
+
+# Prepared statement names are prefixed to stay clear of other sessions' statements
+STATEMENT_PREFIX = 'skytrack_'
+
+Report = namedtuple('Report', ['name', 'sql', 'columns', 'formatter'])
+
+
+# ФУНКЦИИ ВЫВОДА СЕКЦИЙ ОТЧЕТА
+# Каждая функция принимает строки в том же виде, что возвращает запрос из queries.sql
+
+def print_flights_by_airline(record):
+    print("1 - КОЛИЧЕСТВО РЕЙСОВ ПО АВИАКОМПАНИЯМ:")
+    for row in record:
+        print(f"   Авиакомпания {row[0]}: {row[1]} рейсов")
+    print()
+
+
+def print_booking_price_by_status(record):
+    print("2 - СРЕДНЯЯ/МИН/МАКС ЦЕНА ПО СТАТУСАМ БРОНИРОВАНИЯ:")
+    for row in record:
+        print(f"   Статус '{row[0]}': {row[1]} бронирований, средняя цена: {float(row[2]):.2f}, мин: {float(row[3]):.2f}, макс: {float(row[4]):.2f}")
+    print()
+
+
+def print_passengers_by_country(record):
+    print("3 - КОЛИЧЕСТВО ПАССАЖИРОВ ПО СТРАНАМ:")
+    for row in record:
+        print(f"   {row[0]}: {row[1]} пассажиров")
+    print()
+
+
+def print_baggage_stats(record):
+    print("4 - СТАТИСТИКА ПО БАГАЖУ:")
+    for row in record:
+        print(f"   Всего багажа: {row[0]}, средний вес: {row[1]:.2f} кг, мин: {row[2]} кг, макс: {row[3]} кг")
+    print()
+
+
+def print_flights_by_status(record):
+    print("5 - РЕЙСЫ ПО СТАТУСАМ:")
+    for row in record:
+        print(f"   Статус '{row[0]}': {row[1]} рейсов")
+    print()
+
+
+def print_security_results(record):
+    print("6 - РЕЗУЛЬТАТЫ ПРОВЕРКИ БЕЗОПАСНОСТИ:")
+    for row in record:
+        print(f"   Результат '{row[0]}': {row[1]} проверок")
+    print()
+
+
+def print_passengers_by_gender(record):
+    print("7 - ПАССАЖИРЫ ПО ПОЛУ И ВОЗРАСТУ:")
+    for row in record:
+        print(f"   Пол '{row[0]}': {row[1]} пассажиров, средний возраст: {row[2]:.1f} лет")
+    print()
+
+
+def print_booking_platforms(record):
+    print("8 - ПОПУЛЯРНЫЕ ПЛАТФОРМЫ БРОНИРОВАНИЯ:")
+    for row in record:
+        print(f"   Платформа '{row[0]}': {row[1]} бронирований, средняя цена: {row[2]:.2f}")
+    print()
+
+
+def print_airports_by_country(record):
+    print("9 - АЭРОПОРТЫ ПО СТРАНАМ:")
+    for row in record:
+        print(f"   {row[0]}: {row[1]} аэропортов")
+    print()
+
+
+def print_flight_totals(record):
+    print("10 - ОБЩАЯ СТАТИСТИКА ПО РЕЙСАМ:")
+    for row in record:
+        print(f"   Всего рейсов: {row[0]}")
+        print(f"   Уникальных авиакомпаний: {row[1]}")
+        print(f"   Аэропортов отправления: {row[2]}")
+        print(f"   Аэропортов прибытия: {row[3]}")
+
+
+def print_price_percentiles(record):
+    print("\n11 - ПЕРЦЕНТИЛИ ЦЕН ПО ПЛАТФОРМАМ И СТАТУСАМ:")
+    titles = {'platform': 'Платформа', 'status': 'Статус'}
+    for row in record:
+        if row[3] is None:
+            continue
+        print(f"   {titles[row[0]]} '{row[1]}': {row[2]} цен, p50: {row[3]:.2f}, p90: {row[4]:.2f}, p95: {row[5]:.2f}, p99: {row[6]:.2f}")
+
+
+# report name -> (result columns, formatter), in report order
+REPORT_FORMATS = OrderedDict([
+    ('flights_by_airline', (['airline_id', 'total_flights'], print_flights_by_airline)),
+    ('booking_price_by_status', (['status', 'bookings_count', 'avg_price', 'min_price', 'max_price'],
+                                 print_booking_price_by_status)),
+    ('passengers_by_country', (['country_of_citizenship', 'passengers_count'], print_passengers_by_country)),
+    ('baggage_stats', (['total_baggage', 'avg_weight', 'min_weight', 'max_weight'], print_baggage_stats)),
+    ('flights_by_status', (['status', 'flights_count'], print_flights_by_status)),
+    ('security_results', (['check_result', 'checks_count'], print_security_results)),
+    ('passengers_by_gender', (['gender', 'passengers_count', 'avg_age'], print_passengers_by_gender)),
+    ('booking_platforms', (['booking_platform', 'bookings_count', 'avg_price'], print_booking_platforms)),
+    ('airports_by_country', (['country', 'airports_count'], print_airports_by_country)),
+    ('flight_totals', (['total_flights', 'unique_airlines', 'departure_airports', 'arrival_airports'],
+                       print_flight_totals)),
+    ('price_percentiles', (['dimension', 'value', 'priced_bookings', 'p50', 'p90', 'p95', 'p99'],
+                           print_price_percentiles)),
+])
+
+
+def parse_queries(text):
+    """{name: sql} for every `-- name:` block; other comments and the trailing ; are dropped"""
+    queries = OrderedDict()
+    matches = list(NAME_PATTERN.finditer(text))
+    for match, following in zip(matches, matches[1:] + [None]):
+        block = text[match.end():following.start() if following else len(text)]
+        sql = '\n'.join(line for line in block.splitlines() if not line.strip().startswith('--'))
+        queries[match.group(1)] = sql.strip().rstrip(';').strip()
+    return queries
+
+
+def load_reports(path=QUERIES_FILE):
+    """Ordered {name: Report}; every named query needs a format and vice versa"""
+    with open(path, encoding='utf-8') as f:
+        queries = parse_queries(f.read())
+
+    missing = [name for name in REPORT_FORMATS if name not in queries]
+    unknown = [name for name in queries if name not in REPORT_FORMATS]
+    if missing or unknown:
+        raise ValueError(f"{path}: missing queries {missing}, queries without a format {unknown}")
+
+    return OrderedDict((name, Report(name, queries[name], *REPORT_FORMATS[name])) for name in REPORT_FORMATS)
+
+
+def select_reports(reports, names=None):
+    """The reports to run, in registry order; unknown names raise KeyError"""
+    if not names:
+        return list(reports.values())
+    unknown = [name for name in names if name not in reports]
+    if unknown:
+        raise KeyError(f"Unknown reports {unknown}, available: {list(reports)}")
+    return [report for report in reports.values() if report.name in names]
+
+
+def prepared_statements(connection):
+    """
+    Names prepared on this connection. Pooled connections carry an info dict
+    that lives as long as the database session, which is exactly how long
+    prepared statements last.
+    """
+    info = getattr(connection, 'info', None)
+    if not isinstance(info, dict):
+        raise TypeError("prepared reports need a pooled connection (db.connection())")
+    return info.setdefault('skytrack_prepared', set())
+
+
+def execute(connection, cursor, report):
+    """Run a report through its prepared statement and check its result schema"""
+    statement = STATEMENT_PREFIX + report.name
+    prepared = prepared_statements(connection)
+    if statement not in prepared:
+        cursor.execute(f"PREPARE {statement} AS {report.sql}")
+        prepared.add(statement)
+    cursor.execute(f"EXECUTE {statement}")
+
+    columns = [column[0] for column in cursor.description]
+    if columns != report.columns:
+        raise ValueError(f"{report.name}: expected columns {report.columns}, got {columns}")
+    return cursor.fetchall()
+
+
+def run_reports(connection, cursor, names=None, precomputed=None, path=QUERIES_FILE):
+    """
+    Print the selected reports (all by default) in registry order.
+    precomputed: {report name: rows} - already computed sections, their queries are skipped
+    """
+    precomputed = precomputed or {}
+    for report in select_reports(load_reports(path), names):
+        if report.name in precomputed:
+            rows = precomputed[report.name]
+        else:
+            rows = execute(connection, cursor, report)
+        report.formatter(rows)
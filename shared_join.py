@@ -0,0 +1,96 @@
+"""
+Booking-flight join shared by the booking reports of one run.
+
+The bar chart, histogram, scatter plot and the Booking_Summary sheet all
+start from the same sub-join
+
+    booking b JOIN booking_flight bf ON ... JOIN flights f ON ...
+
+and only read booking columns from it. The join is materialized once per run
+into an unlogged table skytrack_booking_flights_<run id> (one row per
+booking_flight row, with the booking's id, platform and price), and rewrite()
+replaces the sub-join in each query with a scan of that table under the same
+alias. Unlike a temp table it is visible to every pooled connection, so
+parallel mode can use it too; each run has its own table, so concurrent runs
+never see each other's, and drop() removes it when the run ends.
+
+Booking_Summary joins booking_flight without flights; with the foreign key on
+booking_flight.flight_id the rows are the same.
+"""
+import re
+import uuid
+
+RUN_TABLE_PREFIX = 'skytrack_booking_flights_'
+
+BUILD_SQL = """
+    CREATE UNLOGGED TABLE {table} AS
+    SELECT b.booking_id, b.booking_platform, b.price
+    FROM booking b
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    JOIN flights f ON bf.flight_id = f.flight_id;
+    CREATE INDEX ON {table} (booking_id);
+"""
+
+# booking b [ON ...] JOIN booking_flight bf ON ... [JOIN flights f ON ...]
+SUB_JOIN_PATTERN = re.compile(
+    r'\b(FROM|JOIN)\s+booking\s+b\b(\s+ON\s+[\w.]+\s*=\s*b\.booking_id)?'
+    r'\s+JOIN\s+booking_flight\s+bf\s+ON\s+b\.booking_id\s*=\s*bf\.booking_id'
+    r'(?:\s+JOIN\s+flights\s+f\s+ON\s+bf\.flight_id\s*=\s*f\.flight_id)?',
+    re.IGNORECASE)
+
+# After the rewrite the query may only read b.* columns the run table has
+REMOVED_ALIAS_PATTERN = re.compile(r'\b(?:bf|f)\.\w+')
+RUN_TABLE_COLUMNS = {'booking_id', 'booking_platform', 'price'}
+BOOKING_COLUMN_PATTERN = re.compile(r'\bb\.(\w+)')
+
+
+def run_table_name():
+    """A table name no other run uses"""
+    return RUN_TABLE_PREFIX + uuid.uuid4().hex[:12]
+
+
+def materialize(connection, table):
+    """Build the shared join for this run and analyze it"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(BUILD_SQL.format(table=table))
+        connection.commit()
+        # ANALYZE after commit so the planner has statistics for the new table
+        cursor.execute(f"ANALYZE {table};")
+        connection.commit()
+        cursor.execute(f"SELECT COUNT(*) FROM {table};")
+        rows = cursor.fetchone()[0]
+        connection.rollback()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return rows
+
+
+def drop(connection, table):
+    """Remove a run's shared join table"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {table};")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def rewrite(query, table):
+    """
+    The query reading the shared join instead of recomputing it, or the query
+    unchanged when it does not contain the sub-join (or would still need
+    columns the shared table does not have)
+    """
+    rewritten, count = SUB_JOIN_PATTERN.subn(lambda m: f"{m.group(1)} {table} b{m.group(2) or ''}", query)
+    if count == 0 or REMOVED_ALIAS_PATTERN.search(rewritten):
+        return query
+    if not set(BOOKING_COLUMN_PATTERN.findall(rewritten)) <= RUN_TABLE_COLUMNS:
+        return query
+    return rewritten
@@ -0,0 +1,502 @@
+"""
+Offline columnar snapshot of the data behind the SkyTrack reports.
+
+The columns the charts and Excel sheets need are dumped once into a
+directory of NumPy arrays, one .npy file per column:
+
+    snapshot/manifest.json
+    snapshot/flights/airline_id.npy          int64, -1 for NULL
+    snapshot/flights/status.npy              int32 dictionary codes, -1 for NULL
+    snapshot/flights/status.dict.json        code -> value
+    snapshot/booking/price.npy               float64, NaN for NULL
+    snapshot/flights/scheduled_departure.npy datetime64[D], NaT for NULL
+
+Snapshot opens the arrays memory-mapped, and every report is computed from
+them with vectorized joins (id -> row lookup arrays) and group-bys, giving
+the same rows as the SQL report queries without a database round trip.
+
+    python snapshot.py --dump --out snapshot
+    python analytics.py --snapshot snapshot
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import db
+import timeline
+
+DEFAULT_DIR = 'snapshot'
+
+# table -> [(column, kind)]; kinds: int, float, str (dictionary-encoded), date
+SNAPSHOT_COLUMNS = {
+    'airline': [('airline_id', 'int'), ('airline_name', 'str')],
+    'airport': [('airport_id', 'int'), ('airport_name', 'str'), ('city', 'str'), ('country', 'str')],
+    'flights': [('flight_id', 'int'), ('airline_id', 'int'), ('departure_airport_id', 'int'),
+                ('arrival_airport_id', 'int'), ('status', 'str'), ('scheduled_departure', 'date')],
+    'booking': [('booking_id', 'int'), ('booking_platform', 'str'), ('status', 'str'), ('price', 'float')],
+    'booking_flight': [('booking_id', 'int'), ('flight_id', 'int')],
+    'baggage': [('booking_id', 'int'), ('weight_in_kg', 'float')],
+}
+
+KIND_DTYPES = {
+    'int': np.dtype('int64'),
+    'float': np.dtype('float64'),
+    'str': np.dtype('int32'),
+    'date': np.dtype('datetime64[D]'),
+}
+
+NULL_ID = -1
+
+# Dictionary code of the folded "Other" airline in the top-N timeline
+OTHER_CODE = -2
+
+
+class _ColumnWriter:
+    """
+    Append-only .npy writer: chunks go to a raw file first and the header is
+    written once the final length is known, so memory stays at one chunk
+    """
+
+    def __init__(self, path, kind):
+        self.path = path
+        self.kind = kind
+        self.dtype = KIND_DTYPES[kind]
+        self.length = 0
+        self.dictionary = {} if kind == 'str' else None
+        self._raw = open(path + '.raw', 'wb')
+
+    def _encode(self, values):
+        if self.kind == 'int':
+            return np.array([NULL_ID if v is None else v for v in values], dtype=self.dtype)
+        if self.kind == 'float':
+            return np.array([np.nan if v is None else float(v) for v in values], dtype=self.dtype)
+        if self.kind == 'date':
+            return np.array([np.datetime64('NaT') if v is None else np.datetime64(v, 'D') for v in values],
+                            dtype=self.dtype)
+        codes = np.empty(len(values), dtype=self.dtype)
+        for i, value in enumerate(values):
+            codes[i] = NULL_ID if value is None else self.dictionary.setdefault(value, len(self.dictionary))
+        return codes
+
+    def append(self, values):
+        array = self._encode(values)
+        self._raw.write(array.tobytes())
+        self.length += len(array)
+
+    def close(self):
+        self._raw.close()
+        with open(self.path, 'wb') as f:
+            np.lib.format.write_array_header_1_0(f, {
+                'descr': np.lib.format.dtype_to_descr(self.dtype),
+                'fortran_order': False,
+                'shape': (self.length,),
+            })
+            with open(self.path + '.raw', 'rb') as raw:
+                shutil.copyfileobj(raw, f)
+        os.remove(self.path + '.raw')
+
+        if self.dictionary is not None:
+            values = sorted(self.dictionary, key=self.dictionary.get)
+            with open(self.path[:-len('.npy')] + '.dict.json', 'w', encoding='utf-8') as f:
+                json.dump(values, f, default=str)
+
+
+def _dump_table(conn, tmp_dir, table, columns, chunk_rows):
+    """Stream one table's columns through a server-side cursor; returns its row count"""
+    os.makedirs(os.path.join(tmp_dir, table))
+    writers = [_ColumnWriter(os.path.join(tmp_dir, table, f'{column}.npy'), kind)
+               for column, kind in columns]
+    cursor = conn.cursor(name=f'snapshot_{table}')
+    try:
+        cursor.execute(f"SELECT {', '.join(column for column, _ in columns)} FROM {table};")
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                break
+            for writer, values in zip(writers, zip(*chunk)):
+                writer.append(values)
+    finally:
+        cursor.close()
+    for writer in writers:
+        writer.close()
+    return writers[0].length
+
+
+def dump(out_dir=DEFAULT_DIR, chunk_rows=100000):
+    """Stream every snapshot column out of Postgres; returns {table: rows}"""
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    counts = {}
+
+    # One REPEATABLE READ transaction on one connection: every table is read
+    # from the same database snapshot, so the joins between them stay consistent
+    with db.connection() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+            cursor.close()
+            for table, columns in SNAPSHOT_COLUMNS.items():
+                counts[table] = _dump_table(conn, tmp_dir, table, columns, chunk_rows)
+        finally:
+            conn.rollback()
+
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now(timezone.utc).isoformat(),
+            'rows': counts,
+            'columns': {table: dict(columns) for table, columns in SNAPSHOT_COLUMNS.items()},
+        }, f, indent=2)
+
+    # Swap in the finished snapshot so readers never see a partial one
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return counts
+
+
+def _lookup_index(ids):
+    """Array mapping id -> row position (-1 where no row has that id)"""
+    valid = ids[ids >= 0]
+    index = np.full(int(valid.max()) + 2 if len(valid) else 1, NULL_ID, dtype=np.int64)
+    index[valid] = np.flatnonzero(ids >= 0)
+    return index
+
+
+def _period_starts(days, granularity):
+    """date_trunc(granularity) of datetime64[D] days, as day numbers"""
+    days = days.astype('datetime64[D]')
+    if granularity == 'day':
+        return days.astype(np.int64)
+    if granularity == 'week':
+        # ISO weeks start on Monday; 1970-01-01 was a Thursday
+        numbers = days.astype(np.int64)
+        return numbers - (numbers + 3) % 7
+    months = days.astype('datetime64[M]').astype(np.int64)
+    if granularity == 'quarter':
+        months -= months % 3
+    return months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+
+def _period_labels(starts, granularity):
+    """Period labels as timeline.GRANULARITY_FORMATS renders them in SQL"""
+    dates = pd.DatetimeIndex(starts.astype('datetime64[D]'))
+    if granularity == 'day':
+        return dates.strftime('%Y-%m-%d').to_numpy()
+    if granularity == 'week':
+        iso = dates.isocalendar()
+        return (iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)).to_numpy()
+    if granularity == 'quarter':
+        return (dates.year.astype(str) + '-Q' + dates.quarter.astype(str)).to_numpy()
+    return dates.strftime('%Y-%m').to_numpy()
+
+
+def _sort_desc(df, column):
+    return df.sort_values(column, ascending=False, kind='stable').reset_index(drop=True)
+
+
+class Snapshot:
+    def __init__(self, path=DEFAULT_DIR):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self._columns = {}
+        self._labels = {}
+        self._indexes = {}
+
+    def column(self, table, column):
+        """Memory-mapped column (dictionary codes for string columns)"""
+        key = (table, column)
+        if key not in self._columns:
+            self._columns[key] = np.load(os.path.join(self.path, table, f'{column}.npy'), mmap_mode='r')
+        return self._columns[key]
+
+    def labels(self, table, column, codes):
+        """Decode dictionary codes to values; -1 becomes None"""
+        key = (table, column)
+        if key not in self._labels:
+            with open(os.path.join(self.path, table, f'{column}.dict.json'), encoding='utf-8') as f:
+                # Trailing None so that code -1 decodes to NULL
+                self._labels[key] = np.array(json.load(f) + [None], dtype=object)
+        return self._labels[key][codes]
+
+    def join(self, table, column, target, target_column):
+        """Row position in target for each row of table (-1 where the join finds nothing)"""
+        key = (target, target_column)
+        if key not in self._indexes:
+            self._indexes[key] = _lookup_index(np.asarray(self.column(target, target_column)))
+        index = self._indexes[key]
+        keys = np.asarray(self.column(table, column))
+        rows = np.full(len(keys), NULL_ID, dtype=np.int64)
+        in_range = (keys >= 0) & (keys < len(index))
+        rows[in_range] = index[keys[in_range]]
+        return rows
+
+    def _booking_flight_rows(self, require_flight=True):
+        """(booking row, booking_flight mask) for booking_flight rows that join"""
+        booking_rows = self.join('booking_flight', 'booking_id', 'booking', 'booking_id')
+        mask = booking_rows >= 0
+        if require_flight:
+            mask &= self.join('booking_flight', 'flight_id', 'flights', 'flight_id') >= 0
+        return booking_rows, mask
+
+    def _airport_edges(self):
+        """DataFrame of (airport row, flight row, airline_id) for departure and arrival edges"""
+        flight_rows = np.arange(len(self.column('flights', 'flight_id')))
+        airline_ids = np.asarray(self.column('flights', 'airline_id'))
+        parts = []
+        for column in ('departure_airport_id', 'arrival_airport_id'):
+            airport_rows = self.join('flights', column, 'airport', 'airport_id')
+            mask = airport_rows >= 0
+            parts.append(pd.DataFrame({
+                'airport': airport_rows[mask],
+                'flight': flight_rows[mask],
+                'airline_id': np.where(airline_ids[mask] >= 0, airline_ids[mask], np.nan),
+            }))
+        edges = pd.concat(parts, ignore_index=True)
+        edges['name'] = np.asarray(self.column('airport', 'airport_name'))[edges['airport']]
+        edges['city'] = np.asarray(self.column('airport', 'city'))[edges['airport']]
+        return edges
+
+    def _airport_traffic(self, edges):
+        return edges.groupby(['name', 'city']).agg(
+            flight_count=('flight', 'nunique'), airlines_count=('airline_id', 'nunique'))
+
+    def _decode_index(self, df, table, columns):
+        """Replace dictionary-code index levels with their values"""
+        df = df.reset_index()
+        for name, column in columns.items():
+            df[name] = self.labels(table, column, df[name].to_numpy())
+        return df
+
+    # Chart reports (same columns as analytics.REPORT_QUERIES)
+
+    def pie_chart(self):
+        airline_rows = self.join('flights', 'airline_id', 'airline', 'airline_id')
+        airport_rows = self.join('flights', 'departure_airport_id', 'airport', 'airport_id')
+        mask = (airline_rows >= 0) & (airport_rows >= 0)
+        df = pd.DataFrame({
+            'airline': np.asarray(self.column('airline', 'airline_name'))[airline_rows[mask]],
+            'airport': airport_rows[mask],
+        })
+        result = df.groupby('airline').agg(flight_count=('airport', 'size'),
+                                           airports_served=('airport', 'nunique'))
+        result = self._decode_index(result, 'airline', {'airline': 'airline_name'})
+        return _sort_desc(result, 'flight_count').head(8)
+
+    def bar_chart(self):
+        booking_rows, mask = self._booking_flight_rows()
+        rows = booking_rows[mask]
+        df = pd.DataFrame({
+            'platform': np.asarray(self.column('booking', 'booking_platform'))[rows],
+            'price': np.asarray(self.column('booking', 'price'))[rows],
+        })
+        result = df.groupby('platform').agg(booking_count=('price', 'size'), avg_price=('price', 'mean'))
+        result['avg_price'] = result['avg_price'].round(2)
+        result = self._decode_index(result, 'booking', {'platform': 'booking_platform'})
+        return _sort_desc(result, 'booking_count').head(10)
+
+    def horizontal_bar_chart(self):
+        result = self._airport_traffic(self._airport_edges())
+        result = self._decode_index(result, 'airport', {'name': 'airport_name', 'city': 'city'})
+        result = result.rename(columns={'name': 'airport'})
+        return _sort_desc(result, 'flight_count').head(15)
+
+    def line_chart(self):
+        airline_rows = self.join('flights', 'airline_id', 'airline', 'airline_id')
+        airport_rows = self.join('flights', 'departure_airport_id', 'airport', 'airport_id')
+        mask = (airline_rows >= 0) & (airport_rows >= 0)
+        df = pd.DataFrame({
+            'flight_status': np.asarray(self.column('flights', 'status'))[mask],
+            'airline': airline_rows[mask],
+            'airport': airport_rows[mask],
+        })
+        result = df.groupby('flight_status').agg(flight_count=('airline', 'size'),
+                                                 airlines_count=('airline', 'nunique'),
+                                                 airports_count=('airport', 'nunique'))
+        result = self._decode_index(result, 'flights', {'flight_status': 'status'})
+        # ORDER BY status: NULL last, as in Postgres
+        return result.sort_values('flight_status', na_position='last', kind='stable').reset_index(drop=True)
+
+    def histogram(self):
+        booking_rows, mask = self._booking_flight_rows()
+        prices = np.asarray(self.column('booking', 'price'))[booking_rows[mask]]
+        return pd.DataFrame({'ticket_price': prices[prices > 0]})
+
+    def scatter_plot(self, limit=200, sample_size=None, seed=42):
+        """
+        Baggage weight and ticket price pairs of the full join, first `limit` rows.
+        With sample_size, a seeded random sample of that many joined rows plus
+        the count, correlation and regression line over every row, as
+        analytics.SCATTER_SAMPLE_QUERY returns them
+        """
+        booking_rows, mask = self._booking_flight_rows()
+        # Each baggage row joins once per booking_flight row of its booking
+        links = np.bincount(booking_rows[mask], minlength=len(self.column('booking', 'booking_id')))
+
+        baggage_bookings = self.join('baggage', 'booking_id', 'booking', 'booking_id')
+        weights = np.asarray(self.column('baggage', 'weight_in_kg'))
+        prices = np.asarray(self.column('booking', 'price'))
+        valid = baggage_bookings >= 0
+        candidates = np.flatnonzero(valid)
+        candidates = candidates[(weights[candidates] > 0) & (prices[baggage_bookings[candidates]] > 0)]
+        multiplicity = links[baggage_bookings[candidates]]
+        if sample_size is not None:
+            return self._scatter_sample(weights[candidates], prices[baggage_bookings[candidates]],
+                                        multiplicity, sample_size, seed)
+
+        # Only expand the join as far as the LIMIT needs
+        needed = np.searchsorted(np.cumsum(multiplicity), limit) + 1
+        rows = np.repeat(candidates[:needed], multiplicity[:needed])[:limit]
+        return pd.DataFrame({
+            'baggage_weight': weights[rows],
+            'ticket_price': prices[baggage_bookings[rows]],
+        })
+
+    @staticmethod
+    def _scatter_sample(weights, prices, multiplicity, sample_size, seed):
+        """Seeded sample of the join (each pair repeated multiplicity times) and its statistics"""
+        columns = ['baggage_weight', 'ticket_price', 'total_points', 'correlation', 'slope', 'intercept']
+        total = int(multiplicity.sum())
+        if total == 0:
+            return pd.DataFrame(columns=columns)
+
+        # Moments weighted by how often each pair appears in the join
+        mean_x = np.average(weights, weights=multiplicity)
+        mean_y = np.average(prices, weights=multiplicity)
+        var_x = np.average((weights - mean_x) ** 2, weights=multiplicity)
+        var_y = np.average((prices - mean_y) ** 2, weights=multiplicity)
+        cov = np.average((weights - mean_x) * (prices - mean_y), weights=multiplicity)
+        # NULL in Postgres when a variable is constant
+        correlation = cov / np.sqrt(var_x * var_y) if var_x > 0 and var_y > 0 else np.nan
+        slope = cov / var_x if var_x > 0 else np.nan
+        intercept = mean_y - slope * mean_x if var_x > 0 else np.nan
+
+        positions = np.sort(np.random.default_rng(seed).choice(total, size=min(sample_size, total), replace=False))
+        rows = np.searchsorted(np.cumsum(multiplicity), positions, side='right')
+        result = pd.DataFrame({'baggage_weight': weights[rows], 'ticket_price': prices[rows]})
+        result['total_points'] = total
+        result['correlation'] = correlation
+        result['slope'] = slope
+        result['intercept'] = intercept
+        return result[columns]
+
+    def interactive_timeline(self, top_n=None, granularity=None):
+        """
+        Flights per airline, status and month. With a granularity, the rows of
+        timeline.SCALABLE_TIMELINE_QUERY instead: a period column at that
+        granularity, and with top_n the airlines outside the N busiest folded
+        into "Other"
+        """
+        airline_rows = self.join('flights', 'airline_id', 'airline', 'airline_id')
+        departures = np.asarray(self.column('flights', 'scheduled_departure'))
+        scheduled = ~np.isnat(departures)
+        mask = (airline_rows >= 0) & scheduled
+        airline_codes = np.asarray(self.column('airline', 'airline_name'))[airline_rows[mask]]
+        if top_n is not None:
+            # Ranked over every scheduled flight, as the top_airlines CTE
+            airline_ids = np.asarray(self.column('flights', 'airline_id'))
+            top = pd.Series(airline_ids[scheduled]).value_counts().index[:top_n].to_numpy()
+            airline_codes = np.where(np.isin(airline_ids[mask], top), airline_codes, OTHER_CODE)
+
+        period_column = 'month' if granularity is None else 'period'
+        granularity = granularity or 'month'
+        df = pd.DataFrame({
+            'airline': airline_codes,
+            'flight_status': np.asarray(self.column('flights', 'status'))[mask],
+            period_column: _period_starts(departures[mask], granularity),
+        })
+        result = df.groupby(['airline', 'flight_status', period_column]).size().rename('flight_count').reset_index()
+
+        codes = result['airline'].to_numpy()
+        airlines = self.labels('airline', 'airline_name', np.where(codes == OTHER_CODE, NULL_ID, codes))
+        result['airline'] = np.where(codes == OTHER_CODE, timeline.OTHER_AIRLINES, airlines)
+        result['flight_status'] = self.labels('flights', 'status', result['flight_status'].to_numpy())
+        result[period_column] = _period_labels(result[period_column].to_numpy(), granularity)
+        result = result[['airline', 'flight_status', period_column, 'flight_count']]
+        return result.sort_values([period_column, 'airline'], kind='stable').reset_index(drop=True)
+
+    def report(self, name, **options):
+        """DataFrame of a chart report by its REPORT_QUERIES name; options go to its builder"""
+        return getattr(self, name)(**options)
+
+    # Excel sheets (same columns as analytics.EXCEL_QUERIES)
+
+    def sheet(self, name):
+        if name == 'Airlines_Performance':
+            airline_rows = self.join('flights', 'airline_id', 'airline', 'airline_id')
+            mask = airline_rows >= 0
+            departures = np.asarray(self.column('flights', 'departure_airport_id'))[mask]
+            df = pd.DataFrame({
+                'name': np.asarray(self.column('airline', 'airline_name'))[airline_rows[mask]],
+                'airport': np.where(departures >= 0, departures, np.nan),
+            })
+            result = df.groupby('name').agg(flights=('airport', 'size'), airports=('airport', 'nunique'))
+            # LEFT JOIN: airlines without flights are listed with zero
+            all_names = np.unique(np.asarray(self.column('airline', 'airline_name')))
+            result = result.reindex(all_names, fill_value=0).rename_axis('name')
+            result = self._decode_index(result, 'airline', {'name': 'airline_name'})
+            result.columns = ['Airline Name', 'Total Flights', 'Airports Served']
+            return _sort_desc(result, 'Total Flights')
+
+        if name == 'Airport_Traffic':
+            result = self._airport_traffic(self._airport_edges())
+            names = np.asarray(self.column('airport', 'airport_name'))
+            cities = np.asarray(self.column('airport', 'city'))
+            all_airports = pd.MultiIndex.from_frame(
+                pd.DataFrame({'name': names, 'city': cities}).drop_duplicates())
+            result = result.reindex(all_airports, fill_value=0)
+            result = self._decode_index(result, 'airport', {'name': 'airport_name', 'city': 'city'})
+            result.columns = ['Airport Name', 'City', 'Flight Count', 'Airlines Operating']
+            return _sort_desc(result, 'Flight Count')
+
+        if name == 'Booking_Summary':
+            booking_rows, mask = self._booking_flight_rows(require_flight=False)
+            rows = booking_rows[mask]
+            df = pd.DataFrame({
+                'platform': np.asarray(self.column('booking', 'booking_platform'))[rows],
+                'price': np.asarray(self.column('booking', 'price'))[rows],
+            })
+            result = df.groupby('platform')['price'].agg(['size', 'mean', 'min', 'max'])
+            result[['mean', 'min', 'max']] = result[['mean', 'min', 'max']].round(2)
+            result = self._decode_index(result, 'booking', {'platform': 'booking_platform'})
+            result.columns = ['Platform', 'Bookings', 'Avg Price', 'Min Price', 'Max Price']
+            return _sort_desc(result, 'Bookings')
+
+        if name == 'Price_Percentiles':
+            prices = np.asarray(self.column('booking', 'price'))
+            parts = []
+            for dimension, column in (('platform', 'booking_platform'), ('status', 'status')):
+                # Values without priced bookings stay, with no percentiles, as in SQL
+                df = pd.DataFrame({'value': np.asarray(self.column('booking', column)), 'price': prices})
+                # Linear interpolation between ranks over the non-NULL prices, as percentile_cont
+                result = df.groupby('value')['price'].quantile([0.5, 0.9, 0.95, 0.99]).unstack().round(2)
+                result.insert(0, 'priced', df.groupby('value')['price'].count())
+                result = self._decode_index(result, 'booking', {'value': column})
+                result.insert(0, 'dimension', dimension)
+                parts.append(result.sort_values('value', na_position='last', kind='stable'))
+            result = pd.concat(parts, ignore_index=True)
+            result.columns = ['Dimension', 'Value', 'Priced Bookings', 'P50', 'P90', 'P95', 'P99']
+            return result
+
+        raise KeyError(f"Unknown sheet {name!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar snapshot of the SkyTrack report data")
+    parser.add_argument('--dump', action='store_true', help="dump a new snapshot from the database")
+    parser.add_argument('--out', default=DEFAULT_DIR, help="snapshot directory")
+    args = parser.parse_args()
+
+    if not args.dump:
+        parser.print_help()
+    else:
+        started = time.time()
+        counts = dump(args.out)
+        for table, rows in counts.items():
+            print(f"  {table}: {rows} rows")
+        print(f"Snapshot written to {args.out} in {time.time() - started:.1f}s")
@@ -0,0 +1,389 @@
+"""
+Deterministic synthetic data for the SkyTrack schema (see ERD.png).
+
+Generates airline, airport, passengers, security_check, flights, booking,
+booking_flight and baggage at a scale factor given in flights (10k .. 100M).
+Every table is produced in fixed-size chunks from its own seeded generator,
+so the same seed and scale always give the same rows, and memory stays flat
+at any scale. Rows are loaded with COPY; foreign keys and indexes are added
+after the load.
+
+    python synthetic.py --scale 100000 --seed 42 --reset
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+import db
+
+CHUNK_ROWS = 1_000_000
+
+# Rows per flight for the dependent tables; airline and airport counts are capped
+RATIOS = {
+    'passengers': 0.5,
+    'security_check': 0.5,
+    'booking': 2.0,
+    'booking_flight': 2.0,
+    'baggage': 1.5,
+}
+MAX_AIRLINES = 200
+MAX_AIRPORTS = 2000
+
+FLIGHT_STATUSES = ['Scheduled', 'On Time', 'Delayed', 'Departed', 'Arrived', 'Cancelled']
+FLIGHT_STATUS_WEIGHTS = [0.15, 0.3, 0.2, 0.05, 0.25, 0.05]
+BOOKING_STATUSES = ['Confirmed', 'Pending', 'Cancelled', 'Completed']
+BOOKING_STATUS_WEIGHTS = [0.45, 0.1, 0.1, 0.35]
+BOOKING_PLATFORMS = ['Website', 'Mobile App', 'Travel Agency', 'Call Center', 'Partner OTA']
+BOOKING_PLATFORM_WEIGHTS = [0.4, 0.3, 0.15, 0.05, 0.1]
+CHECK_RESULTS = ['Passed', 'Failed', 'Secondary Screening']
+CHECK_RESULT_WEIGHTS = [0.9, 0.02, 0.08]
+GENDERS = ['Male', 'Female', 'Other']
+GENDER_WEIGHTS = [0.49, 0.49, 0.02]
+COUNTRIES = ['Kazakhstan', 'Russia', 'USA', 'Germany', 'France', 'China', 'Turkey', 'UAE',
+             'United Kingdom', 'Japan', 'India', 'Brazil', 'Italy', 'Spain', 'Canada']
+FIRST_NAMES = ['Aigerim', 'Alexander', 'Maria', 'John', 'Emma', 'Li', 'Mehmet', 'Anna', 'Omar', 'Sofia']
+LAST_NAMES = ['Ivanov', 'Smith', 'Muller', 'Dubois', 'Wang', 'Yilmaz', 'Nurlanov', 'Rossi', 'Garcia', 'Tanaka']
+
+# Flights are spread over this window
+START_DATE = np.datetime64('2023-01-01')
+DAYS = 730
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS airline (
+        airline_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        airline_code VARCHAR(50),
+        airline_name VARCHAR(50),
+        airline_country VARCHAR(50),
+        created_at DATE,
+        update_at DATE
+    );
+    CREATE TABLE IF NOT EXISTS airport (
+        airport_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        airport_name VARCHAR(50),
+        country VARCHAR(50),
+        state VARCHAR(50),
+        city VARCHAR(50),
+        created_at DATE,
+        update_at DATE
+    );
+    CREATE TABLE IF NOT EXISTS passengers (
+        passenger_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        first_name VARCHAR(50),
+        last_name VARCHAR(50),
+        date_of_birth DATE,
+        gender VARCHAR(50),
+        country_of_citizenship VARCHAR(50),
+        country_of_residence VARCHAR(50),
+        passport_number VARCHAR(50),
+        created_at DATE,
+        update_at DATE
+    );
+    CREATE TABLE IF NOT EXISTS security_check (
+        security_check_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        check_result VARCHAR(50),
+        created_at DATE,
+        update_at DATE,
+        passenger_id INT
+    );
+    CREATE TABLE IF NOT EXISTS flights (
+        flight_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        flight_no VARCHAR(50),
+        scheduled_departure DATE,
+        scheduled_arrival DATE,
+        departure_airport_id INT,
+        arrival_airport_id INT,
+        departing_gate VARCHAR(50),
+        arriving_gate VARCHAR(50),
+        airline_id INT,
+        status VARCHAR(50),
+        actual_departure DATE,
+        actual_arrival DATE,
+        created_at DATE,
+        update_at DATE
+    );
+    CREATE TABLE IF NOT EXISTS booking (
+        booking_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        passenger_id INT,
+        booking_platform VARCHAR(50),
+        created_at DATE,
+        update_at DATE,
+        status VARCHAR(50),
+        price DECIMAL(7,2)
+    );
+    CREATE TABLE IF NOT EXISTS booking_flight (
+        booking_flight_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        booking_id INT,
+        flight_id INT,
+        created_at DATE,
+        update_at DATE
+    );
+    CREATE TABLE IF NOT EXISTS baggage (
+        baggage_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        weight_in_kg DECIMAL(4,2),
+        created_date DATE,
+        update_date DATE,
+        booking_id INT
+    );
+"""
+
+# Added after the load: checking every COPYed row against its parent is slower
+# than validating the whole table once
+# Named after the Postgres defaults and guarded, so loading into an existing schema is idempotent
+CONSTRAINTS_SQL = """
+    ALTER TABLE security_check DROP CONSTRAINT IF EXISTS security_check_passenger_id_fkey,
+        ADD CONSTRAINT security_check_passenger_id_fkey FOREIGN KEY (passenger_id) REFERENCES passengers (passenger_id);
+    ALTER TABLE flights DROP CONSTRAINT IF EXISTS flights_airline_id_fkey,
+        ADD CONSTRAINT flights_airline_id_fkey FOREIGN KEY (airline_id) REFERENCES airline (airline_id);
+    ALTER TABLE flights DROP CONSTRAINT IF EXISTS flights_departure_airport_id_fkey,
+        ADD CONSTRAINT flights_departure_airport_id_fkey FOREIGN KEY (departure_airport_id) REFERENCES airport (airport_id);
+    ALTER TABLE flights DROP CONSTRAINT IF EXISTS flights_arrival_airport_id_fkey,
+        ADD CONSTRAINT flights_arrival_airport_id_fkey FOREIGN KEY (arrival_airport_id) REFERENCES airport (airport_id);
+    ALTER TABLE booking DROP CONSTRAINT IF EXISTS booking_passenger_id_fkey,
+        ADD CONSTRAINT booking_passenger_id_fkey FOREIGN KEY (passenger_id) REFERENCES passengers (passenger_id);
+    ALTER TABLE booking_flight DROP CONSTRAINT IF EXISTS booking_flight_booking_id_fkey,
+        ADD CONSTRAINT booking_flight_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES booking (booking_id);
+    ALTER TABLE booking_flight DROP CONSTRAINT IF EXISTS booking_flight_flight_id_fkey,
+        ADD CONSTRAINT booking_flight_flight_id_fkey FOREIGN KEY (flight_id) REFERENCES flights (flight_id);
+    ALTER TABLE baggage DROP CONSTRAINT IF EXISTS baggage_booking_id_fkey,
+        ADD CONSTRAINT baggage_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES booking (booking_id);
+    CREATE INDEX IF NOT EXISTS flights_airline_id_idx ON flights (airline_id);
+    CREATE INDEX IF NOT EXISTS flights_departure_airport_id_idx ON flights (departure_airport_id);
+    CREATE INDEX IF NOT EXISTS flights_arrival_airport_id_idx ON flights (arrival_airport_id);
+    CREATE INDEX IF NOT EXISTS booking_flight_booking_id_idx ON booking_flight (booking_id);
+    CREATE INDEX IF NOT EXISTS booking_flight_flight_id_idx ON booking_flight (flight_id);
+    CREATE INDEX IF NOT EXISTS baggage_booking_id_idx ON baggage (booking_id);
+"""
+
+# Parents before children; also the order of the id columns
+TABLE_ORDER = ['airline', 'airport', 'passengers', 'security_check',
+               'flights', 'booking', 'booking_flight', 'baggage']
+
+ID_COLUMNS = {
+    'airline': 'airline_id',
+    'airport': 'airport_id',
+    'passengers': 'passenger_id',
+    'security_check': 'security_check_id',
+    'flights': 'flight_id',
+    'booking': 'booking_id',
+    'booking_flight': 'booking_flight_id',
+    'baggage': 'baggage_id',
+}
+
+
+def table_sizes(scale):
+    """Row count of every table for a scale factor given in flights"""
+    sizes = {
+        'airline': min(MAX_AIRLINES, max(10, scale // 1000)),
+        'airport': min(MAX_AIRPORTS, max(20, scale // 200)),
+        'flights': scale,
+    }
+    for table, ratio in RATIOS.items():
+        sizes[table] = max(1, int(scale * ratio))
+    return sizes
+
+
+def _choice(rng, values, weights, size):
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=weights)]
+
+
+def _dates(rng, size, start=START_DATE, days=DAYS):
+    return start + rng.integers(0, days, size=size).astype('timedelta64[D]')
+
+
+def _generate_chunk(table, ids, sizes, rng):
+    """DataFrame for the rows with the given ids; columns in table order"""
+    n = len(ids)
+    created = _dates(rng, n)
+
+    if table == 'airline':
+        return pd.DataFrame({
+            'airline_id': ids,
+            'airline_code': [f"A{i:03d}" for i in ids],
+            'airline_name': [f"Airline {i:03d}" for i in ids],
+            'airline_country': _choice(rng, COUNTRIES, None, n),
+            'created_at': created,
+            'update_at': created,
+        })
+    if table == 'airport':
+        country = _choice(rng, COUNTRIES, None, n)
+        return pd.DataFrame({
+            'airport_id': ids,
+            'airport_name': [f"Airport {i:04d}" for i in ids],
+            'country': country,
+            'state': None,
+            'city': [f"City {i % 500:03d}" for i in ids],
+            'created_at': created,
+            'update_at': created,
+        })
+    if table == 'passengers':
+        return pd.DataFrame({
+            'passenger_id': ids,
+            'first_name': _choice(rng, FIRST_NAMES, None, n),
+            'last_name': _choice(rng, LAST_NAMES, None, n),
+            'date_of_birth': _dates(rng, n, np.datetime64('1950-01-01'), 365 * 55),
+            'gender': _choice(rng, GENDERS, GENDER_WEIGHTS, n),
+            'country_of_citizenship': _choice(rng, COUNTRIES, None, n),
+            'country_of_residence': _choice(rng, COUNTRIES, None, n),
+            'passport_number': [f"P{i:09d}" for i in ids],
+            'created_at': created,
+            'update_at': created,
+        })
+    if table == 'security_check':
+        return pd.DataFrame({
+            'security_check_id': ids,
+            'check_result': _choice(rng, CHECK_RESULTS, CHECK_RESULT_WEIGHTS, n),
+            'created_at': created,
+            'update_at': created,
+            'passenger_id': rng.integers(1, sizes['passengers'] + 1, size=n),
+        })
+    if table == 'flights':
+        departure = _dates(rng, n)
+        status = _choice(rng, FLIGHT_STATUSES, FLIGHT_STATUS_WEIGHTS, n)
+        departure_airport = rng.integers(1, sizes['airport'] + 1, size=n)
+        # Shift by 1..airports-1 so a flight never returns to its departure airport
+        arrival_airport = (departure_airport - 1 + rng.integers(1, max(2, sizes['airport']), size=n)) \
+            % sizes['airport'] + 1
+        flown = np.isin(status, ['Departed', 'Arrived'])
+        arrival = departure + rng.integers(0, 2, size=n).astype('timedelta64[D]')
+        # Zipf-like airline popularity, so the top-N charts have a clear ranking
+        airline_weights = 1.0 / np.arange(1, sizes['airline'] + 1)
+        return pd.DataFrame({
+            'flight_id': ids,
+            'flight_no': [f"SK{i % 10000:04d}" for i in ids],
+            'scheduled_departure': departure,
+            'scheduled_arrival': arrival,
+            'departure_airport_id': departure_airport,
+            'arrival_airport_id': arrival_airport,
+            'departing_gate': [f"G{g}" for g in rng.integers(1, 60, size=n)],
+            'arriving_gate': [f"G{g}" for g in rng.integers(1, 60, size=n)],
+            'airline_id': rng.choice(sizes['airline'], size=n, p=airline_weights / airline_weights.sum()) + 1,
+            'status': status,
+            'actual_departure': np.where(flown, departure, np.datetime64('NaT')),
+            'actual_arrival': np.where(status == 'Arrived', arrival, np.datetime64('NaT')),
+            'created_at': created,
+            'update_at': created,
+        })
+    if table == 'booking':
+        return pd.DataFrame({
+            'booking_id': ids,
+            'passenger_id': rng.integers(1, sizes['passengers'] + 1, size=n),
+            'booking_platform': _choice(rng, BOOKING_PLATFORMS, BOOKING_PLATFORM_WEIGHTS, n),
+            'created_at': created,
+            'update_at': created,
+            'status': _choice(rng, BOOKING_STATUSES, BOOKING_STATUS_WEIGHTS, n),
+            'price': np.round(np.clip(rng.lognormal(5.5, 0.6, size=n), 20, 99999.99), 2),
+        })
+    if table == 'booking_flight':
+        # The first pass links every booking once; the rest pick random bookings
+        return pd.DataFrame({
+            'booking_flight_id': ids,
+            'booking_id': np.where(ids <= sizes['booking'], ids,
+                                   rng.integers(1, sizes['booking'] + 1, size=n)),
+            'flight_id': rng.integers(1, sizes['flights'] + 1, size=n),
+            'created_at': created,
+            'update_at': created,
+        })
+    if table == 'baggage':
+        return pd.DataFrame({
+            'baggage_id': ids,
+            'weight_in_kg': np.round(np.clip(rng.normal(18, 6, size=n), 0.5, 32), 2),
+            'created_date': created,
+            'update_date': created,
+            'booking_id': rng.integers(1, sizes['booking'] + 1, size=n),
+        })
+    raise ValueError(f"Unknown table {table!r}")
+
+
+def generate_chunks(table, sizes, seed=42, chunk_rows=CHUNK_ROWS):
+    """
+    Yield the table's rows as DataFrames of up to chunk_rows rows.
+    Each chunk has its own generator seeded by (seed, table, chunk), so output
+    does not depend on which chunks were generated before it.
+    """
+    table_index = TABLE_ORDER.index(table)
+    total = sizes[table]
+    for chunk_index, start in enumerate(range(1, total + 1, chunk_rows)):
+        rng = np.random.default_rng([seed, table_index, chunk_index])
+        ids = np.arange(start, min(start + chunk_rows, total + 1))
+        yield _generate_chunk(table, ids, sizes, rng)
+
+
+def _copy_frame(cursor, table, df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, sep='\t', header=False, index=False, na_rep='\\N', date_format='%Y-%m-%d')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(df.columns)}) FROM STDIN", buffer)
+
+
+def reset_schema(connection):
+    """Drop and recreate the generated tables (and everything depending on them)"""
+    cursor = connection.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {', '.join(reversed(TABLE_ORDER))} CASCADE;")
+    cursor.execute(SCHEMA_SQL)
+    connection.commit()
+    cursor.close()
+
+
+def load(connection, scale, seed=42, chunk_rows=CHUNK_ROWS, reset=False):
+    """
+    Generate and COPY every table, then add constraints and ANALYZE.
+    Refuses to load into a non-empty flights table unless reset is set.
+    Returns {table: (rows, seconds)}.
+    """
+    if reset:
+        reset_schema(connection)
+
+    cursor = connection.cursor()
+    cursor.execute(SCHEMA_SQL)
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM flights);")
+    if cursor.fetchone()[0]:
+        cursor.close()
+        raise RuntimeError("flights already has rows; use reset=True (--reset) to regenerate")
+
+    sizes = table_sizes(scale)
+    stats = {}
+    try:
+        for table in TABLE_ORDER:
+            started = time.perf_counter()
+            for chunk in generate_chunks(table, sizes, seed, chunk_rows):
+                _copy_frame(cursor, table, chunk)
+            # Ids were supplied explicitly; move the identity past them
+            cursor.execute("SELECT setval(pg_get_serial_sequence(%s, %s), %s);",
+                           (table, ID_COLUMNS[table], sizes[table]))
+            stats[table] = (sizes[table], time.perf_counter() - started)
+            print(f"  {table}: {sizes[table]:,} rows in {stats[table][1]:.1f}s")
+
+        cursor.execute(CONSTRAINTS_SQL)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    # ANALYZE outside the load transaction so the planner sees the new tables; in
+    # autocommit the statistics are not lost to the pool's rollback on return
+    with db.autocommit(connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("ANALYZE;")
+        finally:
+            cursor.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load deterministic synthetic SkyTrack data")
+    parser.add_argument('--scale', type=int, default=100000, help="number of flights (10k .. 100M)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--reset', action='store_true', help="drop and recreate the tables first")
+    args = parser.parse_args()
+
+    print(f"Generating scale {args.scale:,} (seed {args.seed})")
+    with db.connection() as connection:
+        load(connection, args.scale, args.seed, args.chunk_rows, args.reset)
+    print("Done")
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+import aggregate_store
+
+
+class FakeCursor:
+    """Answers the store's existence and marker checks, records everything else"""
+
+    def __init__(self, exists=True, reconciled=True):
+        self.exists = exists
+        self.reconciled = reconciled
+        self.executed = []
+        self._result = None
+
+    def execute(self, sql, params=None):
+        if 'to_regclass' in sql:
+            self._result = (self.exists,)
+        elif 'SELECT EXISTS' in sql:
+            self._result = (self.reconciled,)
+        else:
+            self.executed.append(sql)
+
+    def executemany(self, sql, rows):
+        self.executed.append(('upsert', list(rows)))
+
+    def fetchone(self):
+        return self._result
+
+
+FLIGHT = {'airline_id': 1, 'departure_airport_id': 10, 'status': 'Scheduled'}
+
+
+def upserts(cursor):
+    return [entry[1] for entry in cursor.executed if isinstance(entry, tuple)]
+
+
+def test_deltas_are_applied_once_reconciled():
+    cursor = FakeCursor()
+    assert aggregate_store.apply_flight_rows(cursor, [FLIGHT, FLIGHT]) == 3
+    rows = {(metric, key): count for metric, key, count, *_ in upserts(cursor)[0]}
+    assert rows == {
+        ('flights_by_airline', '1'): 2,
+        ('flights_by_status', 'Scheduled'): 2,
+        ('flights_by_route', '1|10|Scheduled'): 2,
+    }
+
+
+@pytest.mark.parametrize('exists, reconciled', [(False, False), (True, False)])
+def test_deltas_are_skipped_before_the_first_reconciliation(exists, reconciled):
+    cursor = FakeCursor(exists, reconciled)
+    assert aggregate_store.apply_flight_rows(cursor, [FLIGHT]) == 0
+    assert upserts(cursor) == []
+
+
+def test_readers_refuse_an_unreconciled_store():
+    with pytest.raises(RuntimeError):
+        aggregate_store.read_metrics(FakeCursor(reconciled=False))
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('matplotlib')
+
+from chart_rendering import CHART_SPECS, render_chart
+
+
+def test_output_dir_keeps_the_batch_chart(tmp_path):
+    df = pd.DataFrame({'platform': ['web', 'app'], 'booking_count': [5, 3], 'avg_price': [120.0, 95.5]})
+    path = render_chart('bar_chart', df, dpi=50, output_dir=str(tmp_path / 'live'))
+    assert path == os.path.join(str(tmp_path / 'live'), os.path.basename(CHART_SPECS['bar_chart'].filename))
+    assert os.path.exists(path)
@@ -0,0 +1,91 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('psycopg2')
+pytest.importorskip('sqlalchemy')
+
+import distinct_sketch
+from distinct_sketch import HyperLogLog
+
+
+def test_leading_zeros():
+    words = np.array([1 << shift for shift in range(64)], dtype=np.uint64)
+    assert distinct_sketch._leading_zeros(words).tolist() == [63 - shift for shift in range(64)]
+
+
+def test_small_counts_use_linear_counting():
+    assert abs(HyperLogLog().add_ids(range(50)).count() - 50) <= 1
+
+
+def test_duplicates_are_counted_once():
+    sketch = HyperLogLog().add_ids(range(1000))
+    once = sketch.count()
+    assert sketch.add_ids(range(1000)).count() == once
+
+
+def test_estimate_within_three_standard_errors():
+    sketch = HyperLogLog().add_ids(range(100000))
+    assert abs(sketch.count() - 100000) / 100000 < 3 * sketch.relative_error
+
+
+def test_merge_equals_sketch_of_the_union():
+    first = HyperLogLog().add_ids(range(0, 60000))
+    second = HyperLogLog().add_ids(range(40000, 100000))
+    union = HyperLogLog().add_ids(range(100000))
+
+    merged = first.copy().merge(second)
+    assert np.array_equal(merged.registers, union.registers)
+    assert merged.count() == union.count()
+    # copy() keeps the original sketch unchanged
+    assert not np.array_equal(first.registers, merged.registers)
+
+
+def test_merge_rejects_other_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(10))
+
+
+def test_precision_bounds():
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+    with pytest.raises(ValueError):
+        HyperLogLog(19)
+
+
+def test_sparse_round_trip():
+    sketch = HyperLogLog().add_ids(range(30))
+    data = sketch.to_bytes()
+    assert data[0] == distinct_sketch.SPARSE_MARKER
+    assert len(data) < sketch.size
+    restored = HyperLogLog.from_bytes(data)
+    assert restored.precision == sketch.precision
+    assert np.array_equal(restored.registers, sketch.registers)
+
+
+def test_dense_round_trip():
+    sketch = HyperLogLog(10).add_ids(range(50000))
+    data = sketch.to_bytes()
+    assert len(data) == sketch.size
+    restored = HyperLogLog.from_bytes(memoryview(data))
+    assert restored.precision == 10
+    assert np.array_equal(restored.registers, sketch.registers)
+
+
+def test_merge_all_sums_rows_and_merges_sketches():
+    sketches = {
+        'Scheduled': (3, HyperLogLog().add_ids([1, 2, 3])),
+        'Delayed': (2, HyperLogLog().add_ids([3, 4])),
+    }
+    rows, merged = distinct_sketch.merge_all(sketches)
+    assert rows == 5
+    assert merged.count() == HyperLogLog().add_ids([1, 2, 3, 4]).count()
+    assert distinct_sketch.merge_all({}) == (0, None)
+
+
+def test_merge_by_label_groups_ids_sharing_a_label():
+    sketches = {1: (4, HyperLogLog().add_ids([10, 11])), 2: (1, HyperLogLog().add_ids([12]))}
+    merged = distinct_sketch._merge_by_label(sketches, [(1, 'Air'), (2, 'Air'), (3, 'Idle')])
+    assert merged[('Air',)][0] == 5
+    assert merged[('Air',)][1].count() == HyperLogLog().add_ids([10, 11, 12]).count()
+    assert merged[('Idle',)] == (0, None)
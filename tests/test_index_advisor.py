@@ -0,0 +1,53 @@
+import pytest
+
+for module in ('numpy', 'pandas', 'matplotlib', 'plotly', 'openpyxl', 'psycopg2', 'sqlalchemy'):
+    pytest.importorskip(module)
+
+from sqlalchemy.pool import QueuePool
+
+import index_advisor
+from index_advisor import IndexProposal
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql):
+        self.connection.executed.append((sql, self.connection.autocommit))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """DBAPI connection recording whether autocommit was on for each statement"""
+
+    def __init__(self):
+        self.autocommit = False
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_apply_proposals_sets_autocommit_on_the_driver_connection():
+    driver = FakeConnection()
+    pool = QueuePool(lambda: driver, pool_size=1)
+    connection = pool.connect()
+    proposal = IndexProposal('flights', ('airline_id',), (), None, 'join in pie_chart')
+
+    index_advisor.apply_proposals(connection, [proposal])
+
+    assert driver.executed == [(index_advisor.create_index_sql(proposal), True), ("ANALYZE flights;", True)]
+    assert driver.autocommit is False
+    connection.close()
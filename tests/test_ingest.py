@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from ingest import ReferenceCache
+
+
+class FakeCursor:
+    """Serves the airline and airport id queries from mutable lists"""
+
+    def __init__(self, airline_ids, airport_ids):
+        self.tables = {'airline': airline_ids, 'airport': airport_ids}
+        self.loads = 0
+        self._rows = []
+
+    def execute(self, sql):
+        table = 'airline' if 'FROM airline' in sql else 'airport'
+        self.loads += table == 'airline'
+        self._rows = [(item_id,) for item_id in self.tables[table]]
+
+    def fetchall(self):
+        return self._rows
+
+
+def flight(airline_id, departure_id=10, arrival_id=11):
+    return {'airline_id': airline_id, 'departure_airport_id': departure_id, 'arrival_airport_id': arrival_id}
+
+
+def test_known_ids_do_not_reload():
+    cursor = FakeCursor([1], [10, 11])
+    cache = ReferenceCache()
+    cache.ensure_loaded(cursor)
+    cache.check_flights(cursor, [flight(1), flight('1')])
+    assert cursor.loads == 1
+
+
+def test_ids_added_after_startup_are_accepted():
+    cursor = FakeCursor([1], [10, 11])
+    cache = ReferenceCache()
+    cache.ensure_loaded(cursor)
+    cursor.tables['airline'].append(2)
+    cache.check_flights(cursor, [flight(2)])
+    assert cursor.loads == 2
+
+
+def test_unknown_ids_raise_after_one_reload():
+    cursor = FakeCursor([1], [10, 11])
+    cache = ReferenceCache()
+    cache.ensure_loaded(cursor)
+    with pytest.raises(ValueError, match=r"row 5: departure_airport_id=99"):
+        cache.check_flights(cursor, [flight(1, departure_id=99)], offset=5)
+    assert cursor.loads == 2
@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+import main
+
+
+def booking_row(grouping, status, platform, priced, percentiles):
+    """Row of the single-pass booking query: g_status, status, platform, count, avg, min, max, priced, percentiles"""
+    return (grouping, status, platform, priced, None, None, None, priced, percentiles)
+
+
+def test_percentile_rows_follow_query_order():
+    rows = main._percentile_rows([
+        booking_row(1, None, 'web', 2, [10, 20, 30, 40]),
+        booking_row(0, None, None, 1, [5, 5, 5, 5]),
+        booking_row(0, 'confirmed', None, 3, [1, 2, 3, 4]),
+        booking_row(1, None, None, 0, None),
+        booking_row(1, None, 'app', 4, [6, 7, 8, 9]),
+        booking_row(0, 'cancelled', None, 1, [2, 2, 2, 2]),
+    ])
+    # ORDER BY dimension, value: platform before status, NULL value last
+    assert [(row[0], row[1]) for row in rows] == [
+        ('platform', 'app'), ('platform', 'web'), ('platform', None),
+        ('status', 'cancelled'), ('status', 'confirmed'), ('status', None),
+    ]
+
+
+def test_percentile_rows_columns():
+    rows = main._percentile_rows([
+        booking_row(0, 'confirmed', None, 3, [1.0, 2.0, 3.0, 4.0]),
+        booking_row(1, None, 'web', 0, None),
+    ])
+    assert rows == [('platform', 'web', 0, None, None, None, None),
+                    ('status', 'confirmed', 3, 1.0, 2.0, 3.0, 4.0)]
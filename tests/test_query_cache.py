@@ -0,0 +1,53 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from query_cache import QueryCache
+
+QUERY = "SELECT airline, COUNT(*) AS flight_count FROM flights GROUP BY airline;"
+
+
+class FakeResult:
+    def fetchall(self):
+        return [('flights', 3)]
+
+
+class FakeConnection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def exec_driver_sql(self, query):
+        return FakeResult()
+
+
+class FakeEngine:
+    def connect(self):
+        return FakeConnection()
+
+
+def frame(dtype):
+    return pd.DataFrame({'airline': ['Aero'], 'flight_count': [10]}).astype({'flight_count': dtype})
+
+
+def test_key_includes_fetch_mode():
+    assert QueryCache.make_key(QUERY, None, 'typed') != QueryCache.make_key(QUERY, None, 'plain')
+
+
+def test_typed_and_plain_fetches_do_not_share_entries(tmp_path):
+    cache = QueryCache(FakeEngine(), cache_dir=str(tmp_path))
+    plain = cache.get_or_fetch(QUERY, None, lambda: frame('int64'), mode='plain')
+    typed = cache.get_or_fetch(QUERY, None, lambda: frame('int32'), mode='typed')
+    assert plain['flight_count'].dtype == 'int64'
+    assert typed['flight_count'].dtype == 'int32'
+    assert cache.misses == 2
+
+
+def test_repeated_fetch_is_served_from_the_cache(tmp_path):
+    cache = QueryCache(FakeEngine(), cache_dir=str(tmp_path))
+    cache.get_or_fetch(QUERY, None, lambda: frame('int64'), mode='plain')
+    df = cache.get_or_fetch(QUERY, None, lambda: pytest.fail('fetched again'), mode='plain')
+    assert df['flight_count'].tolist() == [10]
+    assert cache.hits == 1
@@ -0,0 +1,52 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from render_cache import RenderCache
+
+PARAMS = {'chart': 'pie_chart', 'figsize': (12, 8), 'filename': 'charts/1_pie_chart.png', 'dpi': 300}
+
+
+def frame():
+    return pd.DataFrame({'airline': ['Aero', 'Sky'], 'flight_count': [10, 7]})
+
+
+def test_key_is_deterministic():
+    assert RenderCache.make_key(frame(), PARAMS) == RenderCache.make_key(frame(), dict(reversed(PARAMS.items())))
+
+
+def test_key_changes_with_values():
+    changed = frame()
+    changed.loc[1, 'flight_count'] = 8
+    assert RenderCache.make_key(changed, PARAMS) != RenderCache.make_key(frame(), PARAMS)
+
+
+def test_key_changes_with_dtype_and_index():
+    base = RenderCache.make_key(frame(), PARAMS)
+    assert RenderCache.make_key(frame().astype({'flight_count': 'int32'}), PARAMS) != base
+    assert RenderCache.make_key(frame().set_axis([5, 6]), PARAMS) != base
+
+
+def test_key_changes_with_params():
+    assert RenderCache.make_key(frame(), dict(PARAMS, dpi=100)) != RenderCache.make_key(frame(), PARAMS)
+
+
+def test_manifest_tracks_key_and_file(tmp_path):
+    chart = tmp_path / 'chart.png'
+    chart.write_bytes(b'png')
+    manifest = str(tmp_path / 'manifest.json')
+    key = RenderCache.make_key(frame(), PARAMS)
+
+    cache = RenderCache(manifest)
+    assert not cache.is_current('pie_chart', key, str(chart))
+    cache.record('pie_chart', key, str(chart))
+
+    reloaded = RenderCache(manifest)
+    assert reloaded.is_current('pie_chart', key, str(chart))
+    assert not reloaded.is_current('pie_chart', 'other key', str(chart))
+    chart.write_bytes(b'replaced')
+    assert not reloaded.is_current('pie_chart', key, str(chart))
+    assert (reloaded.hits, reloaded.misses) == (1, 2)
+
+    reloaded.clear()
+    assert not RenderCache(manifest).is_current('pie_chart', key, str(chart))
@@ -0,0 +1,72 @@
+import shared_join
+
+TABLE = 'skytrack_booking_flights_test'
+
+BAR_CHART_QUERY = """
+    SELECT
+        b.booking_platform as platform,
+        COUNT(b.booking_id) as booking_count,
+        ROUND(AVG(b.price), 2) as avg_price
+    FROM booking b
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    JOIN flights f ON bf.flight_id = f.flight_id
+    GROUP BY b.booking_platform;
+"""
+
+
+def test_rewrite_replaces_the_sub_join():
+    rewritten = shared_join.rewrite(BAR_CHART_QUERY, TABLE)
+    assert f"FROM {TABLE} b" in rewritten
+    assert 'JOIN booking_flight bf' not in rewritten
+    assert 'flights f' not in rewritten
+    assert 'GROUP BY b.booking_platform' in rewritten
+
+
+def test_rewrite_without_flights_join():
+    query = """
+        SELECT b.booking_platform, COUNT(*)
+        FROM booking b
+        JOIN booking_flight bf ON b.booking_id = bf.booking_id
+        GROUP BY b.booking_platform;
+    """
+    assert f"FROM {TABLE} b" in shared_join.rewrite(query, TABLE)
+
+
+def test_rewrite_keeps_a_preceding_join_condition():
+    query = """
+        SELECT bag.weight_in_kg, b.price
+        FROM baggage bag
+        JOIN booking b ON bag.booking_id = b.booking_id
+        JOIN booking_flight bf ON b.booking_id = bf.booking_id
+        JOIN flights f ON bf.flight_id = f.flight_id
+        WHERE b.price > 0;
+    """
+    rewritten = shared_join.rewrite(query, TABLE)
+    assert f"JOIN {TABLE} b ON bag.booking_id = b.booking_id" in rewritten
+    assert 'JOIN booking_flight bf' not in rewritten
+
+
+def test_rewrite_is_case_insensitive():
+    query = BAR_CHART_QUERY.replace('FROM', 'from').replace('JOIN', 'join').replace(' ON ', ' on ')
+    assert TABLE in shared_join.rewrite(query, TABLE)
+
+
+def test_query_reading_removed_aliases_is_unchanged():
+    query = BAR_CHART_QUERY.replace('GROUP BY b.booking_platform', 'GROUP BY b.booking_platform, f.status')
+    assert shared_join.rewrite(query, TABLE) == query
+
+
+def test_query_reading_other_booking_columns_is_unchanged():
+    query = BAR_CHART_QUERY.replace('b.booking_platform as platform', 'b.status as status')
+    assert shared_join.rewrite(query, TABLE) == query
+
+
+def test_query_without_the_sub_join_is_unchanged():
+    query = "SELECT status, COUNT(*) FROM flights GROUP BY status;"
+    assert shared_join.rewrite(query, TABLE) == query
+
+
+def test_run_table_names_are_unique():
+    names = {shared_join.run_table_name() for _ in range(100)}
+    assert len(names) == 100
+    assert all(name.startswith(shared_join.RUN_TABLE_PREFIX) for name in names)
@@ -0,0 +1,121 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('sqlalchemy')
+
+import snapshot
+
+ROWS = {
+    'airline': [(1, 'Aero'), (2, 'Sky'), (3, 'Idle')],
+    'airport': [(10, 'North', 'A', 'X'), (11, 'South', 'B', 'X')],
+    'flights': [
+        (1, 1, 10, 11, 'Scheduled', date(2024, 1, 15)),
+        (2, 1, 11, 10, 'Delayed', date(2024, 1, 20)),
+        (3, 1, 10, 11, 'Scheduled', date(2024, 2, 3)),
+        (4, 2, 10, 11, None, date(2024, 4, 1)),
+        # Departure airport and airline that do not exist
+        (5, 2, 99, 10, 'Scheduled', date(2024, 4, 2)),
+        (6, 7, 10, 11, 'Scheduled', None),
+    ],
+    'booking': [(100, 'web', 'confirmed', 100.0), (101, 'web', 'confirmed', 200.0),
+                (102, 'app', 'cancelled', None), (103, 'app', None, 50.0)],
+    'booking_flight': [(100, 1), (101, 2), (101, 3), (102, 4), (103, 99)],
+    'baggage': [(100, 20.0), (101, 10.0), (103, 5.0)],
+}
+
+
+@pytest.fixture
+def snap(tmp_path):
+    """Snapshot directory written through the dump's column writers"""
+    for table, columns in snapshot.SNAPSHOT_COLUMNS.items():
+        os.makedirs(tmp_path / table)
+        for (column, kind), values in zip(columns, zip(*ROWS[table])):
+            writer = snapshot._ColumnWriter(str(tmp_path / table / f'{column}.npy'), kind)
+            writer.append(values)
+            writer.close()
+    with open(tmp_path / 'manifest.json', 'w') as f:
+        json.dump({'rows': {table: len(rows) for table, rows in ROWS.items()}}, f)
+    return snapshot.Snapshot(str(tmp_path))
+
+
+def records(df):
+    return [tuple(None if pd.isna(value) else value for value in row) for row in df.itertuples(index=False)]
+
+
+def test_pie_chart_joins_airline_and_departure_airport(snap):
+    df = snap.pie_chart()
+    assert list(df.columns) == ['airline', 'flight_count', 'airports_served']
+    assert records(df) == [('Aero', 3, 2), ('Sky', 1, 1)]
+
+
+def test_line_chart_orders_null_status_last(snap):
+    assert records(snap.line_chart()) == [('Delayed', 1, 1, 1), ('Scheduled', 2, 1, 1), (None, 1, 1, 1)]
+
+
+def test_monthly_timeline(snap):
+    df = snap.interactive_timeline()
+    assert list(df.columns) == ['airline', 'flight_status', 'month', 'flight_count']
+    assert sorted(records(df), key=str) == sorted([
+        ('Aero', 'Scheduled', '2024-01', 1), ('Aero', 'Delayed', '2024-01', 1),
+        ('Aero', 'Scheduled', '2024-02', 1), ('Sky', None, '2024-04', 1), ('Sky', 'Scheduled', '2024-04', 1),
+    ], key=str)
+    assert df['month'].is_monotonic_increasing
+
+
+def test_timeline_top_n_and_granularity(snap):
+    df = snap.interactive_timeline(top_n=1, granularity='quarter')
+    assert list(df.columns) == ['airline', 'flight_status', 'period', 'flight_count']
+    assert sorted(records(df), key=str) == sorted([
+        ('Aero', 'Scheduled', '2024-Q1', 2), ('Aero', 'Delayed', '2024-Q1', 1),
+        ('Other', None, '2024-Q2', 1), ('Other', 'Scheduled', '2024-Q2', 1),
+    ], key=str)
+
+
+def test_weekly_timeline_uses_iso_weeks(snap):
+    df = snap.interactive_timeline(granularity='week')
+    assert sorted(set(df['period'])) == ['2024-W03', '2024-W05', '2024-W14']
+
+
+def test_period_labels():
+    days = np.array(['2021-01-01', '2024-05-20'], dtype='datetime64[D]')
+    expected = {
+        'day': ['2021-01-01', '2024-05-20'],
+        'week': ['2020-W53', '2024-W21'],
+        'month': ['2021-01', '2024-05'],
+        'quarter': ['2021-Q1', '2024-Q2'],
+    }
+    for granularity, labels in expected.items():
+        starts = snapshot._period_starts(days, granularity)
+        assert list(snapshot._period_labels(starts, granularity)) == labels
+
+
+def test_scatter_plot_repeats_rows_per_booking_flight(snap):
+    df = snap.scatter_plot()
+    assert records(df) == [(20.0, 100.0), (10.0, 200.0), (10.0, 200.0)]
+
+
+def test_scatter_sample_statistics_cover_the_full_join(snap):
+    df = snap.scatter_plot(sample_size=2, seed=1)
+    assert len(df) == 2
+    assert set(records(df[['baggage_weight', 'ticket_price']])) <= {(20.0, 100.0), (10.0, 200.0)}
+    assert df['total_points'].iloc[0] == 3
+    assert df['correlation'].iloc[0] == pytest.approx(-1.0)
+    assert df['slope'].iloc[0] == pytest.approx(-10.0)
+    assert df['intercept'].iloc[0] == pytest.approx(300.0)
+
+
+def test_price_percentiles_sheet(snap):
+    df = snap.sheet('Price_Percentiles')
+    assert list(df.columns) == ['Dimension', 'Value', 'Priced Bookings', 'P50', 'P90', 'P95', 'P99']
+    assert records(df) == [
+        ('platform', 'app', 1, 50.0, 50.0, 50.0, 50.0),
+        ('platform', 'web', 2, 150.0, 190.0, 195.0, 199.0),
+        ('status', 'cancelled', 0, None, None, None, None),
+        ('status', 'confirmed', 2, 150.0, 190.0, 195.0, 199.0),
+        ('status', None, 1, 50.0, 50.0, 50.0, 50.0),
+    ]
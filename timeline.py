@@ -0,0 +1,204 @@
+"""
+Scalable interactive timeline for SkyTrack analytics.
+
+The default timeline animates every airline x status x month row, and Plotly
+inlines every frame into the figure. This module keeps the timeline small:
+
+- airlines outside the server-side top N are folded into an "Other" bucket
+- periods can be days, weeks, months or quarters
+- traces use WebGL (scattergl)
+- the lazy HTML output stores each period in its own small script file that
+  the page loads only when the slider reaches it (works from file:// too)
+"""
+import json
+import os
+
+GRANULARITY_FORMATS = {
+    'day': 'YYYY-MM-DD',
+    'week': 'IYYY-"W"IW',
+    'month': 'YYYY-MM',
+    'quarter': 'YYYY-"Q"Q',
+}
+
+GRANULARITY_TITLES = {
+    'day': 'Daily',
+    'week': 'Weekly',
+    'month': 'Monthly',
+    'quarter': 'Quarterly',
+}
+
+OTHER_AIRLINES = 'Other'
+
+SCALABLE_TIMELINE_QUERY = """
+    WITH top_airlines AS (
+        SELECT f.airline_id
+        FROM flights f
+        WHERE f.scheduled_departure IS NOT NULL
+        GROUP BY f.airline_id
+        ORDER BY COUNT(*) DESC
+        LIMIT %(top_n)s
+    )
+    SELECT
+        CASE WHEN t.airline_id IS NULL THEN %(other)s ELSE a.airline_name END as airline,
+        f.status as flight_status,
+        TO_CHAR(date_trunc(%(granularity)s, f.scheduled_departure), %(period_format)s) as period,
+        COUNT(f.flight_id) as flight_count
+    FROM airline a
+    JOIN flights f ON a.airline_id = f.airline_id
+    LEFT JOIN top_airlines t ON t.airline_id = f.airline_id
+    WHERE f.scheduled_departure IS NOT NULL
+    GROUP BY 1, 2, 3
+    ORDER BY 3, 1;
+"""
+
+
+def timeline_title(granularity='month'):
+    """Chart title naming the timeline's period"""
+    return f"Flight Count Evolution by Airline ({GRANULARITY_TITLES[granularity]} Timeline)"
+
+
+def timeline_params(top_n=None, granularity='month'):
+    """Parameters for SCALABLE_TIMELINE_QUERY; top_n=None keeps every airline"""
+    if granularity not in GRANULARITY_FORMATS:
+        raise ValueError(f"Unknown granularity {granularity!r}, expected one of {sorted(GRANULARITY_FORMATS)}")
+    return {
+        'top_n': top_n,
+        'other': OTHER_AIRLINES,
+        'granularity': granularity,
+        'period_format': GRANULARITY_FORMATS[granularity],
+    }
+
+
+LAZY_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
+<style>
+  body {{ font-family: sans-serif; margin: 20px; }}
+  #controls {{ width: 1200px; display: flex; align-items: center; gap: 12px; }}
+  #slider {{ flex: 1; }}
+</style>
+</head>
+<body>
+<div id="chart" style="width:1200px;height:700px;"></div>
+<div id="controls">
+  <button id="play">Play</button>
+  <input id="slider" type="range" min="0" max="{last_index}" value="0">
+  <span id="label"></span>
+</div>
+<script>
+var manifest = {manifest};
+var cache = {{}};
+var pending = {{}};
+var current = 0;
+var timer = null;
+
+// Each frame file calls this with its data
+window.timelineFrameLoaded = function (period, frame) {{
+  cache[period] = frame;
+  if (pending[period]) {{ pending[period](frame); delete pending[period]; }}
+}};
+
+function loadFrame(index, callback) {{
+  var period = manifest.periods[index];
+  if (cache[period]) {{ callback(cache[period]); return; }}
+  pending[period] = callback;
+  var script = document.createElement('script');
+  script.src = manifest.frame_dir + '/' + manifest.files[index];
+  document.head.appendChild(script);
+}}
+
+function markerSize(count) {{
+  return 6 + 40 * Math.sqrt(count / manifest.max_count);
+}}
+
+function draw(index) {{
+  current = index;
+  loadFrame(index, function (frame) {{
+    var traces = manifest.statuses.map(function (status) {{
+      var points = frame[status] || {{x: [], y: []}};
+      return {{
+        type: 'scattergl', mode: 'markers', name: status,
+        x: points.x, y: points.y,
+        marker: {{size: points.y.map(markerSize), color: manifest.colors[status]}}
+      }};
+    }});
+    Plotly.react('chart', traces, {{
+      title: manifest.title + ' - ' + manifest.periods[index],
+      xaxis: {{title: 'Airline', type: 'category', categoryarray: manifest.airlines, tickangle: -45}},
+      yaxis: {{title: 'Number of Flights', range: [0, manifest.max_count + 5]}},
+      legend: {{title: {{text: 'Flight Status'}}}}
+    }});
+    document.getElementById('label').textContent = manifest.periods[index];
+    document.getElementById('slider').value = index;
+    // Prefetch the next period so playback stays smooth
+    if (index + 1 < manifest.periods.length) loadFrame(index + 1, function () {{}});
+  }});
+}}
+
+document.getElementById('slider').addEventListener('input', function (e) {{
+  draw(parseInt(e.target.value, 10));
+}});
+document.getElementById('play').addEventListener('click', function () {{
+  if (timer) {{ clearInterval(timer); timer = null; this.textContent = 'Play'; return; }}
+  this.textContent = 'Pause';
+  timer = setInterval(function () {{
+    if (current + 1 >= manifest.periods.length) {{ clearInterval(timer); timer = null; return; }}
+    draw(current + 1);
+  }}, 700);
+}});
+draw(0);
+</script>
+</body>
+</html>
+"""
+
+STATUS_COLORS = ['#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A', '#19D3F3', '#FF6692', '#B6E880']
+
+
+def write_lazy_timeline(df, out_dir='charts/timeline', title='Flight Count Evolution by Airline'):
+    """
+    Write the timeline as index.html plus one small frame file per period.
+    df columns: airline, flight_status, period, flight_count.
+    Returns the path of index.html.
+    """
+    frame_dir = os.path.join(out_dir, 'frames')
+    os.makedirs(frame_dir, exist_ok=True)
+
+    # Plain labels: categorical columns (typed fetch) cannot be filled with 'Unknown'
+    status_labels = df['flight_status'].astype(object).fillna('Unknown')
+    statuses = sorted(status_labels.unique())
+    periods = sorted(df['period'].unique())
+    files = []
+
+    for index, (period, frame_df) in enumerate(df.groupby('period', sort=True, observed=True)):
+        frame = {}
+        for status, status_df in frame_df.groupby(status_labels.loc[frame_df.index]):
+            frame[status] = {
+                'x': status_df['airline'].tolist(),
+                'y': [int(count) for count in status_df['flight_count']],
+            }
+        filename = f'{index:05d}.js'
+        with open(os.path.join(frame_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(f"timelineFrameLoaded({json.dumps(period)}, {json.dumps(frame)});\n")
+        files.append(filename)
+
+    manifest = {
+        'title': title,
+        'periods': periods,
+        'files': files,
+        'frame_dir': 'frames',
+        'statuses': statuses,
+        'airlines': sorted(df['airline'].astype(object).unique()),
+        'max_count': int(df['flight_count'].max()),
+        'colors': {status: STATUS_COLORS[i % len(STATUS_COLORS)] for i, status in enumerate(statuses)},
+    }
+
+    path = os.path.join(out_dir, 'index.html')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(LAZY_PAGE_TEMPLATE.format(title=title, last_index=max(len(periods) - 1, 0),
+                                          manifest=json.dumps(manifest)))
+    return path
+
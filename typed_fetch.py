@@ -0,0 +1,77 @@
+"""
+Compact dtypes for report DataFrames.
+
+read_sql_query returns every string column as Python objects and NUMERIC
+columns as Decimal (or float64 after coercion). Each report declares a schema
+here: low-cardinality labels become categoricals, counts become int32 and
+plotted prices/weights become float32 when the values fit. NUMERIC_AS_FLOAT
+makes psycopg2 parse NUMERIC straight into floats, so no Decimal objects are
+created on the way.
+
+Columns missing from a schema, or from the DataFrame, are left unchanged.
+Values shown with cents in Excel stay float64: float32 would print as
+123.44999694824219 in a cell.
+"""
+import numpy as np
+import psycopg2.extensions
+
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'SKYTRACK_NUMERIC_AS_FLOAT',
+    lambda value, cursor: float(value) if value is not None else None)
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+
+# float32 keeps about 7 significant digits: cents survive up to ~167k
+FLOAT32_MAX_EXACT_CENTS = 2 ** 24 / 100
+
+REPORT_SCHEMAS = {
+    'pie_chart': {'airline': 'category', 'flight_count': 'int32', 'airports_served': 'int32'},
+    'bar_chart': {'platform': 'category', 'booking_count': 'int32'},
+    'horizontal_bar_chart': {'city': 'category', 'flight_count': 'int32', 'airlines_count': 'int32'},
+    'line_chart': {'flight_status': 'category', 'flight_count': 'int32',
+                   'airlines_count': 'int32', 'airports_count': 'int32'},
+    'histogram': {'ticket_price': 'float32', 'bin': 'int32', 'bin_count': 'int32'},
+    'scatter_plot': {'baggage_weight': 'float32', 'ticket_price': 'float32'},
+    'interactive_timeline': {'airline': 'category', 'flight_status': 'category', 'month': 'category',
+                             'period': 'category', 'flight_count': 'int32'},
+}
+
+SHEET_SCHEMAS = {
+    'Airlines_Performance': {'Airline Name': 'category', 'Total Flights': 'int32', 'Airports Served': 'int32'},
+    'Airport_Traffic': {'City': 'category', 'Flight Count': 'int32', 'Airlines Operating': 'int32'},
+    'Booking_Summary': {'Platform': 'category', 'Bookings': 'int32'},
+    'Price_Percentiles': {'Dimension': 'category', 'Value': 'category', 'Priced Bookings': 'int32'},
+}
+
+
+def _fits_int32(series):
+    return series.notna().all() and (series.empty or (series.min() >= INT32_MIN and series.max() <= INT32_MAX))
+
+
+def _fits_float32(series):
+    return series.empty or not (series.abs() > FLOAT32_MAX_EXACT_CENTS).any()
+
+
+def apply_schema(df, schema):
+    """
+    A new DataFrame with the columns converted to the schema's dtypes where
+    safe; df itself is left untouched (it may be a cached frame)
+    """
+    converted = {}
+    for column, kind in (schema or {}).items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if kind == 'category':
+            converted[column] = series.astype('category')
+        elif kind == 'int32' and _fits_int32(series):
+            converted[column] = series.astype('int32')
+        elif kind == 'float32' and _fits_float32(series):
+            converted[column] = series.astype('float32')
+    return df.assign(**converted)
+
+
+def frame_memory(df):
+    """Bytes used by the DataFrame, including the Python objects it holds"""
+    return int(df.memory_usage(deep=True, index=True).sum())